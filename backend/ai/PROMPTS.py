@@ -50,6 +50,45 @@ Your output should be a JSON object with the following structure:
 ```
 """
 
+PROMPT_ANALYZE_CONTENT = """
+You are an expert in categorizing and summarizing contents.
+Your task is to analyze the content, determine its category and relevant tags, and generate a concise summary.
+
+## Output Format
+
+You MUST output a JSON object with the following structure, keeping the field order:
+
+```json
+{{
+    "category": "string",  # The category name of the content
+    "category_emoji": "string",  # An emoji representing the category
+    "tags": ["string1", "string2", ...],  # A list of relevant tags
+    "summary": "string"  # The summary of the content
+}}
+```
+
+## Rules
+1. Category Matching:
+    - You are given a predefined list of existing categories: {categories}
+    - You should select a proper category from this list if there is any reasonable match.
+    - If multiple categories seem possible, avoid general categories when a more precise category exists.
+
+2. New Category Creation:
+    - Only if the content truly does not match any existing category, you may create a new one.
+    - New categories must be concise, general, and not duplicates of existing ones.
+
+3. Tags Generation:
+    - Always provide at least 1 tag and no more than 5 tags.
+    - Tags should be specific keywords relevant to the content.
+    - Avoid repeating the category name as a tag unless strictly necessary.
+"""
+
+PROMPT_SUMMARIZE_CHUNK = """
+You are given part {index} of {total} of a long document.
+Your task is to extract the key points of this part as concise plain-text notes, no more than 150 words.
+Do not add any introduction or explanation, output the notes only.
+"""
+
 KNOWLEDGE_BASE_QUERY_PROMPT = """
 You will be given several documents that related to the user's query.
 Your task is to analyze the documents and generate a concise answer to the user's query.
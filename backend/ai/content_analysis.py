@@ -0,0 +1,252 @@
+"""
+收藏内容分析：一次结构化输出请求同时得到分类、emoji、标签和摘要，正文只发送一次。
+模型或接口不支持结构化输出时，退回到分类和摘要两个并发请求。
+
+发送前先精简正文（去掉样板内容、按 token 预算挑选段落），超长文档先分块并行摘要
+（map），再用分块摘要代替正文进行分析（reduce）。
+"""
+
+import asyncio
+import os
+from dataclasses import dataclass
+from typing import AsyncIterator
+
+import openai
+from loguru import logger
+
+from backend.ai.openai_provider import provider_openai
+from backend.ai.PROMPTS import (
+    PROMPT_ANALYZE_CONTENT,
+    PROMPT_PARSE_CATEGORY_AND_TAGS,
+    PROMPT_SUMMARIZE_CONTENT,
+    PROMPT_SUMMARIZE_CHUNK,
+    ADDITIONAL_PROMPT_USER_LANGUAGE_PREFERENCE,
+    parse_json,
+)
+from backend.ai.structured_output import StreamingJSONObjectParser
+from backend.utils.content_reducer import (
+    count_tokens,
+    reduce_content,
+    select_sections,
+    strip_boilerplate,
+)
+from backend.utils.text_splitter import RecursiveCharacterTextSplitter
+
+# 各任务发送给 LLM 的正文 token 上限（摘要预算也用于一次完成分类和摘要的结构化请求）
+LLM_CATEGORY_TOKEN_BUDGET = int(os.getenv("LLM_CATEGORY_TOKEN_BUDGET", "1500"))
+LLM_SUMMARY_TOKEN_BUDGET = int(os.getenv("LLM_SUMMARY_TOKEN_BUDGET", "6000"))
+# 去掉样板内容后超过这个长度的文档使用 map-reduce 摘要
+LLM_MAP_REDUCE_MIN_TOKENS = int(os.getenv("LLM_MAP_REDUCE_MIN_TOKENS", "24000"))
+LLM_MAP_CHUNK_TOKENS = int(os.getenv("LLM_MAP_CHUNK_TOKENS", "4000"))
+LLM_MAP_MAX_CHUNKS = int(os.getenv("LLM_MAP_MAX_CHUNKS", "12"))
+
+CONTENT_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "category": {"type": "string"},
+        "category_emoji": {"type": "string"},
+        "tags": {"type": "array", "items": {"type": "string"}},
+        "summary": {"type": "string"},
+    },
+    "required": ["category", "category_emoji", "tags", "summary"],
+    "additionalProperties": False,
+}
+_CATEGORY_KEYS = ("category", "category_emoji", "tags")
+
+
+class StructuredOutputUnavailable(Exception):
+    """结构化输出请求失败且还没有输出任何事件，可以改用两次请求"""
+
+
+@dataclass
+class AnalysisDelta:
+    # category: {category, category_emoji, tags}
+    # summary_chunk: {summary}，摘要的增量文本
+    # summary_completed: {summary}，完整摘要
+    type: str
+    data: dict
+
+
+def _category_fields(data: dict) -> dict:
+    tags = data.get("tags") or []
+    return {
+        "category": str(data.get("category") or ""),
+        "category_emoji": str(data.get("category_emoji") or ""),
+        "tags": [str(tag) for tag in tags if tag] if isinstance(tags, list) else [],
+    }
+
+
+def _split_for_map(text: str) -> list[str]:
+    # 分块不会填满，预留 10% 的余量
+    text = select_sections(text, int(LLM_MAP_CHUNK_TOKENS * LLM_MAP_MAX_CHUNKS * 0.9))
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=LLM_MAP_CHUNK_TOKENS,
+        chunk_overlap=200,
+        length_function=count_tokens,
+    )
+    return splitter.split_text(text)[:LLM_MAP_MAX_CHUNKS]
+
+
+async def _map_summaries(text: str) -> str:
+    """分块并行摘要（并发受 provider 的全局并发上限约束），返回拼接后的分块摘要"""
+    chunks = await asyncio.to_thread(_split_for_map, text)
+
+    async def summarize_chunk(index: int, chunk: str) -> str:
+        system_prompt = PROMPT_SUMMARIZE_CHUNK.format(index=index, total=len(chunks))
+        system_prompt += f"\n\n{ADDITIONAL_PROMPT_USER_LANGUAGE_PREFERENCE}"
+        llm_resp = await provider_openai.text_chat(prompt=chunk, system_prompt=system_prompt)
+        return llm_resp.completion_text
+
+    results = await asyncio.gather(
+        *(summarize_chunk(i, chunk) for i, chunk in enumerate(chunks, start=1)),
+        return_exceptions=True,
+    )
+    notes = [
+        f"## Part {i}\n\n{result}"
+        for i, result in enumerate(results, start=1)
+        if isinstance(result, str)
+    ]
+    if not notes:
+        raise results[0]  # type: ignore
+    if len(notes) < len(chunks):
+        logger.warning(f"{len(chunks) - len(notes)}/{len(chunks)} chunk summaries failed")
+    logger.info(f"Map-reduce summarization: {len(chunks)} chunks")
+    return "\n\n".join(notes)
+
+
+async def prepare_content(content: str) -> str:
+    """
+    为分类和摘要准备 LLM 输入：去掉样板内容，超出摘要预算时挑选段落，
+    超长文档改用分块摘要
+    """
+    # 整页都被判断为样板内容时（例如很短的页面）使用原文
+    cleaned = await asyncio.to_thread(strip_boilerplate, content) or content
+    tokens = await asyncio.to_thread(count_tokens, cleaned)
+    if tokens <= LLM_SUMMARY_TOKEN_BUDGET:
+        return cleaned
+    if tokens >= LLM_MAP_REDUCE_MIN_TOKENS:
+        cleaned = await _map_summaries(cleaned)
+    return await asyncio.to_thread(select_sections, cleaned, LLM_SUMMARY_TOKEN_BUDGET)
+
+
+async def classify_content(content: str, categories_str: str) -> dict:
+    """只分析分类和标签，返回 {category, category_emoji, tags}"""
+    content = await asyncio.to_thread(reduce_content, content, LLM_CATEGORY_TOKEN_BUDGET)
+    system_prompt = PROMPT_PARSE_CATEGORY_AND_TAGS.format(categories=categories_str)
+    system_prompt += f"\n\n{ADDITIONAL_PROMPT_USER_LANGUAGE_PREFERENCE}"
+    llm_resp = await provider_openai.text_chat(prompt=content, system_prompt=system_prompt)
+    return _category_fields(parse_json(llm_resp.completion_text))
+
+
+async def _analyze_structured(content: str, categories_str: str) -> AsyncIterator[AnalysisDelta]:
+    system_prompt = PROMPT_ANALYZE_CONTENT.format(categories=categories_str)
+    system_prompt += f"\n\n{ADDITIONAL_PROMPT_USER_LANGUAGE_PREFERENCE}"
+    parser = StreamingJSONObjectParser(stream_keys=("summary",))
+    category_sent = False
+    # 分类字段完成之前生成的摘要先缓存，保证 category 事件在前
+    pending_summary = ""
+    streamed = ""
+
+    stream = provider_openai.structured_chat_stream(
+        prompt=content,
+        json_schema=CONTENT_ANALYSIS_SCHEMA,
+        schema_name="content_analysis",
+        system_prompt=system_prompt,
+    )
+    try:
+        async for chunk in stream:
+            _, deltas = parser.feed(chunk.completion_text)
+            pending_summary += deltas.get("summary", "")
+            if not category_sent and all(key in parser.fields for key in _CATEGORY_KEYS):
+                category_sent = True
+                yield AnalysisDelta("category", _category_fields(parser.fields))
+            if category_sent and pending_summary:
+                yield AnalysisDelta("summary_chunk", {"summary": pending_summary})
+                streamed += pending_summary
+                pending_summary = ""
+    except openai.BadRequestError as e:
+        if category_sent:
+            raise
+        message = str(e).lower()
+        if "response_format" in message or "json_schema" in message:
+            provider_openai.structured_output = False
+            logger.warning(f"Structured output is not supported, disabled: {e}")
+        raise StructuredOutputUnavailable(str(e)) from e
+
+    fields = parser.fields
+    if "category" not in fields:
+        # 接口忽略了 response_format（例如输出了 ```json 代码块），整体解析一次
+        try:
+            fields = parse_json(parser.buffer)
+        except ValueError:
+            fields = {}
+        if not isinstance(fields, dict) or "category" not in fields:
+            provider_openai.structured_output = False
+            raise StructuredOutputUnavailable("No category in structured output")
+    if not category_sent:
+        yield AnalysisDelta("category", _category_fields(fields))
+
+    summary = fields.get("summary")
+    summary = summary if isinstance(summary, str) else ""
+    # 没能增量解析出来的摘要部分一次性补发
+    remaining = summary[len(streamed) :] if summary.startswith(streamed) else ""
+    if remaining:
+        yield AnalysisDelta("summary_chunk", {"summary": remaining})
+    yield AnalysisDelta("summary_completed", {"summary": summary})
+
+
+async def _analyze_two_calls(content: str, categories_str: str) -> AsyncIterator[AnalysisDelta]:
+    """分类和摘要两个请求并发执行，摘要在分类结果之后转发"""
+    summary_sys_prompt = PROMPT_SUMMARIZE_CONTENT
+    summary_sys_prompt += f"\n\n{ADDITIONAL_PROMPT_USER_LANGUAGE_PREFERENCE}"
+    summary_queue: asyncio.Queue[str | None] = asyncio.Queue()
+
+    async def stream_summary():
+        try:
+            async for chunk in provider_openai.text_chat_stream(
+                prompt=content,
+                system_prompt=summary_sys_prompt,
+            ):
+                summary_queue.put_nowait(chunk.completion_text)
+        finally:
+            summary_queue.put_nowait(None)
+
+    category_task = asyncio.create_task(classify_content(content, categories_str))
+    summary_task = asyncio.create_task(stream_summary())
+    try:
+        yield AnalysisDelta("category", await category_task)
+
+        full_summary = ""
+        while (chunk_text := await summary_queue.get()) is not None:
+            full_summary += chunk_text
+            yield AnalysisDelta("summary_chunk", {"summary": chunk_text})
+        # re-raise errors from the summary stream
+        await summary_task
+    finally:
+        for task in (category_task, summary_task):
+            if not task.done():
+                task.cancel()
+
+    yield AnalysisDelta(
+        "summary_completed", {"summary": parse_json(full_summary).get("summary", "")}
+    )
+
+
+async def analyze_content(content: str, categories_str: str) -> AsyncIterator[AnalysisDelta]:
+    """
+    分析收藏内容，依次输出 category、若干 summary_chunk 和 summary_completed 事件
+
+    Args:
+        categories_str: 用户已有的分类，格式为 "name(emoji), ..."
+    """
+    content = await prepare_content(content)
+    if provider_openai.structured_output:
+        try:
+            async for delta in _analyze_structured(content, categories_str):
+                yield delta
+            return
+        except StructuredOutputUnavailable as e:
+            logger.info(f"Falling back to separate category and summary requests: {e}")
+
+    async for delta in _analyze_two_calls(content, categories_str):
+        yield delta
@@ -0,0 +1,79 @@
+import os
+import asyncio
+import numpy as np
+from loguru import logger
+from openai import AsyncOpenAI, OpenAI
+
+from backend.knowledge_base.embedding_cache import embedding_cache
+from backend.knowledge_base.embedding_scheduler import embedding_scheduler
+
+
+class ProviderOpenAIEmbedding:
+    def __init__(self, api_key: str, model: str, base_url: str | None = None):
+        self.model = model
+        self.configured = bool(api_key and model)
+        self.client = (
+            AsyncOpenAI(api_key=api_key, base_url=base_url) if self.configured else None
+        )
+        # 调度器在自己的线程中同步发送批次请求
+        self.sync_client = (
+            OpenAI(api_key=api_key, base_url=base_url) if self.configured else None
+        )
+        # 调度器按嵌入函数的 id 合并批次，绑定方法每次访问都是新对象，这里固定一个引用
+        self._batch_fn = self._embed_batch
+        if not self.configured:
+            logger.warning("Embedding API key is not configured, embedding provider disabled.")
+
+    async def embed(self, texts: list[str], model: str | None = None) -> np.ndarray:
+        """
+        Embed the given texts.
+
+        Returns:
+            np.ndarray: float32 matrix of shape (len(texts), dim)
+        """
+        if not self.client:
+            raise RuntimeError("Embedding provider is not configured")
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        resp = await self.client.embeddings.create(
+            model=model or self.model,
+            input=texts,
+        )
+        # the API may return items out of order
+        vectors = [item.embedding for item in sorted(resp.data, key=lambda item: item.index)]
+        return np.asarray(vectors, dtype=np.float32)
+
+    def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        """调度器调用的同步嵌入函数，与知识库的嵌入请求共用批次和 RPM / TPM 限制"""
+        resp = self.sync_client.embeddings.create(model=self.model, input=texts)  # type: ignore
+        return [item.embedding for item in sorted(resp.data, key=lambda item: item.index)]
+
+    async def embed_cached(self, texts: list[str]) -> np.ndarray:
+        """
+        与 embed 相同，但先查嵌入缓存，未命中的文本经调度器分批请求；
+        缓存的模型名与知识库相同，同一模型和文本的向量可以共用
+
+        Returns:
+            np.ndarray: float32 matrix of shape (len(texts), dim)
+        """
+        if not self.client:
+            raise RuntimeError("Embedding provider is not configured")
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        vectors = await asyncio.to_thread(
+            embedding_cache.embed,
+            f"openai/{self.model}",
+            texts,
+            lambda missing: embedding_scheduler.embed(missing, self._batch_fn),
+        )
+        return np.asarray(vectors, dtype=np.float32)
+
+
+# global
+provider_openai_embedding = ProviderOpenAIEmbedding(
+    api_key=os.getenv("EMBEDDING_API_KEY", ""),
+    model=os.getenv("EMBEDDING_MODEL", "text-embedding-3-small"),
+    base_url=os.getenv("EMBEDDING_API_BASE_URL", "https://api.openai.com/v1/embeddings"),
+)
@@ -1,4 +1,5 @@
 import os
+import asyncio
 from loguru import logger
 from openai import AsyncOpenAI
 from dataclasses import dataclass
@@ -13,13 +14,27 @@ class LLMResponse:
     is_chunk: bool = False
 
 
+# 同时进行的 LLM 请求上限，单条收藏和批量导入共享
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+# 是否使用 JSON Schema 结构化输出：auto 时先尝试，接口不支持后自动关闭；false 时始终关闭
+OPENAI_STRUCTURED_OUTPUT = os.getenv("OPENAI_STRUCTURED_OUTPUT", "auto").lower()
+
+
 class ProviderOpenAI:
-    def __init__(self, api_key: str, model: str, base_url: str | None = None):
+    def __init__(
+        self,
+        api_key: str,
+        model: str,
+        base_url: str | None = None,
+        max_concurrency: int = OPENAI_MAX_CONCURRENCY,
+    ):
         self.client = AsyncOpenAI(
             api_key=api_key,
             base_url=base_url,
         )
         self.model = model
+        self._semaphore = asyncio.Semaphore(max(max_concurrency, 1))
+        self.structured_output = OPENAI_STRUCTURED_OUTPUT not in ("false", "0", "off")
 
     async def text_chat(
         self,
@@ -46,12 +61,13 @@ class ProviderOpenAI:
         if system_prompt:
             query.insert(0, {"role": "system", "content": system_prompt})
 
-        resp = await self.client.chat.completions.create(
-            model=model,
-            messages=query,
-            temperature=temperature,
-            max_tokens=max_tokens,
-        )
+        async with self._semaphore:
+            resp = await self.client.chat.completions.create(
+                model=model,
+                messages=query,
+                temperature=temperature,
+                max_tokens=max_tokens,
+            )
 
         content = resp.choices[0].message.content
         if not content:
@@ -87,29 +103,31 @@ class ProviderOpenAI:
         if system_prompt:
             query.insert(0, {"role": "system", "content": system_prompt})
 
-        stream = await self.client.chat.completions.create(
-            model=model,
-            messages=query,
-            temperature=temperature,
-            max_tokens=max_tokens,
-            stream=True,
-        )
-
-        state = ChatCompletionStreamState()
-
-        async for chunk in stream:
-            try:
-                state.handle_chunk(chunk)
-            except Exception as e:
-                logger.warning("Saving chunk state error: " + str(e))
-            if len(chunk.choices) == 0:
-                continue
-            delta = chunk.choices[0].delta
-            yield LLMResponse(
-                completion_text=delta.content.strip() if delta.content else "",
-                is_chunk=True,
+        # 流式请求在整个流结束前都占用一个并发名额
+        async with self._semaphore:
+            stream = await self.client.chat.completions.create(
+                model=model,
+                messages=query,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
             )
 
+            state = ChatCompletionStreamState()
+
+            async for chunk in stream:
+                try:
+                    state.handle_chunk(chunk)
+                except Exception as e:
+                    logger.warning("Saving chunk state error: " + str(e))
+                if len(chunk.choices) == 0:
+                    continue
+                delta = chunk.choices[0].delta
+                yield LLMResponse(
+                    completion_text=delta.content.strip() if delta.content else "",
+                    is_chunk=True,
+                )
+
         # TODO(Soulter): Handle final completion
         # final_completion = state.get_final_completion()
         # if final_completion:
@@ -120,6 +138,48 @@ class ProviderOpenAI:
         # else:
         #     logger.warning("No final completion found in stream response")
 
+    async def structured_chat_stream(
+        self,
+        prompt: str,
+        json_schema: dict,
+        schema_name: str,
+        system_prompt: str | None = None,
+        model: str | None = None,
+        temperature: float | None = None,
+        max_tokens: int | None = None,
+    ):
+        """
+        流式请求符合 json_schema 的 JSON 对象，逐块返回原始文本（不做 strip，
+        由调用方增量解析）。接口不支持 response_format 时抛出 openai.BadRequestError
+        """
+        query = [{"role": "user", "content": prompt}]
+        if system_prompt:
+            query.insert(0, {"role": "system", "content": system_prompt})
+
+        async with self._semaphore:
+            stream = await self.client.chat.completions.create(
+                model=model or self.model,
+                messages=query,  # type: ignore
+                temperature=temperature,
+                max_tokens=max_tokens,
+                response_format={
+                    "type": "json_schema",
+                    "json_schema": {
+                        "name": schema_name,
+                        "schema": json_schema,
+                        "strict": True,
+                    },
+                },
+                stream=True,
+            )
+            async for chunk in stream:
+                if len(chunk.choices) == 0:
+                    continue
+                yield LLMResponse(
+                    completion_text=chunk.choices[0].delta.content or "",
+                    is_chunk=True,
+                )
+
 
 # global
 provider_openai = ProviderOpenAI(
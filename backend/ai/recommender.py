@@ -0,0 +1,67 @@
+import os
+import numpy as np
+
+# 新鲜度衰减：推文每经过 half-life 小时，新鲜度分数减半
+RECENCY_HALF_LIFE_HOURS = float(os.getenv("RECOMMENDATION_HALF_LIFE_HOURS", "48"))
+# 最终分数 = (1 - w) * 余弦相似度 + w * 新鲜度
+RECENCY_WEIGHT = float(os.getenv("RECOMMENDATION_RECENCY_WEIGHT", "0.3"))
+# 用户兴趣向量中，最近收藏标题相对于分类的权重
+RECENT_TITLE_WEIGHT = 0.5
+
+
+def build_post_text(title: str | None, summary: str | None, tags: str | None) -> str:
+    """拼接用于向量化的推文文本"""
+    parts = [title or "", summary or "", f"Tags: {tags}" if tags else ""]
+    return "\n".join(part for part in parts if part).strip() or "Untitled"
+
+
+def vector_to_bytes(vector: np.ndarray) -> bytes:
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def vector_from_bytes(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype=np.float32)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def build_interest_vector(
+    category_vectors: np.ndarray,
+    category_counts: list[int],
+    title_vectors: np.ndarray | None = None,
+) -> np.ndarray:
+    """
+    用户兴趣向量：按收藏数量加权的分类向量，加上最近收藏标题向量的均值
+    """
+    weights = np.asarray(category_counts, dtype=np.float32)
+    weights = weights / weights.sum()
+    interest = (_normalize(category_vectors) * weights[:, None]).sum(axis=0)
+    if title_vectors is not None and len(title_vectors):
+        interest = interest + RECENT_TITLE_WEIGHT * _normalize(title_vectors).mean(axis=0)
+    return _normalize(interest)
+
+
+def rank_posts(
+    interest: np.ndarray,
+    post_vectors: np.ndarray,
+    ages_hours: np.ndarray,
+    top_n: int,
+) -> list[tuple[int, float]]:
+    """
+    余弦相似度 + 新鲜度衰减排序
+
+    Returns:
+        [(row index in post_vectors, score), ...]，按分数从高到低
+    """
+    if not len(post_vectors):
+        return []
+    similarity = _normalize(post_vectors) @ _normalize(interest)
+    recency = np.power(0.5, np.maximum(ages_hours, 0) / RECENCY_HALF_LIFE_HOURS)
+    scores = (1 - RECENCY_WEIGHT) * similarity + RECENCY_WEIGHT * recency
+    top_n = min(top_n, len(scores))
+    top = np.argpartition(-scores, top_n - 1)[:top_n]
+    top = top[np.argsort(-scores[top])]
+    return [(int(i), float(scores[i])) for i in top]
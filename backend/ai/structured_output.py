@@ -0,0 +1,118 @@
+import json
+
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f", "/": "/", "\\": "\\", '"': '"'}
+
+
+def _decode_partial_string(text: str, start: int) -> str:
+    """解码未结束的 JSON 字符串（start 指向开头引号之后），不完整的转义序列留到下一次"""
+    out = []
+    i = start
+    while i < len(text):
+        ch = text[i]
+        if ch == '"':
+            break
+        if ch == "\\":
+            if i + 1 >= len(text):
+                break
+            esc = text[i + 1]
+            if esc == "u":
+                if i + 6 > len(text):
+                    break
+                try:
+                    out.append(chr(int(text[i + 2 : i + 6], 16)))
+                except ValueError:
+                    break
+                i += 6
+                continue
+            out.append(_ESCAPES.get(esc, esc))
+            i += 2
+            continue
+        out.append(ch)
+        i += 1
+    decoded = "".join(out)
+    # 代理对的前半部分要等后半部分到达后再输出
+    if decoded and "\ud800" <= decoded[-1] <= "\udbff":
+        decoded = decoded[:-1]
+    return decoded.encode("utf-16", "surrogatepass").decode("utf-16", "replace")
+
+
+class StreamingJSONObjectParser:
+    """
+    增量解析流式输出的单个 JSON 对象。
+
+    每次 feed 返回新解析完成的顶层字段；stream_keys 中的字符串字段在完成之前
+    也会返回已经生成的增量文本，用于边生成边推送。
+    """
+
+    def __init__(self, stream_keys: tuple[str, ...] = ()):
+        self.stream_keys = stream_keys
+        self.buffer = ""
+        self.fields: dict = {}
+        self.done = False
+        self._decoder = json.JSONDecoder()
+        self._pos: int | None = None  # 下一个字段的起始位置
+        self._emitted: dict[str, int] = {}  # 流式字段已输出的长度
+
+    def _skip(self, i: int, chars: str = " \t\r\n") -> int:
+        while i < len(self.buffer) and self.buffer[i] in chars:
+            i += 1
+        return i
+
+    def feed(self, text: str) -> tuple[dict, dict[str, str]]:
+        """
+        Returns:
+            (新完成的字段, 流式字段的增量文本)
+        """
+        self.buffer += text
+        completed: dict = {}
+        deltas: dict[str, str] = {}
+        if self._pos is None:
+            start = self.buffer.find("{")
+            if start < 0:
+                return completed, deltas
+            self._pos = start + 1
+
+        while not self.done:
+            i = self._skip(self._pos, " \t\r\n,")
+            if i >= len(self.buffer):
+                break
+            if self.buffer[i] == "}":
+                self.done = True
+                break
+            try:
+                key, i = self._decoder.raw_decode(self.buffer, i)
+            except json.JSONDecodeError:
+                break
+            i = self._skip(i)
+            if i >= len(self.buffer):
+                break
+            if self.buffer[i] != ":":
+                # 不是合法的 JSON 对象，停止解析，由调用方整体解析
+                self.done = True
+                break
+            i = self._skip(i + 1)
+            if i >= len(self.buffer):
+                break
+            try:
+                value, end = self._decoder.raw_decode(self.buffer, i)
+            except json.JSONDecodeError:
+                value, end = None, -1
+            # 数字在缓冲区末尾时可能还没有输出完
+            if end >= 0 and (end < len(self.buffer) or self.buffer[i] in '"[{'):
+                self.fields[key] = value
+                completed[key] = value
+                if key in self.stream_keys and isinstance(value, str):
+                    remaining = value[self._emitted.get(key, 0) :]
+                    if remaining:
+                        deltas[key] = deltas.get(key, "") + remaining
+                    self._emitted[key] = len(value)
+                self._pos = end
+                continue
+            if key in self.stream_keys and self.buffer[i] == '"':
+                partial = _decode_partial_string(self.buffer, i + 1)
+                emitted = self._emitted.get(key, 0)
+                if len(partial) > emitted:
+                    deltas[key] = deltas.get(key, "") + partial[emitted:]
+                    self._emitted[key] = len(partial)
+            break
+        return completed, deltas
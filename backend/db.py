@@ -37,9 +37,14 @@ async def create_tables():
     This should be called when the application starts.
     """
     from backend.model import Base  # Import here to avoid circular imports
+    from backend.utils.fulltext_index import create_fulltext_index
+    from backend.utils.migrations import run_migrations
 
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(run_migrations)
+        # 检测全文索引是否可用（索引本身由迁移创建）
+        await conn.run_sync(create_fulltext_index)
 
 
 async def drop_tables():
@@ -1,83 +1,382 @@
 import os
-import chromadb
+import asyncio
+import threading
+from collections import OrderedDict
 from pathlib import Path
+from typing import Any, Callable
 from loguru import logger
-from chromadb.utils.embedding_functions import OpenAIEmbeddingFunction
+
+from backend.knowledge_base.embedding_cache import embedding_cache
+from backend.knowledge_base.embedding_scheduler import embedding_scheduler
+
+# chromadb、客户端和嵌入函数在第一次使用时才加载，导入本模块不会变慢
+
+# 集合元数据中记录生成向量的嵌入模型
+EMBEDDING_MODEL_KEY = "embedding_model"
+# 缓存的集合句柄数量（LRU）
+CHROMA_COLLECTION_CACHE_SIZE = int(os.getenv("CHROMA_COLLECTION_CACHE_SIZE", "128"))
+
+
+class EmbeddingModelMismatch(ValueError):
+    """知识库中的向量由其他嵌入模型生成，需要删除后重建"""
 
 
 class ChromaDBManager:
-    def __init__(self, emb_api_key: str, emb_base_url: str, emb_model_name: str) -> None:
-        self.chroma_client = chromadb.PersistentClient(
-            path=Path(__file__).parent.parent / "chroma_db",
-        )
+    def __init__(
+        self,
+        emb_api_key: str,
+        emb_base_url: str,
+        emb_model_name: str,
+        local_model_path: str = "",
+        collection_cache_size: int = CHROMA_COLLECTION_CACHE_SIZE,
+    ) -> None:
+        self.emb_api_key = emb_api_key
+        self.emb_base_url = emb_base_url
+        self.emb_model_name = emb_model_name
+        self.local_model_path = local_model_path
+        self._client = None
+        self._init_lock = threading.RLock()
+        self._embedding_initialized = False
+        self.embedding_function = None
+        # 嵌入后端：openai / onnx；None 表示由 Chroma 使用默认的嵌入函数
+        self.embedding_backend: str | None = None
+        self.embedding_model = "chroma/default"
+        # {集合名: (集合句柄, 是否已检查嵌入模型)}
+        self.collection_cache_size = max(collection_cache_size, 1)
+        self._collections: OrderedDict[str, tuple[Any, bool]] = OrderedDict()
+        self._collections_lock = threading.Lock()
+
+    @property
+    def chroma_client(self):
+        if self._client is None:
+            with self._init_lock:
+                if self._client is None:
+                    import chromadb
+
+                    self._client = chromadb.PersistentClient(
+                        path=Path(__file__).parent.parent / "chroma_db",
+                    )
+        return self._client
 
+    def _init_embedding(self) -> None:
+        if self._embedding_initialized:
+            return
+        with self._init_lock:
+            if not self._embedding_initialized:
+                self._load_embedding_function()
+                self._embedding_initialized = True
+
+    def _load_embedding_function(self) -> None:
         # 检查API配置是否完整
-        if not emb_api_key or not emb_base_url or not emb_model_name:
-            logger.warning(
-                "Embedding API configuration is incomplete. "
-                f"API Key: {'✓' if emb_api_key else '✗'}, "
-                f"Base URL: {'✓' if emb_base_url else '✗'}, "
-                f"Model: {'✓' if emb_model_name else '✗'}. "
-                "ChromaDB will run with default embedding function."
-            )
-            self.embedding_function = None
-            self.api_configured = False
-        else:
+        if self.emb_api_key and self.emb_base_url and self.emb_model_name:
             try:
+                from chromadb.utils.embedding_functions import OpenAIEmbeddingFunction
+
                 self.embedding_function = OpenAIEmbeddingFunction(
-                    api_base=emb_base_url,
-                    api_key=emb_api_key,
-                    model_name=emb_model_name,
+                    api_base=self.emb_base_url,
+                    api_key=self.emb_api_key,
+                    model_name=self.emb_model_name,
                 )
-                self.api_configured = True
+                self.embedding_backend = "openai"
+                self.embedding_model = f"openai/{self.emb_model_name}"
                 logger.info("ChromaDB initialized successfully with OpenAI embedding function.")
+                return
+            except Exception as e:
+                logger.warning(f"Failed to initialize OpenAI embedding function: {e}.")
+        elif not self.local_model_path:
+            logger.warning(
+                "Embedding API configuration is incomplete. "
+                f"API Key: {'✓' if self.emb_api_key else '✗'}, "
+                f"Base URL: {'✓' if self.emb_base_url else '✗'}, "
+                f"Model: {'✓' if self.emb_model_name else '✗'}."
+            )
+
+        if self.local_model_path:
+            try:
+                from backend.knowledge_base.local_embedding import ONNXSentenceEmbeddingFunction
+
+                self.embedding_function = ONNXSentenceEmbeddingFunction(self.local_model_path)
+                self.embedding_backend = "onnx"
+                self.embedding_model = self.embedding_function.model_id
+                logger.info(f"ChromaDB initialized with local embedding model {self.embedding_model}.")
+                return
             except Exception as e:
                 logger.warning(
-                    f"Failed to initialize OpenAI embedding function: {e}. Using default embedding."
+                    f"Failed to load local embedding model from {self.local_model_path}: {e}."
                 )
-                self.embedding_function = None
-                self.api_configured = False
+
+        logger.warning("ChromaDB will run with default embedding function.")
+
+    def _check_embedding_model(self, collection) -> None:
+        """
+        确认集合中的向量由当前的嵌入模型生成；新集合、空集合以及能从 Chroma 持久化配置
+        推断出相同模型的旧集合会记录当前模型
+        """
+        metadata = dict(collection.metadata or {})
+        recorded = metadata.get(EMBEDDING_MODEL_KEY)
+        if recorded == self.embedding_model:
+            return
+        if recorded is None:
+            ef_config = (collection.configuration_json or {}).get("embedding_function") or {}
+            if ef_config.get("name") == "openai":
+                recorded = f"openai/{(ef_config.get('config') or {}).get('model_name')}"
+            elif ef_config.get("name") == "default":
+                recorded = "chroma/default"
+        count = collection.count()
+        if recorded is None and count > 0:
+            # 旧集合的嵌入函数配置没有持久化（type 为 legacy），至少确认向量维度一致
+            stored = collection.get(limit=1, include=["embeddings"])["embeddings"]  # type: ignore
+            probe = self._embed(["embedding dimension probe"])
+            if stored is not None and len(stored) and probe is not None:
+                if len(stored[0]) != len(probe[0]):
+                    recorded = f"unknown ({len(stored[0])}-dim)"
+        if recorded not in (None, self.embedding_model) and count > 0:
+            raise EmbeddingModelMismatch(
+                f"Knowledge base '{collection.name}' was built with embedding model "
+                f"'{recorded}', but the current model is '{self.embedding_model}'. "
+                "Rebuild it with scripts/resync_knowledge_bases.py --recreate."
+            )
+        metadata[EMBEDDING_MODEL_KEY] = self.embedding_model
+        collection.modify(metadata=metadata)
 
     def create_collection(self, name: str):
         """创建一个新的集合"""
-        if self.api_configured:
-            return self.chroma_client.get_or_create_collection(
-                name=name,
-                embedding_function=self.embedding_function,  # type: ignore
-            )
+        return self._get_collection(name, create=True)
+
+    def _get_collection(self, collection_name: str, create: bool = False, check_model: bool = True):
+        """打开集合，句柄按 LRU 缓存，嵌入模型只在第一次需要时检查"""
+        self._init_embedding()
+        with self._collections_lock:
+            entry = self._collections.get(collection_name)
+            if entry is not None:
+                self._collections.move_to_end(collection_name)
+
+        if entry is None:
+            if self.embedding_function is not None:
+                # 向量在写入和查询前自行计算，不把嵌入函数交给 Chroma，
+                # 避免与集合中持久化的嵌入函数配置冲突；模型一致性由 _check_embedding_model 检查
+                kwargs = {"embedding_function": None}
+            else:
+                logger.warning(
+                    f"Accessing collection '{collection_name}' without custom embedding function."
+                )
+                kwargs = {}
+            if create:
+                collection = self.chroma_client.get_or_create_collection(
+                    name=collection_name, **kwargs
+                )
+            else:
+                collection = self.chroma_client.get_collection(name=collection_name, **kwargs)
+            checked = False
         else:
-            logger.warning(
-                f"Creating collection '{name}' without custom embedding function due to missing API configuration."
-            )
-            return self.chroma_client.get_or_create_collection(name=name)
+            collection, checked = entry
 
-    def upsert(self, collection_name: str, documents: list[str], ids: list[str]):
-        """向指定集合中插入或更新文档"""
-        if self.api_configured:
-            collection = self.chroma_client.get_collection(
-                name=collection_name,
-                embedding_function=self.embedding_function,  # type: ignore
-            )
+        if check_model and not checked:
+            self._check_embedding_model(collection)
+            checked = True
+        with self._collections_lock:
+            self._collections[collection_name] = (collection, checked)
+            self._collections.move_to_end(collection_name)
+            while len(self._collections) > self.collection_cache_size:
+                self._collections.popitem(last=False)
+        return collection
+
+    def invalidate_collection(self, collection_name: str) -> bool:
+        """丢弃缓存的集合句柄，返回是否存在缓存"""
+        with self._collections_lock:
+            return self._collections.pop(collection_name, None) is not None
+
+    def _with_collection(
+        self, collection_name: str, fn: Callable[[Any], Any], check_model: bool = True
+    ):
+        """
+        用集合句柄执行操作；缓存的句柄已失效时（集合被其他进程删除或重建）重新打开后重试一次
+        """
+        from chromadb.errors import NotFoundError
+
+        try:
+            return fn(self._get_collection(collection_name, check_model=check_model))
+        except NotFoundError:
+            if not self.invalidate_collection(collection_name):
+                raise
+            return fn(self._get_collection(collection_name, check_model=check_model))
+
+    def _embed(self, texts: list[str]):
+        """
+        通过嵌入缓存计算向量，只有未命中的文本会经调度器分批请求嵌入接口；
+        本地模型自行分批推理，不经过调度器；
+        未配置嵌入模型时返回 None，由 Chroma 使用默认的嵌入函数
+        """
+        self._init_embedding()
+        if self.embedding_function is None or not texts:
+            return None
+        if self.embedding_backend == "onnx":
+            embed_fn = self.embedding_function
         else:
-            logger.warning(
-                f"Accessing collection '{collection_name}' without custom embedding function."
+            embed_fn = lambda missing: embedding_scheduler.embed(  # noqa: E731
+                missing, self.embedding_function  # type: ignore
             )
-            collection = self.chroma_client.get_collection(name=collection_name)
-        collection.upsert(documents=documents, ids=ids)
+        return embedding_cache.embed(self.embedding_model, texts, embed_fn)
+
+    def upsert(
+        self,
+        collection_name: str,
+        documents: list[str],
+        ids: list[str],
+        metadatas: list[dict] | None = None,
+    ):
+        """向指定集合中插入或更新文档"""
+        embeddings = self._embed(documents)
+        self._with_collection(
+            collection_name,
+            lambda collection: collection.upsert(
+                documents=documents,
+                ids=ids,
+                metadatas=metadatas,  # type: ignore
+                embeddings=embeddings,  # type: ignore
+            ),
+        )
 
     def query(self, collection_name: str, query: str, n_results: int = 5):
         """查询指定集合中的文档"""
-        if self.api_configured:
-            collection = self.chroma_client.get_collection(
-                name=collection_name, embedding_function=self.embedding_function  # type: ignore
-            )
-        else:
-            logger.warning(
-                f"Querying collection '{collection_name}' without custom embedding function."
+        query_embeddings = self._embed([query])
+
+        def run(collection):
+            if query_embeddings is None:
+                return collection.query(query_texts=[query], n_results=n_results)
+            return collection.query(query_embeddings=query_embeddings, n_results=n_results)
+
+        return self._with_collection(collection_name, run)
+
+    def sync_collection_chunks(
+        self,
+        collection_name: str,
+        collection_id: int,
+        chunks: dict[str, str],
+        metadata: dict,
+    ) -> tuple[int, int]:
+        """
+        把一个 collection 的分块同步到知识库：只写入（嵌入）新增的分块，删除已经不存在的分块
+
+        Args:
+            chunks: {chunk_id: document}，chunk_id 由 collection id 和分块内容哈希得到
+            metadata: 写入每个分块的元数据，必须包含 collection_id
+
+        Returns:
+            (新增数量, 删除数量)
+        """
+
+        def run(collection):
+            existing = set(
+                collection.get(where={"collection_id": collection_id}, include=[])["ids"]
             )
-            collection = self.chroma_client.get_collection(name=collection_name)
-        results = collection.query(query_texts=[query], n_results=n_results)
-        return results
+            new_ids = [chunk_id for chunk_id in chunks if chunk_id not in existing]
+            stale_ids = list(existing - chunks.keys())
+            if new_ids:
+                documents = [chunks[chunk_id] for chunk_id in new_ids]
+                collection.upsert(
+                    ids=new_ids,
+                    documents=documents,
+                    metadatas=[metadata] * len(new_ids),
+                    embeddings=self._embed(documents),  # type: ignore
+                )
+            if stale_ids:
+                collection.delete(ids=stale_ids)
+            return len(new_ids), len(stale_ids)
+
+        return self._with_collection(collection_name, run)
+
+    def delete_collection_chunks(self, collection_name: str, collection_id: int) -> int:
+        """删除一个 collection 在知识库中的全部分块，知识库不存在时忽略"""
+        from chromadb.errors import NotFoundError
+
+        def run(collection):
+            ids = collection.get(where={"collection_id": collection_id}, include=[])["ids"]
+            if ids:
+                collection.delete(ids=ids)
+            return len(ids)
+
+        try:
+            return self._with_collection(collection_name, run, check_model=False)
+        except (NotFoundError, ValueError):
+            return 0
+
+    def delete_orphan_chunks(self, collection_name: str, keep_collection_ids: set[int]) -> int:
+        """删除不属于 keep_collection_ids 的分块（包括没有元数据的旧分块）"""
+
+        def run(collection):
+            result = collection.get(include=["metadatas"])  # type: ignore
+            orphan_ids = [
+                chunk_id
+                for chunk_id, metadata in zip(result["ids"], result["metadatas"] or [])
+                if not metadata or metadata.get("collection_id") not in keep_collection_ids
+            ]
+            if orphan_ids:
+                collection.delete(ids=orphan_ids)
+            return len(orphan_ids)
+
+        return self._with_collection(collection_name, run, check_model=False)
+
+    def delete_collection(self, name: str) -> None:
+        """删除整个知识库集合，不存在时忽略"""
+        from chromadb.errors import NotFoundError
+
+        self.invalidate_collection(name)
+        try:
+            self.chroma_client.delete_collection(name=name)
+        except (NotFoundError, ValueError):
+            pass
+
+
+class AsyncChromaDBManager:
+    """
+    ChromaDBManager 的异步接口：同步的 Chroma 调用和嵌入计算放到线程池中执行，
+    调用方不需要自己包装 asyncio.to_thread
+    """
+
+    def __init__(self, manager: ChromaDBManager) -> None:
+        self.manager = manager
+
+    async def create_collection(self, name: str):
+        return await asyncio.to_thread(self.manager.create_collection, name)
+
+    async def upsert(
+        self,
+        collection_name: str,
+        documents: list[str],
+        ids: list[str],
+        metadatas: list[dict] | None = None,
+    ) -> None:
+        await asyncio.to_thread(self.manager.upsert, collection_name, documents, ids, metadatas)
+
+    async def query(self, collection_name: str, query: str, n_results: int = 5):
+        return await asyncio.to_thread(self.manager.query, collection_name, query, n_results)
+
+    async def sync_collection_chunks(
+        self,
+        collection_name: str,
+        collection_id: int,
+        chunks: dict[str, str],
+        metadata: dict,
+    ) -> tuple[int, int]:
+        return await asyncio.to_thread(
+            self.manager.sync_collection_chunks, collection_name, collection_id, chunks, metadata
+        )
+
+    async def delete_collection_chunks(self, collection_name: str, collection_id: int) -> int:
+        return await asyncio.to_thread(
+            self.manager.delete_collection_chunks, collection_name, collection_id
+        )
+
+    async def delete_orphan_chunks(
+        self, collection_name: str, keep_collection_ids: set[int]
+    ) -> int:
+        return await asyncio.to_thread(
+            self.manager.delete_orphan_chunks, collection_name, keep_collection_ids
+        )
+
+    async def delete_collection(self, name: str) -> None:
+        await asyncio.to_thread(self.manager.delete_collection, name)
 
 
 # global
@@ -85,4 +384,7 @@ chroma_db_manager = ChromaDBManager(
     emb_api_key=os.getenv("EMBEDDING_API_KEY", ""),
     emb_base_url=os.getenv("EMBEDDING_API_BASE_URL", "https://api.openai.com/v1/embeddings"),
     emb_model_name=os.getenv("EMBEDDING_MODEL", "text-embedding-3-small"),
+    # 未配置嵌入接口时使用的本地 ONNX 句向量模型目录
+    local_model_path=os.getenv("EMBEDDING_LOCAL_MODEL_PATH", ""),
 )
+async_chroma_db_manager = AsyncChromaDBManager(chroma_db_manager)
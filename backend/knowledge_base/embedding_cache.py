@@ -0,0 +1,166 @@
+"""
+内容寻址的嵌入向量缓存：key 为 (模型名, 规范化后的文本哈希)，向量以 float16 / float32
+二进制存放在 SQLite 文件中，多个 worker 进程共用，重启后仍然有效。
+
+同一篇文章被多个用户收藏、社区复制的收藏、知识库重建等重复的分块只需嵌入一次。
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import unicodedata
+from contextlib import closing
+from pathlib import Path
+from typing import Callable, Sequence
+
+import numpy as np
+
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH", str(Path(__file__).parent.parent / "embedding_cache.db")
+)
+# float16 占用一半空间，对相似度检索的影响可以忽略
+EMBEDDING_CACHE_DTYPE = os.getenv("EMBEDDING_CACHE_DTYPE", "float16")
+# 最多缓存的向量数量，超出后淘汰最早写入的，0 表示不限制
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "500000"))
+
+_DTYPES = {"float16": "<f2", "float32": "<f4"}
+# SQLite 单条语句的参数数量有上限，分批查询
+_LOOKUP_BATCH = 500
+
+
+def normalize_text(text: str) -> str:
+    """NFC 规范化并合并空白，只有空白差异的分块共用同一个向量"""
+    return unicodedata.normalize("NFC", " ".join(text.split()))
+
+
+def cache_key(model: str, text: str) -> bytes:
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    def __init__(
+        self,
+        path: str | Path = EMBEDDING_CACHE_PATH,
+        dtype: str = EMBEDDING_CACHE_DTYPE,
+        max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+    ) -> None:
+        if dtype not in _DTYPES:
+            raise ValueError(f"Unsupported embedding cache dtype: {dtype}")
+        self.path = str(path)
+        self.dtype_name = dtype
+        self.dtype = _DTYPES[dtype]
+        self.max_entries = max_entries
+        self._initialized = False
+        # 本进程的命中统计
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "id INTEGER PRIMARY KEY, key BLOB NOT NULL UNIQUE, model TEXT NOT NULL, "
+                "dtype TEXT NOT NULL, vector BLOB NOT NULL)"
+            )
+            self._initialized = True
+        return conn
+
+    def get_many(self, model: str, texts: Sequence[str]) -> list[np.ndarray | None]:
+        """按顺序返回缓存的 float32 向量，未命中的位置为 None"""
+        keys = [cache_key(model, text) for text in texts]
+        found: dict[bytes, np.ndarray] = {}
+        with closing(self._connect()) as conn:
+            unique = list(dict.fromkeys(keys))
+            for start in range(0, len(unique), _LOOKUP_BATCH):
+                batch = unique[start : start + _LOOKUP_BATCH]
+                rows = conn.execute(
+                    "SELECT key, dtype, vector FROM embeddings "
+                    f"WHERE key IN ({', '.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                for key, dtype, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=dtype).astype(np.float32)
+        result = [found.get(key) for key in keys]
+        hits = sum(1 for vector in result if vector is not None)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(result) - hits
+        return result
+
+    def put_many(self, model: str, texts: Sequence[str], vectors: Sequence) -> None:
+        rows = [
+            (
+                cache_key(model, text),
+                model,
+                self.dtype,
+                np.asarray(vector, dtype=self.dtype).tobytes(),
+            )
+            for text, vector in zip(texts, vectors)
+        ]
+        if not rows:
+            return
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, model, dtype, vector) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            if self.max_entries > 0:
+                # 淘汰最早写入的向量；只从小 id 一端删除，id 基本连续，max(id) - max_entries 即为边界
+                conn.execute(
+                    "DELETE FROM embeddings WHERE id <= (SELECT max(id) FROM embeddings) - ?",
+                    (self.max_entries,),
+                )
+            conn.execute("COMMIT")
+
+    def embed(
+        self,
+        model: str,
+        texts: Sequence[str],
+        embed_fn: Callable[[list[str]], Sequence],
+    ) -> list[np.ndarray]:
+        """
+        读取缓存的向量，只把未命中的文本（去重后）交给 embed_fn 计算并写入缓存
+        """
+        vectors = self.get_many(model, texts)
+        missing: dict[bytes, str] = {}
+        for text, vector in zip(texts, vectors):
+            if vector is None:
+                missing.setdefault(cache_key(model, text), text)
+        if missing:
+            miss_texts = list(missing.values())
+            computed = embed_fn(miss_texts)
+            self.put_many(model, miss_texts, computed)
+            by_key = {
+                key: np.asarray(vector, dtype=np.float32)
+                for key, vector in zip(missing, computed)
+            }
+            vectors = [
+                vector if vector is not None else by_key[cache_key(model, text)]
+                for text, vector in zip(texts, vectors)
+            ]
+        return vectors  # type: ignore
+
+    def stats(self) -> dict:
+        with closing(self._connect()) as conn:
+            entries, size = conn.execute(
+                "SELECT count(*), coalesce(sum(length(vector)), 0) FROM embeddings"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "entries": entries,
+            "vector_bytes": size,
+            "dtype": self.dtype_name,
+            "max_entries": self.max_entries,
+        }
+
+
+# global
+embedding_cache = EmbeddingCache()
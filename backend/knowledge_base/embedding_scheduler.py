@@ -0,0 +1,239 @@
+"""
+嵌入请求调度：把各个线程提交的文本合并后按 token 上限切成批次，在并发数和 RPM / TPM
+限制内并发请求嵌入接口，遇到 429 时退避重试。
+
+ChromaDBManager 的方法在线程池中同步执行，并发的知识库同步各自只提交少量分块，
+调度线程会等待一个很短的合并窗口，把它们合并成共享的批次。
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Sequence
+
+from loguru import logger
+
+from backend.utils.content_reducer import count_tokens
+
+# 单个嵌入请求的 token 和文本数量上限
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "20000"))
+EMBEDDING_BATCH_MAX_INPUTS = int(os.getenv("EMBEDDING_BATCH_MAX_INPUTS", "256"))
+# 同时进行的嵌入请求数
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+# 每分钟请求数 / token 数上限，0 表示不限制
+EMBEDDING_RPM = int(os.getenv("EMBEDDING_RPM", "0"))
+EMBEDDING_TPM = int(os.getenv("EMBEDDING_TPM", "0"))
+# 合并窗口：等待其他线程提交的文本，凑满一个批次时立即发送
+EMBEDDING_BATCH_WAIT_MS = int(os.getenv("EMBEDDING_BATCH_WAIT_MS", "20"))
+# 429 重试次数和初始退避时间（秒），响应中有 Retry-After 时优先使用
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "5"))
+EMBEDDING_RETRY_BACKOFF = float(os.getenv("EMBEDDING_RETRY_BACKOFF", "1"))
+
+EmbedFn = Callable[[list[str]], Sequence]
+
+
+class RateLimiter:
+    """RPM / TPM 令牌桶，acquire 会阻塞到额度足够"""
+
+    def __init__(self, rpm: int, tpm: int) -> None:
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def acquire(self, tokens: int) -> None:
+        if not self.rpm and not self.tpm:
+            return
+        # 超过每分钟上限的单个批次按上限计算，否则永远等不到
+        tokens = min(tokens, self.tpm) if self.tpm else 0
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                wait = 0.0
+                if self.rpm and self._requests < 1:
+                    wait = (1 - self._requests) * 60 / self.rpm
+                if self.tpm and self._tokens < tokens:
+                    wait = max(wait, (tokens - self._tokens) * 60 / self.tpm)
+                if wait <= 0:
+                    if self.rpm:
+                        self._requests -= 1
+                    if self.tpm:
+                        self._tokens -= tokens
+                    return
+            time.sleep(wait)
+
+
+@dataclass
+class _Item:
+    text: str
+    tokens: int
+    future: Future = field(default_factory=Future)
+
+
+def _retry_after(error: Exception) -> float | None:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    value = headers.get("retry-after") if headers is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429
+
+
+class EmbeddingScheduler:
+    def __init__(
+        self,
+        max_batch_tokens: int = EMBEDDING_BATCH_MAX_TOKENS,
+        max_batch_inputs: int = EMBEDDING_BATCH_MAX_INPUTS,
+        concurrency: int = EMBEDDING_CONCURRENCY,
+        rpm: int = EMBEDDING_RPM,
+        tpm: int = EMBEDDING_TPM,
+        wait_ms: int = EMBEDDING_BATCH_WAIT_MS,
+        max_retries: int = EMBEDDING_MAX_RETRIES,
+        retry_backoff: float = EMBEDDING_RETRY_BACKOFF,
+    ) -> None:
+        self.max_batch_tokens = max(max_batch_tokens, 1)
+        self.max_batch_inputs = max(max_batch_inputs, 1)
+        self.concurrency = max(concurrency, 1)
+        self.wait = wait_ms / 1000
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.rate_limiter = RateLimiter(rpm, tpm)
+        # 每个嵌入函数一个待发送队列，不同模型的文本不会合并到同一批次
+        self._pending: dict[int, tuple[EmbedFn, deque[_Item]]] = {}
+        self._condition = threading.Condition()
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._executor: ThreadPoolExecutor | None = None
+        self._dispatcher: threading.Thread | None = None
+        self.requests = 0
+        self.retries = 0
+
+    def _start(self) -> None:
+        if self._dispatcher is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.concurrency, thread_name_prefix="embedding"
+            )
+            self._dispatcher = threading.Thread(
+                target=self._dispatch_loop, name="embedding-dispatcher", daemon=True
+            )
+            self._dispatcher.start()
+
+    def embed(self, texts: Sequence[str], embed_fn: EmbedFn) -> list:
+        """
+        阻塞直到所有文本嵌入完成，按输入顺序返回向量；可以在任意线程中并发调用
+        """
+        if not texts:
+            return []
+        items = [_Item(text, count_tokens(text)) for text in texts]
+        with self._condition:
+            self._start()
+            _, queue = self._pending.setdefault(id(embed_fn), (embed_fn, deque()))
+            queue.extend(items)
+            self._condition.notify()
+        return [item.future.result() for item in items]
+
+    def _batch_full(self) -> bool:
+        """已排队的文本足够组成一个完整批次，调用时持有 _condition"""
+        tokens = inputs = 0
+        for _, queue in self._pending.values():
+            inputs += len(queue)
+            tokens += sum(item.tokens for item in queue)
+        return tokens >= self.max_batch_tokens or inputs >= self.max_batch_inputs
+
+    def _cut_batch(self) -> tuple[EmbedFn, list[_Item]] | None:
+        """从最早有文本的队列中取出一个批次，调用时持有 _condition"""
+        for key, (embed_fn, queue) in list(self._pending.items()):
+            if not queue:
+                del self._pending[key]
+                continue
+            batch = [queue.popleft()]
+            tokens = batch[0].tokens
+            while (
+                queue
+                and len(batch) < self.max_batch_inputs
+                and tokens + queue[0].tokens <= self.max_batch_tokens
+            ):
+                tokens += queue[0].tokens
+                batch.append(queue.popleft())
+            if not queue:
+                del self._pending[key]
+            return embed_fn, batch
+        return None
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            # 先占用一个并发槽位再切分批次，等待期间到达的文本还能合并进来
+            self._slots.acquire()
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                deadline = time.monotonic() + self.wait
+                while not self._batch_full():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                cut = self._cut_batch()
+            if cut is None:
+                self._slots.release()
+                continue
+            self._executor.submit(self._run_batch, *cut)  # type: ignore
+
+    def _run_batch(self, embed_fn: EmbedFn, batch: list[_Item]) -> None:
+        try:
+            texts = [item.text for item in batch]
+            tokens = sum(item.tokens for item in batch)
+            attempt = 0
+            while True:
+                self.rate_limiter.acquire(tokens)
+                self.requests += 1
+                try:
+                    vectors = embed_fn(texts)
+                    break
+                except Exception as e:
+                    if not _is_rate_limited(e) or attempt >= self.max_retries:
+                        raise
+                    delay = _retry_after(e) or self.retry_backoff * 2**attempt
+                    attempt += 1
+                    self.retries += 1
+                    logger.warning(
+                        f"Embedding request rate limited, retry {attempt}/{self.max_retries} "
+                        f"in {delay:.1f}s"
+                    )
+                    time.sleep(delay)
+            if len(vectors) != len(batch):
+                raise ValueError(f"Expected {len(batch)} embeddings, got {len(vectors)}")
+            for item, vector in zip(batch, vectors):
+                item.future.set_result(vector)
+        except Exception as e:
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+        finally:
+            self._slots.release()
+
+    def stats(self) -> dict:
+        with self._condition:
+            queued = sum(len(queue) for _, queue in self._pending.values())
+        return {"requests": self.requests, "retries": self.retries, "queued_inputs": queued}
+
+
+# global
+embedding_scheduler = EmbeddingScheduler()
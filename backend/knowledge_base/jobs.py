@@ -0,0 +1,197 @@
+"""
+知识库相关的后台任务，由 backend.utils.job_queue 调度执行
+
+分块 id 由 collection id 和分块内容的哈希得到，重复同步不会产生重复向量，
+只有新增或修改过的分块需要重新嵌入；每个分块的元数据中记录 collection_id 和 category_id，
+collection 修改、删除或移动分类后可以找到并删除过期的分块。
+"""
+
+import asyncio
+import hashlib
+import uuid
+from contextlib import asynccontextmanager
+from typing import Iterable
+
+from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.db import AsyncSessionLocal
+from backend.model import Category, Collection
+from backend.knowledge_base.chromadb_mgr import async_chroma_db_manager
+from backend.utils.content_store import load_content, load_contents
+from backend.utils.job_queue import job_queue
+from backend.utils.text_splitter import recursive_text_splitter
+
+KB_BUILD_JOB = "kb_build"
+KB_UPSERT_JOB = "kb_upsert"
+KB_DROP_JOB = "kb_drop"
+
+# 同一个 collection 在同一个知识库上的同步串行执行，避免旧内容覆盖新内容
+_sync_locks: dict[tuple[str, int], tuple[asyncio.Lock, int]] = {}
+
+
+def knowledge_base_name(category_id: int) -> str:
+    """分类对应的 ChromaDB 集合名，重试构建时会复用同一个集合"""
+    return f"kb_{uuid.uuid5(uuid.NAMESPACE_URL, f'memora:category:{category_id}')}"
+
+
+def chunk_documents(collection_id: int, content: str | None) -> dict[str, str]:
+    """切分正文，返回 {chunk_id: document}"""
+    chunks: dict[str, str] = {}
+    if isinstance(content, str) and content.strip():
+        for chunk in recursive_text_splitter.split_text(content):
+            digest = hashlib.sha256(chunk.encode("utf-8")).hexdigest()[:32]
+            chunks.setdefault(f"{collection_id}-{digest}", chunk)
+    return chunks
+
+
+@asynccontextmanager
+async def _collection_sync_lock(knowledge_base_id: str, collection_id: int):
+    key = (knowledge_base_id, collection_id)
+    lock, users = _sync_locks.get(key, (asyncio.Lock(), 0))
+    _sync_locks[key] = (lock, users + 1)
+    try:
+        async with lock:
+            yield
+    finally:
+        lock, users = _sync_locks[key]
+        if users <= 1:
+            _sync_locks.pop(key, None)
+        else:
+            _sync_locks[key] = (lock, users - 1)
+
+
+async def enqueue_knowledge_base_sync(
+    db: AsyncSession,
+    collection_id: int,
+    category_ids: Iterable[int | None],
+    user_id: int | None = None,
+) -> None:
+    """
+    collection 的正文、分类变化或被删除后，为相关分类（例如移动前后的两个分类）的知识库
+    排队同步任务。任务执行时读取 collection 的最新状态，调用前需要先提交修改。
+    """
+    ids = {category_id for category_id in category_ids if category_id}
+    if not ids:
+        return
+    result = await db.execute(
+        select(Category.knowledge_base_id).where(
+            Category.id.in_(ids), Category.knowledge_base_id.is_not(None)
+        )
+    )
+    for knowledge_base_id in result.scalars().all():
+        await job_queue.enqueue(
+            db,
+            KB_UPSERT_JOB,
+            {"collection_id": collection_id, "knowledge_base_id": knowledge_base_id},
+            user_id=user_id,
+        )
+
+
+@job_queue.register(KB_BUILD_JOB, concurrency=1, max_attempts=3, backoff=30)
+async def build_knowledge_base(payload: dict) -> dict | None:
+    """
+    为分类创建知识库并写入分类下所有 collection 的正文；知识库已存在时做一次完整同步，
+    删除不属于该分类的分块（包括旧版本用随机 id 写入的分块）。
+    payload 中 recreate 为 true 时先删除整个集合，用当前的嵌入模型重新嵌入
+    """
+    category_id = payload["category_id"]
+    user_id = payload["user_id"]
+    async with AsyncSessionLocal() as db:
+        category = await db.get(Category, category_id)
+        if not category:
+            logger.error(f"Category {category_id} not found during knowledge base build")
+            return {"skipped": "category not found"}
+
+        collection_name = category.knowledge_base_id or knowledge_base_name(category_id)
+        if payload.get("recreate"):
+            await async_chroma_db_manager.delete_collection(collection_name)  # type: ignore
+
+        await async_chroma_db_manager.create_collection(collection_name)  # type: ignore
+
+        stmt = select(Collection.id).where(
+            Collection.category_id == category_id,
+            Collection.user_id == user_id,
+        )
+        result = await db.execute(stmt)
+        collection_ids = list(result.scalars().all())
+        contents = await load_contents(db, collection_ids)
+
+        added = removed = 0
+        for collection_id in collection_ids:
+            chunks = await asyncio.to_thread(
+                chunk_documents, collection_id, contents.get(collection_id)
+            )
+            async with _collection_sync_lock(collection_name, collection_id):  # type: ignore
+                synced = await async_chroma_db_manager.sync_collection_chunks(
+                    collection_name,  # type: ignore
+                    collection_id,
+                    chunks,
+                    {"collection_id": collection_id, "category_id": category_id},
+                )
+            added += synced[0]
+            removed += synced[1]
+        removed += await async_chroma_db_manager.delete_orphan_chunks(
+            collection_name, set(collection_ids)  # type: ignore
+        )
+        logger.info(
+            f"Knowledge base {collection_name} for category {category_id} synced: "
+            f"{len(collection_ids)} collections, {added} chunks added, {removed} removed"
+        )
+
+        # Update the category with the knowledge base ID
+        category.knowledge_base_id = collection_name  # type: ignore
+        await db.commit()
+
+    return {"knowledge_base_id": collection_name, "added": added, "removed": removed}
+
+
+@job_queue.register(KB_UPSERT_JOB, concurrency=2, max_attempts=5, backoff=10)
+async def sync_collection_to_knowledge_base(payload: dict) -> dict | None:
+    """
+    把单个 collection 同步到知识库：只嵌入新增或修改的分块并删除过期分块；
+    collection 已被删除或已不在该知识库所属的分类中时，删除它的全部分块
+    """
+    collection_id = payload["collection_id"]
+    knowledge_base_id = payload["knowledge_base_id"]
+    async with _collection_sync_lock(knowledge_base_id, collection_id):
+        async with AsyncSessionLocal() as db:
+            row = (
+                await db.execute(
+                    select(Collection.category_id, Category.knowledge_base_id)
+                    .join(Category, Category.id == Collection.category_id)
+                    .where(Collection.id == collection_id)
+                )
+            ).first()
+            belongs = row is not None and row.knowledge_base_id == knowledge_base_id
+            content = await load_content(db, collection_id) if belongs else None
+
+        if not belongs:
+            removed = await async_chroma_db_manager.delete_collection_chunks(
+                knowledge_base_id, collection_id
+            )
+            logger.info(
+                f"Removed {removed} chunks of collection {collection_id} from {knowledge_base_id}"
+            )
+            return {"added": 0, "removed": removed}
+
+        chunks = await asyncio.to_thread(chunk_documents, collection_id, content)
+        added, removed = await async_chroma_db_manager.sync_collection_chunks(
+            knowledge_base_id,
+            collection_id,
+            chunks,
+            {"collection_id": collection_id, "category_id": row.category_id},  # type: ignore
+        )
+    logger.info(
+        f"Synced collection {collection_id} to {knowledge_base_id}: "
+        f"{added} chunks added, {removed} removed, {len(chunks) - added} unchanged"
+    )
+    return {"added": added, "removed": removed}
+
+
+@job_queue.register(KB_DROP_JOB, concurrency=1, max_attempts=3, backoff=30)
+async def drop_knowledge_base(payload: dict) -> dict | None:
+    """分类删除后删除它的知识库集合"""
+    await async_chroma_db_manager.delete_collection(payload["knowledge_base_id"])
+    return {"dropped": payload["knowledge_base_id"]}
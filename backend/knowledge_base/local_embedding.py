@@ -0,0 +1,149 @@
+"""
+本地 ONNX 句向量模型，未配置嵌入接口时使用，不需要网络。
+
+模型目录为 sentence-transformers 导出的 ONNX 格式：model.onnx（或 onnx/model.onnx）、
+tokenizer.json，可选的 1_Pooling/config.json 决定 mean / cls 池化。
+推理按批次执行，每个批次由 onnxruntime 的算子内线程占满所有 CPU 核心。
+"""
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from chromadb import Documents, EmbeddingFunction, Embeddings
+from chromadb.utils.embedding_functions import register_embedding_function
+
+try:
+    import onnxruntime
+    from tokenizers import Tokenizer
+except ImportError:  # 可选依赖，未安装时不能使用本地模型
+    onnxruntime = None
+    Tokenizer = None
+
+EMBEDDING_LOCAL_BATCH_SIZE = int(os.getenv("EMBEDDING_LOCAL_BATCH_SIZE", "32"))
+EMBEDDING_LOCAL_MAX_LENGTH = int(os.getenv("EMBEDDING_LOCAL_MAX_LENGTH", "512"))
+# 推理线程数，0 表示使用全部 CPU 核心
+EMBEDDING_LOCAL_THREADS = int(os.getenv("EMBEDDING_LOCAL_THREADS", "0"))
+# mean / cls，为空时读取模型目录中的池化配置
+EMBEDDING_LOCAL_POOLING = os.getenv("EMBEDDING_LOCAL_POOLING", "")
+
+
+def _find_file(model_dir: Path, *candidates: str) -> Path:
+    for candidate in candidates:
+        if (model_dir / candidate).is_file():
+            return model_dir / candidate
+    raise FileNotFoundError(f"None of {candidates} found in {model_dir}")
+
+
+def _model_fingerprint(path: Path) -> str:
+    """模型文件大小和开头 1MB 的哈希，用于区分同名目录下的不同模型"""
+    digest = hashlib.sha256(str(path.stat().st_size).encode())
+    with open(path, "rb") as f:
+        digest.update(f.read(1 << 20))
+    return digest.hexdigest()[:12]
+
+
+@register_embedding_function
+class ONNXSentenceEmbeddingFunction(EmbeddingFunction[Documents]):
+    def __init__(
+        self,
+        model_path: str,
+        batch_size: int = EMBEDDING_LOCAL_BATCH_SIZE,
+        max_length: int = EMBEDDING_LOCAL_MAX_LENGTH,
+        threads: int = EMBEDDING_LOCAL_THREADS,
+        pooling: str = EMBEDDING_LOCAL_POOLING,
+    ) -> None:
+        if onnxruntime is None or Tokenizer is None:
+            raise ImportError("onnxruntime and tokenizers are required for local embeddings")
+        self.model_path = model_path
+        self.batch_size = max(batch_size, 1)
+        self.max_length = max_length
+        self.threads = threads
+
+        model_dir = Path(model_path)
+        onnx_file = _find_file(model_dir, "model.onnx", "onnx/model.onnx")
+        self.tokenizer = Tokenizer.from_file(
+            str(_find_file(model_dir, "tokenizer.json", "onnx/tokenizer.json"))
+        )
+        self.tokenizer.no_padding()
+        self.tokenizer.enable_truncation(max_length=max_length)
+        padding = (json.loads(self.tokenizer.to_str()).get("padding") or {})
+        self.pad_id = padding.get("pad_id", 0)
+
+        self.pooling = pooling or self._read_pooling(model_dir)
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads or os.cpu_count() or 1
+        self.session = onnxruntime.InferenceSession(
+            str(onnx_file), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        # 并发调用会互相抢占 CPU 核心，串行执行每个批次
+        self._lock = threading.Lock()
+        self.model_id = f"onnx/{model_dir.resolve().name}@{_model_fingerprint(onnx_file)}"
+
+    @staticmethod
+    def _read_pooling(model_dir: Path) -> str:
+        config_file = model_dir / "1_Pooling" / "config.json"
+        if config_file.is_file():
+            config = json.loads(config_file.read_text())
+            if config.get("pooling_mode_cls_token"):
+                return "cls"
+        return "mean"
+
+    def _run_batch(self, texts: list[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        length = max(len(e.ids) for e in encodings)
+        input_ids = np.full((len(texts), length), self.pad_id, dtype=np.int64)
+        attention_mask = np.zeros((len(texts), length), dtype=np.int64)
+        for i, encoding in enumerate(encodings):
+            input_ids[i, : len(encoding.ids)] = encoding.ids
+            attention_mask[i, : len(encoding.ids)] = 1
+
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        feeds = {name: value for name, value in feeds.items() if name in self.input_names}
+        with self._lock:
+            output = self.session.run(None, feeds)[0]
+
+        if output.ndim == 3:
+            if self.pooling == "cls":
+                output = output[:, 0]
+            else:
+                mask = attention_mask[..., None].astype(output.dtype)
+                output = (output * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(output, axis=1, keepdims=True)
+        return (output / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+    def __call__(self, input: Documents) -> Embeddings:
+        if not input:
+            return []
+        # 按长度排序后分批，减少每个批次的填充
+        order = sorted(range(len(input)), key=lambda i: len(input[i]))
+        vectors: list[np.ndarray] = [None] * len(input)  # type: ignore
+        for start in range(0, len(order), self.batch_size):
+            indices = order[start : start + self.batch_size]
+            for index, vector in zip(indices, self._run_batch([input[i] for i in indices])):
+                vectors[index] = vector
+        return vectors
+
+    @staticmethod
+    def name() -> str:
+        return "memora_onnx"
+
+    def get_config(self) -> dict[str, Any]:
+        return {
+            "model_path": self.model_path,
+            "batch_size": self.batch_size,
+            "max_length": self.max_length,
+            "threads": self.threads,
+            "pooling": self.pooling,
+        }
+
+    @staticmethod
+    def build_from_config(config: dict[str, Any]) -> "ONNXSentenceEmbeddingFunction":
+        return ONNXSentenceEmbeddingFunction(**config)
@@ -9,6 +9,8 @@ from sqlalchemy import (
     Text,
     Boolean,
     Enum,
+    LargeBinary,
+    Index,
 )
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
@@ -55,6 +57,7 @@ class User(Base):
 
 class Category(Base):
     __tablename__ = "categories"
+    __table_args__ = (Index("ix_categories_user_name", "user_id", "name"),)
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -72,11 +75,21 @@ class Category(Base):
 
 class Collection(Base):
     __tablename__ = "collections"
+    __table_args__ = (
+        Index("ix_collections_user_created", "user_id", "created_at"),
+        Index("ix_collections_category", "category_id"),
+        Index("ix_collections_user_url_hash", "user_id", "url_hash"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     category_id = Column(Integer, ForeignKey("categories.id"), nullable=True)
     tags = Column(String(255), nullable=True)  # splited by comma
+    # 固定字段直接存为列，collection_details 只保存 content 等自由字段
+    title = Column(Text, nullable=True)
+    url = Column(Text, nullable=True)
+    url_hash = Column(String(64), nullable=True)  # 规范化 URL 的 sha256，用于查重
+    summary = Column(Text, nullable=True)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
     updated_at = Column(
         DateTime,
@@ -91,6 +104,12 @@ class Collection(Base):
     details = relationship(
         "CollectionDetail", back_populates="collection", cascade="all, delete-orphan"
     )
+    content_blob = relationship(
+        "CollectionContent",
+        back_populates="collection",
+        uselist=False,
+        cascade="all, delete-orphan",
+    )
     # 新增关系
     posts = relationship("Post", back_populates="refer_collection", cascade="all, delete-orphan")
 
@@ -100,6 +119,7 @@ class Collection(Base):
 
 class CollectionDetail(Base):
     __tablename__ = "collection_details"
+    __table_args__ = (Index("ix_collection_details_collection_key", "collection_id", "key"),)
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     collection_id = Column(Integer, ForeignKey("collections.id"), nullable=False)
@@ -119,6 +139,29 @@ class CollectionDetail(Base):
         return f"<CollectionDetail(id={self.id}, collection_id={self.collection_id}, key='{self.key}')>"
 
 
+class CollectionContent(Base):
+    """压缩存放的正文，按需通过 backend.utils.content_store 读写"""
+
+    __tablename__ = "collection_contents"
+
+    collection_id = Column(Integer, ForeignKey("collections.id"), primary_key=True)
+    codec = Column(String(16), nullable=False)  # "zstd" 或 "zlib"
+    data = Column(LargeBinary, nullable=False)
+    size = Column(Integer, nullable=False)  # 原文 utf-8 字节数
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    updated_at = Column(
+        DateTime,
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+
+    collection = relationship("Collection", back_populates="content_blob")
+
+    def __repr__(self):
+        return f"<CollectionContent(collection_id={self.collection_id}, codec='{self.codec}', size={self.size})>"
+
+
 class Attachment(Base):
     __tablename__ = "attachments"
 
@@ -151,12 +194,19 @@ class CollectionAttachment(Base):
 
 class Post(Base):
     __tablename__ = "posts"
+    __table_args__ = (
+        Index("ix_posts_created", "created_at"),
+        Index("ix_posts_user_created", "user_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     post_id = Column(String(36), default=lambda: str(uuid.uuid4()), unique=True, nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     refer_collection_id = Column(Integer, ForeignKey("collections.id"), nullable=False)
     description = Column(Text, nullable=True)
+    # 冗余计数，由点赞/评论接口在同一事务中维护，可用 scripts/reconcile_counters.py 校正
+    likes_count = Column(Integer, default=0, server_default="0", nullable=False)
+    comments_count = Column(Integer, default=0, server_default="0", nullable=False)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
     updated_at = Column(
         DateTime,
@@ -175,18 +225,41 @@ class Post(Base):
         primaryjoin="and_(Post.id == Like.asset_id, Like.asset_type == 'post')",
         cascade="all, delete-orphan",
     )
+    embedding = relationship(
+        "PostEmbedding", back_populates="post", uselist=False, cascade="all, delete-orphan"
+    )
 
     def __repr__(self):
         return f"<Post(id={self.id}, post_id='{self.post_id}', user_id={self.user_id}, refer_collection_id={self.refer_collection_id})>"
 
 
+class PostEmbedding(Base):
+    """发布时计算的推文向量（标题 + 摘要 + 标签），用于本地推荐"""
+
+    __tablename__ = "post_embeddings"
+
+    post_id = Column(Integer, ForeignKey("posts.id"), primary_key=True)
+    model = Column(String(255), nullable=False)
+    dim = Column(Integer, nullable=False)
+    vector = Column(LargeBinary, nullable=False)  # float32 bytes
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+
+    post = relationship("Post", back_populates="embedding")
+
+    def __repr__(self):
+        return f"<PostEmbedding(post_id={self.post_id}, model='{self.model}', dim={self.dim})>"
+
+
 class Comment(Base):
     __tablename__ = "comments"
+    __table_args__ = (Index("ix_comments_post_created", "post_id", "created_at", "id"),)
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     post_id = Column(Integer, ForeignKey("posts.id"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     content = Column(Text, nullable=False)
+    # 冗余计数，由点赞接口在同一事务中维护
+    likes_count = Column(Integer, default=0, server_default="0", nullable=False)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
     updated_at = Column(
         DateTime,
@@ -211,6 +284,8 @@ class Comment(Base):
 
 class Like(Base):
     __tablename__ = "likes"
+    # 同一用户对同一资源只能点赞一次
+    __table_args__ = (Index("uq_likes_asset_user", "asset_type", "asset_id", "user_id", unique=True),)
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -223,3 +298,65 @@ class Like(Base):
 
     def __repr__(self):
         return f"<Like(id={self.id}, user_id={self.user_id}, asset_id={self.asset_id}, asset_type={self.asset_type})>"
+
+
+class Job(Base):
+    """后台任务队列，由 backend.utils.job_queue 调度"""
+
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_type_status_run_after", "type", "status", "run_after"),
+        Index("ix_jobs_user_created", "user_id", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job_id = Column(
+        String(36), default=lambda: str(uuid.uuid4()), unique=True, nullable=False
+    )
+    type = Column(String(50), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    payload = Column(JSON, nullable=False, default=dict)
+    # queued / running / succeeded / failed
+    status = Column(String(16), nullable=False, default="queued")
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    # 相同 key 的任务只会有一个处于排队、运行或成功状态
+    idempotency_key = Column(String(255), unique=True, nullable=True)
+    run_after = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    # 运行中的任务由 locked_by 持有租约，租约过期后可以被其他 worker 重新领取
+    locked_by = Column(String(100), nullable=True)
+    locked_until = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    result = Column(JSON, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    updated_at = Column(
+        DateTime,
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<Job(job_id={self.job_id}, type='{self.type}', status='{self.status}')>"
+
+
+class JobEvent(Base):
+    """任务产生的事件，SSE 接口从这里读取，支持断线后按 id 续传"""
+
+    __tablename__ = "job_events"
+    __table_args__ = (Index("ix_job_events_job_id", "job_id", "id"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job_id = Column(Integer, ForeignKey("jobs.id", ondelete="CASCADE"), nullable=False)
+    type = Column(String(50), nullable=False)
+    data = Column(JSON, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+
+    def __repr__(self):
+        return f"<JobEvent(id={self.id}, job_id={self.job_id}, type='{self.type}')>"
+
+
+# 注册全文索引的同步事件（after_flush）
+from backend.utils import fulltext_index  # noqa: E402,F401
@@ -1,3 +1,4 @@
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, status, Request
 from fastapi.middleware.cors import CORSMiddleware
@@ -10,8 +11,14 @@ from backend.routers.attachment import router as attachment_router
 from backend.routers.category import router as category_router
 from backend.routers.auth import router as auth_router
 from backend.routers.community import router as community_router
+from backend.routers.job import router as job_router
 from backend.routers.static import mount_static_files
 from backend.entity.response import Response
+from backend.utils.web_parser import aiohttp_web_parser
+from backend.utils.markdownit_content import markdownit_helper
+from backend.utils.job_queue import job_queue
+from backend.knowledge_base.embedding_cache import embedding_cache
+from backend.knowledge_base.embedding_scheduler import embedding_scheduler
 
 
 @asynccontextmanager
@@ -20,7 +27,12 @@ async def lifespan(app: FastAPI):
     Application lifespan event handler.
     """
     await create_tables()
+    await aiohttp_web_parser.initialize()
+    await job_queue.start()
     yield
+    await job_queue.stop()
+    await aiohttp_web_parser.close()
+    await markdownit_helper.close()
 
 
 app = FastAPI(title="Memora API", description="Collection management API", lifespan=lifespan)
@@ -41,6 +53,7 @@ app.include_router(collections_router, prefix="/api/v1")
 app.include_router(attachment_router, prefix="/api/v1")
 app.include_router(category_router, prefix="/api/v1")
 app.include_router(community_router, prefix="/api/v1")
+app.include_router(job_router, prefix="/api/v1")
 
 
 # 添加异常处理器
@@ -74,6 +87,22 @@ async def root():
     return Response(data={"message": "Memora API", "status": "running", "version": "1.0.0"})
 
 
+@app.get("/api/v1/metrics/embedding_cache", response_model=Response[dict])
+async def embedding_cache_metrics():
+    """
+    嵌入缓存的命中统计（当前进程）和容量
+    """
+    return Response(data=await asyncio.to_thread(embedding_cache.stats))
+
+
+@app.get("/api/v1/metrics/embedding_scheduler", response_model=Response[dict])
+async def embedding_scheduler_metrics():
+    """
+    嵌入接口的请求数、429 重试次数和排队中的文本数（当前进程）
+    """
+    return Response(data=embedding_scheduler.stats())
+
+
 # Add health check endpoint
 # @app.get("/api/v1/health", response_model=Response[dict])
 # async def health_check():
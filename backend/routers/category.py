@@ -1,27 +1,28 @@
-import uuid
 import asyncio
 
-from fastapi import APIRouter, HTTPException, Depends, status, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends, status
 from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
-from sqlalchemy.orm import selectinload
 from typing import Optional
 from pydantic import BaseModel
 from loguru import logger
 
 from backend.entity.response import Response
 from backend.model import Category, User, CollectionDetail, Collection
-from backend.db import get_db, AsyncSessionLocal
+from backend.utils.collection_fields import details_dict
+from backend.utils.content_store import load_content
+from backend.db import get_db
 from backend.routers.auth import get_current_user
-from backend.knowledge_base.chromadb_mgr import chroma_db_manager
+from backend.knowledge_base.chromadb_mgr import async_chroma_db_manager, EmbeddingModelMismatch
 from backend.ai.openai_provider import provider_openai
 from backend.ai.PROMPTS import (
     KNOWLEDGE_BASE_QUERY_PROMPT,
     COLLECTION_SEARCH_PROMPT,
     ADDITIONAL_PROMPT_USER_LANGUAGE_PREFERENCE,
 )
-from backend.utils.text_splitter import recursive_text_splitter
+from backend.knowledge_base.jobs import KB_BUILD_JOB, KB_DROP_JOB
+from backend.utils.job_queue import job_queue
 
 # Create router instance
 router = APIRouter(
@@ -223,8 +224,17 @@ async def delete_category(
             detail=f"Category with id {category_id} not found",
         )
 
+    knowledge_base_id = category.knowledge_base_id
     await db.delete(category)
     await db.commit()
+    if knowledge_base_id:
+        await job_queue.enqueue(
+            db,
+            KB_DROP_JOB,
+            {"knowledge_base_id": knowledge_base_id},
+            user_id=user_id,  # type: ignore
+            idempotency_key=f"{KB_DROP_JOB}:{knowledge_base_id}",
+        )
 
     logger.info(f"Deleted category: {category.name} (id: {category.id})")
     return Response(
@@ -237,13 +247,14 @@ async def delete_category(
 # 创建知识库
 @router.post("/create_knowledge_base")
 async def create_knowledge_base(
-    background_tasks: BackgroundTasks,
     category_id: int,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
     """
     Create a new knowledge base category
+
+    知识库在后台任务中构建，返回的 job_id 可以通过 GET /jobs/{job_id} 查询进度
     """
     category = await db.get(Category, category_id)
     if not category:
@@ -258,84 +269,20 @@ async def create_knowledge_base(
             detail=f"Knowledge base already exists for category {category_id}",
         )
 
-    # 立即返回响应
-    background_tasks.add_task(create_knowledge_base_task, category_id, current_user.id)
-
-    return Response(code=200, message="Knowledge base creation started", data=None)
-
-
-async def create_knowledge_base_task(category_id: int, user_id: int):
-    """
-    Background task to create knowledge base
-    """
-    async with AsyncSessionLocal() as db:
-        try:
-            category = await db.get(Category, category_id)
-            if not category:
-                logger.error(f"Category {category_id} not found during background task")
-                return
-
-            collection_name = f"kb_{uuid.uuid4()}"
-
-            # 将 ChromaDB 创建集合操作放到线程池
-            await asyncio.to_thread(
-                chroma_db_manager.create_collection, collection_name
-            )
-
-            # TODO(Soulter): 优化 SQL
-            stmt = (
-                select(CollectionDetail)
-                .join(Collection, CollectionDetail.collection_id == Collection.id)
-                .where(
-                    Collection.category_id == category_id,
-                    Collection.user_id == user_id,
-                    CollectionDetail.key == "content",
-                )
-            )
-            result = await db.execute(stmt)
-            details = result.scalars().all()
-            content_list = [str(detail.value) for detail in details]
-
-            # 将文本分割操作放到线程池
-            def split_texts():
-                chunked_content_list = []
-                for content in content_list:
-                    if isinstance(content, str) and content.strip():
-                        chunked_content_list.extend(
-                            recursive_text_splitter.split_text(content)
-                        )
-                return chunked_content_list
-
-            chunked_content_list = await asyncio.to_thread(split_texts)
-
-            logger.info(
-                f"Creating knowledge base for category {category_id} with {len(chunked_content_list)} chunks"
-            )
-
-            # 将 ChromaDB upsert 操作放到线程池
-            def upsert_documents():
-                chroma_db_manager.upsert(
-                    collection_name=collection_name,
-                    documents=chunked_content_list,
-                    ids=[str(uuid.uuid4()) for _ in chunked_content_list],
-                )
-
-            await asyncio.to_thread(upsert_documents)
-
-            # Update the category with the knowledge base ID
-            category.knowledge_base_id = collection_name  # type: ignore
-            db.add(category)
-            await db.commit()
-            await db.refresh(category)
+    # 重复点击只会得到同一个任务
+    job = await job_queue.enqueue(
+        db,
+        KB_BUILD_JOB,
+        {"category_id": category_id, "user_id": current_user.id},
+        user_id=current_user.id,  # type: ignore
+        idempotency_key=f"{KB_BUILD_JOB}:{category_id}",
+    )
 
-            logger.info(
-                f"Knowledge base created successfully for category {category_id}"
-            )
-        except Exception as e:
-            logger.error(
-                f"Failed to create knowledge base for category {category_id}: {e}"
-            )
-            # TODO: 可以添加错误状态到数据库或通知机制
+    return Response(
+        code=200,
+        message="Knowledge base creation started",
+        data={"job_id": job.job_id, "status": job.status},
+    )
 
 
 # query knowledge base
@@ -366,9 +313,8 @@ async def query_knowledge_base(
 
         collection_name = category.knowledge_base_id
 
-        # Query the knowledge base (放到线程池中执行)
-        results = await asyncio.to_thread(
-            chroma_db_manager.query,
+        # Query the knowledge base
+        results = await async_chroma_db_manager.query(
             collection_name=collection_name,
             query=query,
             n_results=5,
@@ -457,6 +403,9 @@ async def query_knowledge_base(
     except HTTPException:
         # 重新抛出 HTTP 异常
         raise
+    except EmbeddingModelMismatch as e:
+        # 知识库由其他嵌入模型构建，需要重建
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
     except Exception as e:
         logger.error(f"Unexpected error in query_knowledge_base: {e}", exc_info=True)
         raise HTTPException(
@@ -478,12 +427,8 @@ async def search_collections(
     try:
         user_id = current_user.id
 
-        # 查询用户的所有collection和相关的details
-        stmt = (
-            select(Collection)
-            .where(Collection.user_id == user_id)
-            .options(selectinload(Collection.details))
-        )
+        # 查询用户的所有collection（url / title / summary 直接在 collections 表上）
+        stmt = select(Collection).where(Collection.user_id == user_id)
 
         result = await db.execute(stmt)
         collections_data = result.scalars().all()
@@ -502,24 +447,10 @@ async def search_collections(
         # 构建上下文字符串
         collections_context = ""
         for item in collections_data:
-            # 获取URL
-            url_detail = next(
-                (detail.value for detail in item.details if detail.key == "url"), None
-            )
-            # 获取Title
-            title_detail = next(
-                (detail.value for detail in item.details if detail.key == "title"), None
-            )
-            # 获取Summary
-            summary_detail = next(
-                (detail.value for detail in item.details if detail.key == "summary"),
-                None,
-            )
-
             collections_context += f"Collection ID: {item.id}\n"
-            collections_context += f"URL: {url_detail or 'N/A'}\n"
-            collections_context += f"Title: {title_detail or 'N/A'}\n"
-            collections_context += f"Summary: {summary_detail or 'N/A'}\n"
+            collections_context += f"URL: {item.url or 'N/A'}\n"
+            collections_context += f"Title: {item.title or 'N/A'}\n"
+            collections_context += f"Summary: {item.summary or 'N/A'}\n"
             collections_context += "---\n"
 
         # 使用AI分析查询
@@ -594,12 +525,11 @@ async def search_collections(
             category = result.scalar_one_or_none()
 
             # 获取collection的所有details
-            details = collection.details
-
-            # 构建details字典
-            details_dict = {}
-            for detail in details:
-                details_dict[detail.key] = detail.value
+            details_result = await db.execute(
+                select(CollectionDetail).where(CollectionDetail.collection_id == collection.id)
+            )
+            details = details_result.scalars().all()
+            content = await load_content(db, collection.id)  # type: ignore
 
             return Response(
                 code=200,
@@ -610,7 +540,7 @@ async def search_collections(
                         "user_id": collection.user_id,
                         "category_id": collection.category_id,
                         "created_at": (collection.created_at.isoformat()),
-                        "details": details_dict,
+                        "details": details_dict(collection, details, content),
                     },
                     "category": (
                         {
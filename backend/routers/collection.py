@@ -1,11 +1,14 @@
 import asyncio
-from typing import Optional
+import os
+from contextlib import aclosing
+from dataclasses import asdict
+from typing import Awaitable, Callable, Optional
 
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, status, UploadFile, File, Form
 from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import desc, select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import and_, desc, or_, select
+from sqlalchemy.orm import load_only, selectinload
 from pydantic import BaseModel
 from loguru import logger
 
@@ -16,19 +19,53 @@ from backend.model import (
     Category,
     CollectionDetail,
 )
-from backend.db import get_db
+from backend.db import get_db, AsyncSessionLocal
 from backend.routers.auth import get_current_user
-from backend.ai.PROMPTS import (
-    PROMPT_PARSE_CATEGORY_AND_TAGS,
-    PROMPT_SUMMARIZE_CONTENT,
-    ADDITIONAL_PROMPT_USER_LANGUAGE_PREFERENCE,
-    parse_json,
-)
+from backend.ai.content_analysis import analyze_content
 
-from backend.utils.web_parser import get_web_title
-from backend.ai.openai_provider import provider_openai
+from backend.utils.web_parser import fetch_page, extract_title
 from backend.utils.markdownit_content import markdownit_helper
+from backend.utils.pagination import encode_cursor, decode_cursor
+from backend.utils.library_export import export_library, gzip_stream
+from backend.utils.job_queue import PermanentJobError, current_job_id, job_queue
+from backend.utils.job_events import emit_event, format_sse, tail_events
+from backend.knowledge_base.jobs import enqueue_knowledge_base_sync
+from backend.utils.bookmark_import import (
+    BookmarkParseError,
+    ImportedBookmark,
+    parse_bookmarks,
+)
+from backend.utils.fulltext_index import search_fulltext
+from backend.utils.content_store import (
+    delete_content,
+    load_content,
+    load_contents,
+    save_content,
+)
+from backend.utils.collection_fields import (
+    CONTENT_KEY,
+    details_dict,
+    detail_rows,
+    PROMOTED_KEYS,
+    is_promoted,
+    parse_fields,
+    set_promoted_field,
+    url_hash,
+)
+
 
+# 批量导入时同时处理的书签数量；抓取、转换和 LLM 另外各自有全局的并发上限
+IMPORT_CONCURRENCY = int(os.getenv("IMPORT_CONCURRENCY", "4"))
+# 导入文件大小上限
+IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", str(10 * 1024 * 1024)))
+# 同时运行的 URL 收藏任务数量
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "4"))
+INGEST_URL_JOB = "ingest_url"
+# 同时运行的批量导入任务数量，每个任务内部再按 IMPORT_CONCURRENCY 并发导入书签
+IMPORT_JOB_CONCURRENCY = int(os.getenv("IMPORT_JOB_CONCURRENCY", "2"))
+IMPORT_BOOKMARKS_JOB = "import_bookmarks"
+
+_category_create_lock = asyncio.Lock()
 
 # Create router instance
 router = APIRouter(
@@ -79,30 +116,30 @@ class CollectionUrlResponseDelta(BaseModel):
 
 
 async def streaming_create_collection_url(
-    collection: CollectionUrlCreate, current_user: User, db: AsyncSession
+    collection: CollectionUrlCreate,
+    current_user: User,
+    db: AsyncSession,
+    resume_collection_id: int | None = None,
 ):
     """
     Create a new collection which type is url reference
+
+    resume_collection_id: 重新执行的收藏任务上次创建的 collection，复用这一行继续处理
     """
     # 不是哥们，这样手搓流式函数是吧...
     # step 1: created to collection table
     user_id = current_user.id
 
     # step 1.5: first check if the url already exists for this user
-    import json
-
-    url_check_query = (
-        select(CollectionDetail)
-        .join(Collection, Collection.id == CollectionDetail.collection_id)
-        .where(
-            CollectionDetail.key == "url",
-            CollectionDetail.value == json.dumps(collection.url),
-            Collection.user_id == user_id,
-        )
+    url_check_query = select(Collection.id).where(
+        Collection.user_id == user_id,
+        Collection.url_hash == url_hash(collection.url),
     )
+    if resume_collection_id is not None:
+        url_check_query = url_check_query.where(Collection.id != resume_collection_id)
 
     url_check_result = await db.execute(url_check_query)
-    if url_check_result.scalar_one_or_none():
+    if url_check_result.first():
         yield CollectionUrlResponseDelta(
             type="collection_exists",
             data={"message": "This URL has already been collected."},
@@ -113,15 +150,17 @@ async def streaming_create_collection_url(
         )
         return
 
-    db_collection = Collection(user_id=user_id)
-    db.add(db_collection)
-    await db.commit()
-    await db.refresh(db_collection)
-
-    url_detail = CollectionDetail(
-        collection_id=db_collection.id, key="url", value=collection.url
-    )
-    db.add(url_detail)
+    db_collection = None
+    if resume_collection_id is not None:
+        db_collection = await db.get(Collection, resume_collection_id)
+        if db_collection is not None and db_collection.user_id != user_id:
+            db_collection = None
+    if db_collection is None:
+        db_collection = Collection(user_id=user_id)
+        set_promoted_field(db_collection, "url", collection.url)
+        db.add(db_collection)
+        await db.commit()
+        await db.refresh(db_collection)
 
     yield CollectionUrlResponseDelta(
         type="collection_created",
@@ -133,20 +172,16 @@ async def streaming_create_collection_url(
         },
     )
 
-    # step 2: fetching the content of the url
-    content = await markdownit_helper.markdownit(collection.url)
-
-    # step 2.1: get url title
-    title = await get_web_title(collection.url)
+    # step 2: fetch the url once, then convert to markdown and extract the title
+    # from the same bytes
+    page = await fetch_page(collection.url)
+    content = await markdownit_helper.markdownit_page(page)
+    title = extract_title(page.text()) if page.is_html else "No title found"
 
-    content_detail = CollectionDetail(
-        collection_id=db_collection.id, key="content", value=content
-    )
-    db.add(content_detail)
-    content_title = CollectionDetail(
-        collection_id=db_collection.id, key="title", value=title
-    )
-    db.add(content_title)
+    await save_content(db, db_collection.id, content)  # type: ignore
+    db_collection.title = title  # type: ignore
+    # 等待 LLM 之前先提交，不在写事务中挂起
+    await db.commit()
 
     logger.info(
         f"Fetched content from {collection.url}, length: {len(content)}: {content[:50]}..."
@@ -168,120 +203,79 @@ async def streaming_create_collection_url(
         .order_by(Category.name)
     )
     categories_result = await db.execute(categories_query)
-    categories = [row[0] for row in categories_result.all()]
-    category_emojis = [row[1] for row in categories_result.all()]
-
     categories_str = ", ".join(
-        [f"{cat}({emoji})" for cat, emoji in zip(categories, category_emojis)]
+        [f"{cat}({emoji})" for cat, emoji in categories_result.all()]
     )
-    cate_sys_prompt = PROMPT_PARSE_CATEGORY_AND_TAGS.format(categories=categories_str)
-
-    cate_sys_prompt += f"\n\n{ADDITIONAL_PROMPT_USER_LANGUAGE_PREFERENCE}"
 
-    # step 3: llm analyze the category and tags
-    cate_llm_resp = await provider_openai.text_chat(
-        prompt=content,
-        system_prompt=cate_sys_prompt,
-    )
-    cate_json = parse_json(cate_llm_resp.completion_text)
-    category: str = cate_json.get("category", "")
-    category_emoji: str = cate_json.get("category_emoji", "")
-    tags: list = cate_json.get("tags", [])
-
-    # save to category if not exists
-    db_category = await db.execute(
-        select(Category).where(Category.name == category, Category.user_id == user_id)
-    )
-    
-    raw_category = db_category.scalar_one_or_none()
-    if category and not raw_category:
-        new_category = Category(name=category, emoji=category_emoji, user_id=user_id)
-        db.add(new_category)
-        await db.commit()
-        await db.refresh(new_category)
-        logger.info(f"New category created: {new_category.name}")
-
-    # step 3.2: 添加后台任务，异步更新 chromadb 向量数据库
-    # 判断是否需要更新向量数据库
-    if raw_category and raw_category.knowledge_base_id is not None:
-        # 更新向量数据库
-        from backend.utils.text_splitter import recursive_text_splitter
-        from backend.knowledge_base.chromadb_mgr import chroma_db_manager
-        import uuid
-
-        # 异步分割文本
-        def splits_text():
-            return recursive_text_splitter.split_text(content)
-
-        chunked_content_list = await asyncio.to_thread(splits_text)
-
-        # 获取需要的值，避免闭包问题
-        knowledge_base_id = str(raw_category.knowledge_base_id)
-
-        # 更新向量数据库
-        async def upsert_chunks():
-            def sync_upsert():
-                return chroma_db_manager.upsert(
-                    collection_name=knowledge_base_id,
-                    documents=chunked_content_list,
-                    ids=[str(uuid.uuid4()) for _ in chunked_content_list],
+    # step 3: 分类、标签和摘要由一次结构化输出请求生成（模型不支持时退回两个并发请求），
+    # 分类结果总是先于摘要事件输出
+    full_summary = ""
+    async with aclosing(analyze_content(content, categories_str)) as analysis_stream:
+        async for analysis in analysis_stream:
+            if analysis.type == "summary_chunk":
+                yield CollectionUrlResponseDelta(
+                    type="summary_chunk",
+                    data={
+                        "summary": analysis.data["summary"],
+                    },
+                )
+                continue
+            if analysis.type == "summary_completed":
+                full_summary = analysis.data["summary"]
+                continue
+
+            category: str = analysis.data["category"]
+            category_emoji: str = analysis.data["category_emoji"]
+            tags: list = analysis.data["tags"]
+
+            # save to category if not exists
+            # 并发收藏可能同时创建同名分类，查询和创建需要串行
+            async with _category_create_lock:
+                db_category = await db.execute(
+                    select(Category)
+                    .where(Category.name == category, Category.user_id == user_id)
+                    .order_by(Category.id)
                 )
-            await asyncio.to_thread(sync_upsert)
-            logger.info(f"Upserted {len(chunked_content_list)} chunks to ChromaDB collection {knowledge_base_id}")
-
-        # 后台任务更新
-        asyncio.create_task(upsert_chunks())
-
-    yield CollectionUrlResponseDelta(
-        type="category_analyzed",
-        data={
-            "category": category,
-            "tags": tags,
-        },
-    )
-
-    # 看笑了...
 
-    # get category_id
-    category_query = select(Category.id).where(
-        Category.name == category, Category.user_id == user_id
-    )
-    category_result = await db.execute(category_query)
-    category_id = category_result.scalar_one_or_none()
+                raw_category = db_category.scalars().first()
+                if category and not raw_category:
+                    new_category = Category(name=category, emoji=category_emoji, user_id=user_id)
+                    db.add(new_category)
+                    await db.commit()
+                    await db.refresh(new_category)
+                    logger.info(f"New category created: {new_category.name}")
+
+            yield CollectionUrlResponseDelta(
+                type="category_analyzed",
+                data={
+                    "category": category,
+                    "tags": tags,
+                },
+            )
 
-    # step 3.5: update collection with category and tags
-    if not category_id:
-        category_id = -1
+            # get category_id
+            category_query = (
+                select(Category.id)
+                .where(Category.name == category, Category.user_id == user_id)
+                .order_by(Category.id)
+            )
+            category_result = await db.execute(category_query)
+            category_id = category_result.scalars().first()
 
-    db_collection.category_id = category_id  # type: ignore
-    db_collection.tags = ",".join(tags)  # type: ignore
-    db.add(db_collection)
+            # step 3.5: update collection with category and tags
+            if not category_id:
+                category_id = -1
 
-    await db.commit()
+            db_collection.category_id = category_id  # type: ignore
+            db_collection.tags = ",".join(tags)  # type: ignore
+            db.add(db_collection)
 
-    # step 4: llm summarize the content, using streaming
-    summary_sys_prompt = PROMPT_SUMMARIZE_CONTENT
-    summary_sys_prompt += f"\n\n{ADDITIONAL_PROMPT_USER_LANGUAGE_PREFERENCE}"
-    summary_llm_resp = provider_openai.text_chat_stream(
-        prompt=content,
-        system_prompt=summary_sys_prompt,
-    )
-    full_summary = ""
-    async for chunk in summary_llm_resp:
-        full_summary += chunk.completion_text
-        yield CollectionUrlResponseDelta(
-            type="summary_chunk",
-            data={
-                "summary": chunk.completion_text,
-            },
-        )
+            await db.commit()
 
-    full_summary = parse_json(full_summary).get("summary", "")
+            # step 3.6: 分类已有知识库时，通过后台任务把正文写入向量数据库
+            await enqueue_knowledge_base_sync(db, db_collection.id, [category_id], user_id)  # type: ignore
 
-    summary_detail = CollectionDetail(
-        collection_id=db_collection.id, key="summary", value=full_summary
-    )
-    db.add(summary_detail)
+    db_collection.summary = full_summary  # type: ignore
     await db.commit()
 
     yield CollectionUrlResponseDelta(
@@ -292,6 +286,52 @@ async def streaming_create_collection_url(
     )
 
 
+async def _delete_partial_collection(collection_id: int, user_id: int) -> None:
+    """收藏失败时删除已创建的半成品 collection（以及可能已写入知识库的分块）"""
+    async with AsyncSessionLocal() as db:
+        db_collection = await db.get(Collection, collection_id)
+        if db_collection is None:
+            return
+        category_id = db_collection.category_id
+        await db.delete(db_collection)
+        await db.commit()
+        await enqueue_knowledge_base_sync(db, collection_id, [category_id], user_id)  # type: ignore
+
+
+# 失败时已经删除了半成品并输出了 error 事件，不再重试；进程崩溃导致的租约过期会再执行一次，
+# 通过 payload 中记录的 collection_id 继续处理同一行
+@job_queue.register(INGEST_URL_JOB, concurrency=INGEST_CONCURRENCY, max_attempts=2)
+async def ingest_url_job(payload: dict) -> dict | None:
+    """
+    URL 收藏任务：在后台运行完整的收藏流程，每一步的事件写入任务事件表，
+    客户端断开连接不会中断收藏
+    """
+    collection_id = payload.get("collection_id")
+    async with AsyncSessionLocal() as session:
+        user = await session.get(User, payload["user_id"])
+        if user is None:
+            raise PermanentJobError(f"User {payload['user_id']} not found")
+        try:
+            async for delta in streaming_create_collection_url(
+                CollectionUrlCreate(url=payload["url"]),
+                user,
+                session,
+                resume_collection_id=collection_id,
+            ):
+                if delta.type == "collection_created" and delta.data["id"] != collection_id:
+                    collection_id = delta.data["id"]
+                    await job_queue.update_payload(
+                        current_job_id.get(), collection_id=collection_id  # type: ignore
+                    )
+                await emit_event(delta.type, delta.data)
+        except Exception as e:
+            if collection_id is not None:
+                await _delete_partial_collection(collection_id, payload["user_id"])
+            await emit_event("error", {"message": str(e), "collection_id": None})
+            raise PermanentJobError(str(e)) from e
+    return {"collection_id": collection_id}
+
+
 @router.post(
     "/url",
     response_model=CollectionUrlResponseDelta,
@@ -304,14 +344,205 @@ async def create_collection_url(
 ):
     """
     Create a new collection which type is url reference
+
+    收藏在后台任务中进行，这里只转发任务事件。第一条 job_created 事件带有 job_id，
+    断线后可以通过 GET /jobs/{job_id}/events（带 Last-Event-ID）继续接收；
+    同一个 URL 正在收藏时会直接接入已有的任务。
     """
+    job = await job_queue.enqueue(
+        db,
+        INGEST_URL_JOB,
+        {"user_id": current_user.id, "url": event.url},
+        user_id=current_user.id,  # type: ignore
+        idempotency_key=f"{INGEST_URL_JOB}:{current_user.id}:{url_hash(event.url)}",
+        reuse_finished=False,
+    )
+    job_pk: int = job.id  # type: ignore
 
     async def steaming():
-        async for delta in streaming_create_collection_url(event, current_user, db):
-            data = delta.model_dump_json()
-            yield f"data: {data}\n\n"
+        yield format_sse({"type": "job_created", "data": {"job_id": job.job_id}})
+        async for chunk in tail_events(job_pk):
+            yield chunk
+
+    return StreamingResponse(
+        steaming(), media_type="text/event-stream", headers={"X-Job-Id": str(job.job_id)}
+    )
+
+
+async def _import_bookmark(
+    bookmark: ImportedBookmark,
+    current_user: User,
+    resume_collection_id: int | None = None,
+    on_created: Callable[[int], Awaitable[None]] | None = None,
+) -> tuple[str, dict]:
+    """
+    导入单个书签，复用单条收藏的处理流程。每个书签使用独立的 session，以便并发执行。
+
+    resume_collection_id / on_created: 记录和复用已创建的 collection，任务重新执行时继续处理同一行
+
+    Returns:
+        (status, data)，status 为 created / exists / failed
+    """
+    collection_id = resume_collection_id
+    async with AsyncSessionLocal() as session:
+        try:
+            async for delta in streaming_create_collection_url(
+                CollectionUrlCreate(url=bookmark.url),
+                current_user,
+                session,
+                resume_collection_id=resume_collection_id,
+            ):
+                if delta.type == "collection_exists":
+                    return "exists", {}
+                if delta.type == "collection_created":
+                    collection_id = delta.data["id"]
+                    if on_created is not None:
+                        await on_created(collection_id)  # type: ignore
+            return "created", {"collection_id": collection_id}
+        except Exception as e:
+            logger.warning(f"Failed to import bookmark {bookmark.url}: {e}")
+            await session.rollback()
+            if collection_id is not None and bookmark.title:
+                # 页面抓取或分析失败时至少保留书签自带的标题
+                collection = await session.get(Collection, collection_id)
+                if collection is not None and not collection.title:
+                    collection.title = bookmark.title  # type: ignore
+                    await session.commit()
+            return "failed", {"collection_id": collection_id, "error": str(e)}
+
+
+@job_queue.register(IMPORT_BOOKMARKS_JOB, concurrency=IMPORT_JOB_CONCURRENCY, max_attempts=2)
+async def import_bookmarks_job(payload: dict) -> dict | None:
+    """
+    批量导入书签任务：由固定数量的 worker 并发导入，进度写入任务事件。
+
+    每个书签的 collection_id 和结果记录在 payload["items"] 中，任务被重新领取（进程崩溃后）时
+    跳过已完成的书签，导入到一半的书签继续处理已创建的那一行
+    """
+    job_id: int = current_job_id.get()  # type: ignore
+    async with AsyncSessionLocal() as session:
+        current_user = await session.get(User, payload["user_id"])
+    if current_user is None:
+        raise PermanentJobError(f"User {payload['user_id']} not found")
+
+    bookmarks = [ImportedBookmark(**item) for item in payload["bookmarks"]]
+    # 书签下标 -> {collection_id, status}
+    items: dict[str, dict] = payload.get("items") or {}
+    progress = {
+        "total": len(bookmarks),
+        "created": 0,
+        "exists": 0,
+        "failed": 0,
+        "duplicates": payload["duplicates"],
+        "invalid": payload["invalid"],
+    }
+    for item in items.values():
+        if item.get("status"):
+            progress[item["status"]] += 1
+    await emit_event("import_started", dict(progress))
+
+    queue: asyncio.Queue[int] = asyncio.Queue()
+    for index in range(len(bookmarks)):
+        if not items.get(str(index), {}).get("status"):
+            queue.put_nowait(index)
+    save_lock = asyncio.Lock()
+
+    async def save_items():
+        async with save_lock:
+            await job_queue.update_payload(job_id, items=items)
+
+    async def worker():
+        while True:
+            try:
+                index = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            bookmark = bookmarks[index]
+            item = items.setdefault(str(index), {})
+
+            async def on_created(collection_id: int):
+                item["collection_id"] = collection_id
+                await save_items()
+
+            item_status, data = await _import_bookmark(
+                bookmark, current_user, item.get("collection_id"), on_created
+            )
+            item["status"] = item_status
+            progress[item_status] += 1
+            await save_items()
+            await emit_event(
+                "item_failed" if item_status == "failed" else "item_completed",
+                {
+                    "url": bookmark.url,
+                    "title": bookmark.title,
+                    "folder": bookmark.folder,
+                    "status": item_status,
+                    **data,
+                    "progress": dict(progress),
+                },
+            )
 
-    return StreamingResponse(steaming(), media_type="text/event-stream")
+    await asyncio.gather(*(worker() for _ in range(min(IMPORT_CONCURRENCY, queue.qsize()) or 1)))
+    await emit_event("import_completed", dict(progress))
+    return progress
+
+
+@router.post("/import", status_code=status.HTTP_201_CREATED)
+async def import_bookmarks(
+    file: UploadFile = File(...),
+    format: Optional[str] = Form(None),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    批量导入书签，以 SSE 推送进度
+
+    导入在后台任务中进行，客户端断开不会中断导入；第一条 job_created 事件带有 job_id，
+    可以通过 GET /jobs/{job_id}/events 继续接收进度
+
+    - file: 浏览器导出的书签 HTML、JSON 或每行一个 URL 的文本文件
+    - format: html / json / text，不传时自动识别
+    """
+    data = await file.read(IMPORT_MAX_BYTES + 1)
+    if len(data) > IMPORT_MAX_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Import file exceeds {IMPORT_MAX_BYTES} bytes",
+        )
+    try:
+        bookmarks, invalid = parse_bookmarks(data, file.filename, format)
+    except BookmarkParseError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    # 一次查询过滤掉已经收藏过的 URL
+    existing_query = select(Collection.url_hash).where(
+        Collection.user_id == current_user.id, Collection.url_hash.is_not(None)
+    )
+    existing = set((await db.execute(existing_query)).scalars().all())
+    pending = [bookmark for bookmark in bookmarks if url_hash(bookmark.url) not in existing]
+    duplicates = len(bookmarks) - len(pending)
+
+    job = await job_queue.enqueue(
+        db,
+        IMPORT_BOOKMARKS_JOB,
+        {
+            "user_id": current_user.id,
+            "bookmarks": [asdict(bookmark) for bookmark in pending],
+            "duplicates": duplicates,
+            "invalid": invalid,
+        },
+        user_id=current_user.id,  # type: ignore
+    )
+    job_pk: int = job.id  # type: ignore
+
+    async def steaming():
+        yield format_sse({"type": "job_created", "data": {"job_id": job.job_id}})
+        async for chunk in tail_events(job_pk):
+            yield chunk
+
+    return StreamingResponse(
+        steaming(), media_type="text/event-stream", headers={"X-Job-Id": str(job.job_id)}
+    )
 
 
 @router.post("/create", response_model=Response, status_code=status.HTTP_201_CREATED)
@@ -343,43 +574,23 @@ async def create_collection_manual(
         user_id=user_id,
         category_id=collection.category_id,
         tags=",".join(collection.tags) if collection.tags else None,
+        title=collection.title or None,
+        summary=collection.summary or None,
     )
+    if collection.url:
+        set_promoted_field(db_collection, "url", collection.url)
     db.add(db_collection)
     await db.commit()
     await db.refresh(db_collection)
 
     # 添加详情
-    details_to_add = []
-    if collection.title:
-        details_to_add.append(
-            CollectionDetail(
-                collection_id=db_collection.id, key="title", value=collection.title
-            )
-        )
     if collection.content:
-        details_to_add.append(
-            CollectionDetail(
-                collection_id=db_collection.id, key="content", value=collection.content
-            )
-        )
-    if collection.url:
-        details_to_add.append(
-            CollectionDetail(
-                collection_id=db_collection.id, key="url", value=collection.url
-            )
-        )
-    if collection.summary:
-        details_to_add.append(
-            CollectionDetail(
-                collection_id=db_collection.id, key="summary", value=collection.summary
-            )
+        await save_content(db, db_collection.id, collection.content)  # type: ignore
+        await db.commit()
+        await enqueue_knowledge_base_sync(
+            db, db_collection.id, [db_collection.category_id], user_id  # type: ignore
         )
 
-    for detail in details_to_add:
-        db.add(detail)
-
-    await db.commit()
-
     return Response(
         code=200,
         message="Collection created successfully",
@@ -416,6 +627,8 @@ async def update_collection(
             detail="Collection not found or access denied",
         )
 
+    old_category_id = collection.category_id
+
     # 验证category_id是否属于当前用户
     if collection_update.category_id is not None:
         if collection_update.category_id == 0:
@@ -447,13 +660,17 @@ async def update_collection(
     if collection_update.title is not None:
         details_to_update["title"] = collection_update.title
     if collection_update.content is not None:
-        details_to_update["content"] = collection_update.content
+        await save_content(db, collection_id, collection_update.content)
     if collection_update.url is not None:
         details_to_update["url"] = collection_update.url
     if collection_update.summary is not None:
         details_to_update["summary"] = collection_update.summary
 
     for key, value in details_to_update.items():
+        if is_promoted(key):
+            set_promoted_field(collection, key, value)
+            continue
+
         # 查找现有detail
         detail_query = select(CollectionDetail).where(
             CollectionDetail.collection_id == collection_id, CollectionDetail.key == key
@@ -475,6 +692,12 @@ async def update_collection(
     await db.commit()
     await db.refresh(collection)
 
+    # 正文修改或移动分类后同步相关知识库（移动时从原分类的知识库中删除）
+    if collection_update.content is not None or collection.category_id != old_category_id:
+        await enqueue_knowledge_base_sync(
+            db, collection_id, [old_category_id, collection.category_id], current_user.id  # type: ignore
+        )
+
     return Response(
         code=200,
         message="Collection updated successfully",
@@ -492,6 +715,100 @@ async def update_collection(
     )
 
 
+# 全文搜索，找到匹配的 collection
+@router.get("/search", response_model=Response)
+async def search_collections(
+    query: str,
+    page: int = 1,
+    limit: int = 20,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    全文搜索当前用户的 collection（FTS5 + BM25 排序）
+    """
+    page = max(page, 1)
+    limit = min(max(limit, 1), 100)
+    offset = (page - 1) * limit
+
+    conn = await db.connection()
+    # 多取一条用来判断是否还有下一页
+    hits = await conn.run_sync(
+        search_fulltext, current_user.id, query, limit + 1, offset
+    )
+
+    if hits is None:
+        # 全文索引不可用（非 SQLite 数据库），回退到 LIKE 查询
+        pattern = f"%{query}%"
+        collections_query = (
+            select(Collection)
+            .where(
+                Collection.user_id == current_user.id,
+                or_(
+                    Collection.title.ilike(pattern),
+                    Collection.summary.ilike(pattern),
+                    Collection.url.ilike(pattern),
+                ),
+            )
+            .options(selectinload(Collection.details))
+            .order_by(desc(Collection.created_at))
+            .offset(offset)
+            .limit(limit + 1)
+        )
+        collections_result = await db.execute(collections_query)
+        collections = list(collections_result.scalars().unique().all())
+        hits_by_id = {}
+    else:
+        hits_by_id = {hit.collection_id: hit for hit in hits}
+        collections_query = (
+            select(Collection)
+            .where(Collection.id.in_(list(hits_by_id)))
+            .options(selectinload(Collection.details))
+        )
+        collections_result = await db.execute(collections_query)
+        collections_map = {c.id: c for c in collections_result.scalars().unique().all()}
+        # 保持 BM25 排序
+        collections = [
+            collections_map[hit.collection_id]
+            for hit in hits
+            if hit.collection_id in collections_map
+        ]
+
+    has_more = len(collections) > limit
+    collections = collections[:limit]
+
+    return Response(
+        code=200,
+        message="Collections searched successfully",
+        data={
+            "collections": [
+                {
+                    "id": collection.id,
+                    "category_id": collection.category_id,
+                    "tags": collection.tags,
+                    "details": details_dict(collection, collection.details),
+                    "snippet": (
+                        hits_by_id[collection.id].snippet
+                        if collection.id in hits_by_id
+                        else None
+                    ),
+                    "score": (
+                        hits_by_id[collection.id].score
+                        if collection.id in hits_by_id
+                        else None
+                    ),
+                    "created_at": collection.created_at.isoformat(),
+                    "updated_at": collection.updated_at.isoformat(),
+                }
+                for collection in collections
+            ],
+            "page": page,
+            "limit": limit,
+            "has_more": has_more,
+        },
+    )
+
+
 @router.get("/{collection_id}", response_model=Response)
 async def get_collection_by_id(
     collection_id: int,
@@ -523,6 +840,8 @@ async def get_collection_by_id(
         category_result = await db.execute(category_query)
         category = category_result.scalar_one_or_none()
 
+    content = await load_content(db, collection_id)
+
     return Response(
         code=200,
         message="Collection retrieved successfully",
@@ -544,7 +863,7 @@ async def get_collection_by_id(
                 if getattr(collection, "tags", "")
                 else []
             ),
-            "details": {detail.key: detail.value for detail in collection.details},
+            "details": details_dict(collection, collection.details, content),
             "created_at": collection.created_at.isoformat(),
             "updated_at": collection.updated_at.isoformat(),
         },
@@ -650,6 +969,114 @@ async def get_collection_by_id(
 #         },
 #     )
 
+# 列表接口单页最多返回的数量
+MAX_LIST_LIMIT = 200
+
+
+async def _list_collections(
+    db: AsyncSession,
+    conditions: list,
+    fields: Optional[str],
+    limit: Optional[int],
+    cursor: Optional[str],
+    include_content: bool,
+) -> tuple[list[dict], Optional[str]]:
+    """
+    列表接口的公共实现，按 (created_at, id) 倒序做 keyset 分页。
+
+    - fields: 只返回 details 中的这些字段（如 title,url,summary），只查询需要的列
+    - limit: 不传时返回全部（兼容旧的客户端）
+    - cursor: 上一页返回的 next_cursor
+
+    Returns:
+        (collections, next_cursor)
+    """
+    wanted = parse_fields(fields)
+    if wanted is not None and include_content:
+        wanted.add(CONTENT_KEY)
+    load_content_blob = include_content or (wanted is not None and CONTENT_KEY in wanted)
+    # 固定字段都是短文本，总是随列一起读取；content 和其余 key 只在需要时查询
+    free_keys = (
+        None if wanted is None else wanted - set(PROMOTED_KEYS) - {CONTENT_KEY}
+    )
+
+    collections_query = (
+        select(Collection)
+        .where(*conditions)
+        .options(
+            load_only(
+                Collection.id,
+                Collection.category_id,
+                Collection.tags,
+                Collection.created_at,
+                Collection.updated_at,
+                *(getattr(Collection, key) for key in PROMOTED_KEYS),
+            )
+        )
+        .order_by(desc(Collection.created_at), desc(Collection.id))
+    )
+    if cursor:
+        try:
+            cursor_created_at, cursor_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+            )
+        collections_query = collections_query.where(
+            or_(
+                Collection.created_at < cursor_created_at,
+                and_(
+                    Collection.created_at == cursor_created_at,
+                    Collection.id < cursor_id,
+                ),
+            )
+        )
+    if limit is not None:
+        limit = min(max(limit, 1), MAX_LIST_LIMIT)
+        # 多取一条用来判断是否还有下一页
+        collections_query = collections_query.limit(limit + 1)
+
+    collections_result = await db.execute(collections_query)
+    collections = list(collections_result.scalars().all())
+    next_cursor = None
+    if limit is not None and len(collections) > limit:
+        collections = collections[:limit]
+        next_cursor = encode_cursor(collections[-1].created_at, collections[-1].id)
+
+    ids = [collection.id for collection in collections]
+    details: dict[int, list[tuple]] = {collection_id: [] for collection_id in ids}
+    if ids and free_keys != set():
+        details_query = select(
+            CollectionDetail.collection_id, CollectionDetail.key, CollectionDetail.value
+        ).where(CollectionDetail.collection_id.in_(ids))
+        if free_keys is not None:
+            details_query = details_query.where(CollectionDetail.key.in_(free_keys))
+        for collection_id, key, value in (await db.execute(details_query)).all():
+            details[collection_id].append((key, value))
+    contents = await load_contents(db, ids) if load_content_blob else {}
+
+    items = []
+    for collection in collections:
+        collection_details = details_dict(
+            collection, details[collection.id], contents.get(collection.id)
+        )
+        if wanted is not None:
+            collection_details = {
+                key: value for key, value in collection_details.items() if key in wanted
+            }
+        items.append(
+            {
+                "id": collection.id,
+                "category_id": collection.category_id,
+                "tags": collection.tags,
+                "details": collection_details,
+                "created_at": collection.created_at.isoformat(),
+                "updated_at": collection.updated_at.isoformat(),
+            }
+        )
+    return items, next_cursor
+
+
 # Create user collections router
 collections_router = APIRouter(
     prefix="/collections",
@@ -661,47 +1088,63 @@ collections_router = APIRouter(
 @collections_router.get("/", response_model=Response)
 async def get_current_user_collections(
     category_id: int | None = None,
+    fields: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    include_content: bool = False,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
     """
-    Get all collections for the current authenticated user
-    """
-    # Get user's collections
-    collections_query = (
-        select(Collection)
-        .where(Collection.user_id == current_user.id)
-        .options(selectinload(Collection.details))
-        .order_by(desc(Collection.created_at))
-    )
+    Get all collections for the current authenticated user.
 
+    - fields: 逗号分隔的 details 字段投影，如 title,url,summary
+    - limit / cursor: keyset 分页，下一页传入返回的 next_cursor
+    - 正文默认不返回，需要时传 include_content=true 或在 fields 中包含 content
+    """
+    conditions = [Collection.user_id == current_user.id]
     if category_id:
+        conditions.append(Collection.category_id == category_id)
 
-        collections_query = collections_query.where(
-            Collection.category_id == category_id
-        )
-
-    collections_result = await db.execute(collections_query)
-    collections = collections_result.scalars().unique().all()
+    collections, next_cursor = await _list_collections(
+        db, conditions, fields, limit, cursor, include_content
+    )
 
     return Response(
         code=200,
         message="Collections retrieved successfully",
-        data={
-            "collections": [
-                {
-                    "id": collection.id,
-                    "category_id": collection.category_id,
-                    "tags": collection.tags,
-                    "details": {
-                        detail.key: detail.value for detail in collection.details
-                    },
-                    "created_at": collection.created_at.isoformat(),
-                    "updated_at": collection.updated_at.isoformat(),
-                }
-                for collection in collections
-            ]
-        },
+        data={"collections": collections, "next_cursor": next_cursor},
+    )
+
+
+@collections_router.get("/export")
+async def export_current_user_collections(
+    format: str = "ndjson",
+    current_user: User = Depends(get_current_user),
+):
+    """
+    以 NDJSON 流的形式导出当前用户的全部分类和收藏（含 details、正文和附件引用）
+
+    - format: ndjson 或 gzip（gzip 压缩的 NDJSON）
+    """
+    if format not in ("ndjson", "gzip"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="format must be 'ndjson' or 'gzip'",
+        )
+
+    filename = f"memora-export-{current_user.id}.ndjson"
+    stream = export_library(current_user.id)  # type: ignore
+    media_type = "application/x-ndjson"
+    if format == "gzip":
+        filename += ".gz"
+        stream = gzip_stream(stream)
+        media_type = "application/gzip"
+
+    return StreamingResponse(
+        stream,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
 
 
@@ -709,22 +1152,24 @@ async def get_current_user_collections(
 @router.get("/by_category/{category_id}", response_model=Response)
 async def get_collections_by_category(
     category_id: int,
+    fields: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    include_content: bool = False,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
     """
-    根据category_id获取当前用户的collection
+    根据category_id获取当前用户的collection，参数同 GET /collections/
     """
-    collections_query = (
-        select(Collection)
-        .where(
-            Collection.category_id == category_id, Collection.user_id == current_user.id
-        )
-        .options(selectinload(Collection.details))
-        .order_by(desc(Collection.created_at))
+    collections, next_cursor = await _list_collections(
+        db,
+        [Collection.category_id == category_id, Collection.user_id == current_user.id],
+        fields,
+        limit,
+        cursor,
+        include_content,
     )
-    collections_result = await db.execute(collections_query)
-    collections = collections_result.scalars().unique().all()
 
     # get category
     category_query = select(Category).where(
@@ -747,56 +1192,8 @@ async def get_collections_by_category(
                 if category
                 else None
             ),
-            "collections": [
-                {
-                    "id": collection.id,
-                    "category_id": collection.category_id,
-                    "tags": collection.tags,
-                    "details": {
-                        detail.key: detail.value for detail in collection.details
-                    },
-                    "created_at": collection.created_at.isoformat(),
-                    "updated_at": collection.updated_at.isoformat(),
-                }
-                for collection in collections
-            ],
-        },
-    )
-
-
-# 全文搜索，找到匹配的 collection
-@router.get("/search", response_model=Response)
-async def search_collections(query: str, db: AsyncSession = Depends(get_db)):
-    """
-    全文搜索，找到匹配的 collection
-    """
-    # 搜索 Collection 的 details 中的内容
-    collections_query = (
-        select(Collection)
-        .join(Collection.details)
-        .where(CollectionDetail.value.ilike(f"%{query}%"))
-        .options(selectinload(Collection.details))
-        .order_by(desc(Collection.created_at))
-    )
-    collections_result = await db.execute(collections_query)
-    collections = collections_result.scalars().unique().all()
-    return Response(
-        code=200,
-        message="Collections searched successfully",
-        data={
-            "collections": [
-                {
-                    "id": collection.id,
-                    "category_id": collection.category_id,
-                    "tags": collection.tags,
-                    "details": {
-                        detail.key: detail.value for detail in collection.details
-                    },
-                    "created_at": collection.created_at.isoformat(),
-                    "updated_at": collection.updated_at.isoformat(),
-                }
-                for collection in collections
-            ]
+            "collections": collections,
+            "next_cursor": next_cursor,
         },
     )
 
@@ -826,25 +1223,11 @@ async def get_collection_details(
 
     details_result = await db.execute(details_query)
     details = details_result.scalars().all()
+    content = await load_content(db, collection_id)
     return Response(
         code=200,
         message="Collection details fetched successfully",
-        data={
-            "details": (
-                [
-                    {
-                        "id": detail.id,
-                        "key": detail.key,
-                        "value": detail.value,
-                        "created_at": detail.created_at.isoformat(),
-                        "updated_at": detail.updated_at.isoformat(),
-                    }
-                    for detail in collection.details
-                ]
-                if collection.details
-                else []
-            )
-        },
+        data={"details": detail_rows(collection, details, content)},
     )
 
 
@@ -867,6 +1250,18 @@ async def get_collection_detail(
             detail="Collection not found or access denied",
         )
 
+    if is_promoted(key) or key == CONTENT_KEY:
+        content = await load_content(db, collection_id) if key == CONTENT_KEY else None
+        rows = detail_rows(collection, [], content)
+        row = next((row for row in rows if row["key"] == key), None)
+        if row is None:
+            raise HTTPException(status_code=404, detail="Detail not found")
+        return Response(
+            code=200,
+            message="Collection detail fetched successfully",
+            data={"detail": row},
+        )
+
     detail_query = select(CollectionDetail).where(
         CollectionDetail.collection_id == collection_id, CollectionDetail.key == key
     )
@@ -909,6 +1304,29 @@ async def update_collection_detail(
             detail="Collection not found or access denied",
         )
 
+    if is_promoted(key):
+        existed = getattr(collection, key) is not None
+        set_promoted_field(collection, key, update.value)
+        await db.commit()
+        return Response(
+            code=200,
+            message="Detail updated successfully" if existed else "Detail created successfully",
+            data={"key": key, "value": update.value},
+        )
+
+    if key == CONTENT_KEY:
+        existed = await load_content(db, collection_id) is not None
+        await save_content(db, collection_id, update.value or "")
+        await db.commit()
+        await enqueue_knowledge_base_sync(
+            db, collection_id, [collection.category_id], current_user.id  # type: ignore
+        )
+        return Response(
+            code=200,
+            message="Detail updated successfully" if existed else "Detail created successfully",
+            data={"key": key, "value": update.value},
+        )
+
     detail_query = select(CollectionDetail).where(
         CollectionDetail.collection_id == collection_id, CollectionDetail.key == key
     )
@@ -953,6 +1371,22 @@ async def delete_collection_detail(
             detail="Collection not found or access denied",
         )
 
+    if is_promoted(key):
+        if getattr(collection, key) is None:
+            raise HTTPException(status_code=404, detail="Detail not found")
+        set_promoted_field(collection, key, None)
+        await db.commit()
+        return Response(code=200, message="Detail deleted successfully", data={"key": key})
+
+    if key == CONTENT_KEY:
+        if not await delete_content(db, collection_id):
+            raise HTTPException(status_code=404, detail="Detail not found")
+        await db.commit()
+        await enqueue_knowledge_base_sync(
+            db, collection_id, [collection.category_id], current_user.id  # type: ignore
+        )
+        return Response(code=200, message="Detail deleted successfully", data={"key": key})
+
     detail_query = select(CollectionDetail).where(
         CollectionDetail.collection_id == collection_id, CollectionDetail.key == key
     )
@@ -1012,6 +1446,7 @@ async def get_public_collection_details(
     )
     details_result = await db.execute(details_query)
     details = details_result.scalars().all()
+    content = await load_content(db, collection_id)
 
     # 获取分类信息
     category_name = None
@@ -1031,20 +1466,7 @@ async def get_public_collection_details(
                 "category_id": collection.category_id,
                 "category_name": category_name,
                 "tags": collection.tags,
-                "details": (
-                    [
-                        {
-                            "id": detail.id,
-                            "key": detail.key,
-                            "value": detail.value,
-                            "created_at": detail.created_at.isoformat(),
-                            "updated_at": detail.updated_at.isoformat(),
-                        }
-                        for detail in collection.details
-                    ]
-                    if collection.details
-                    else []
-                ),
+                "details": detail_rows(collection, details, content),
                 "created_at": collection.created_at.isoformat(),
                 "updated_at": collection.updated_at.isoformat(),
             }
@@ -1100,8 +1522,11 @@ async def delete_collection(
             detail="Collection not found or access denied",
         )
 
+    category_id = collection.category_id
     await db.delete(collection)
     await db.commit()
+    # 从所属分类的知识库中删除分块
+    await enqueue_knowledge_base_sync(db, collection_id, [category_id], current_user.id)  # type: ignore
 
     return Response(
         code=200,
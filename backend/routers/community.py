@@ -1,6 +1,12 @@
+import os
+import json
+import hashlib
+
+import numpy as np
 from fastapi import APIRouter, HTTPException, Depends, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import desc, select, and_, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import case, desc, select, update, delete, and_, or_, func
 from pydantic import BaseModel
 from typing import Optional
 from datetime import timezone, datetime
@@ -16,21 +22,43 @@ from backend.model import (
     Comment,
     Like,
     AssetType,
+    PostEmbedding,
 )
-from backend.db import get_db
+from backend.db import get_db, AsyncSessionLocal
 from backend.routers.auth import get_current_user
 from backend.ai.openai_provider import provider_openai
+from backend.ai.openai_embedding_provider import provider_openai_embedding
+from backend.ai.recommender import (
+    build_post_text,
+    build_interest_vector,
+    rank_posts,
+    vector_from_bytes,
+    vector_to_bytes,
+)
+from backend.utils.pagination import encode_cursor, decode_cursor
+from backend.utils.cache import create_cache
+from backend.utils.collection_fields import details_dict
+from backend.utils.content_store import load_content, save_content
+from backend.ai.content_analysis import classify_content
+from backend.knowledge_base.jobs import enqueue_knowledge_base_sync
+from backend.utils.job_queue import job_queue
 from backend.ai.PROMPTS import (
-    PROMPT_PARSE_CATEGORY_AND_TAGS,
     ADDITIONAL_PROMPT_USER_LANGUAGE_PREFERENCE,
     PROMPT_RECOMMEND_POSTS,
     parse_json,
 )
 
-# 推荐缓存：存储每个用户的推荐结果
-# 格式：{user_id: {"posts": [...], "timestamp": datetime}}
-_recommendation_cache = {}
+# 推荐缓存：存储每个用户的推荐结果（post id 列表），LRU + TTL，多个 worker 进程共享
 CACHE_DURATION_SECONDS = 300  # 5分钟缓存
+CACHE_MAX_USERS = 10000
+recommendation_cache = create_cache(
+    "recommendations", maxsize=CACHE_MAX_USERS, ttl=CACHE_DURATION_SECONDS
+)
+# 用户兴趣向量缓存，key 中包含收藏历史的哈希，历史变化后自动失效
+interest_vector_cache = create_cache("user_interest", maxsize=CACHE_MAX_USERS, ttl=24 * 3600)
+RECENT_TITLES_FOR_INTEREST = 20
+RECOMMENDATION_LLM_RERANK = os.getenv("RECOMMENDATION_LLM_RERANK", "false").lower() == "true"
+POST_EMBEDDING_JOB = "post_embedding"
 
 # Create router instance
 router = APIRouter(
@@ -94,53 +122,57 @@ class PostResponse(BaseModel):
     user: Optional[UserInfo] = None
 
 
-# 辅助函数：获取推文详细信息
-async def _fetch_post_details(
-    post_ids: list[int],
-    current_user: User,
-    db: AsyncSession
-) -> list[PostResponse]:
+def _post_rows_query():
     """
-    根据post IDs获取完整的推文详细信息
+    推文列表的基础查询：推文、作者、收藏、分类名、点赞数、评论数
+    点赞数和评论数直接读取 Post 上的冗余计数，不再关联 likes / comments 表
     """
-    if not post_ids:
-        return []
-
-    # 获取推文详细信息
-    posts_query = (
+    return (
         select(
             Post,
             User,
             Collection,
             Category.name.label("category_name"),
-            func.count(Like.id.distinct()).label("likes_count"),
-            func.count(Comment.id.distinct()).label("comments_count"),
+            Post.likes_count,
+            Post.comments_count,
         )
         .join(User, Post.user_id == User.id)
         .join(Collection, Post.refer_collection_id == Collection.id)
         .outerjoin(Category, Collection.category_id == Category.id)
-        .outerjoin(Like, and_(Like.asset_id == Post.id, Like.asset_type == AssetType.post))
-        .outerjoin(Comment, Comment.post_id == Post.id)
-        .where(Post.id.in_(post_ids))
-        .group_by(
-            Post.id, User.id, User.username, User.avatar_attachment_id, Collection.id, Category.name
-        )
     )
 
-    posts_result = await db.execute(posts_query)
-    posts_data = posts_result.all()
 
-    # 按照提供的顺序排序
-    posts_dict = {}
-    for row in posts_data:
-        posts_dict[row[0].id] = row
+async def _hydrate_posts(rows, current_user: User, db: AsyncSession) -> list[PostResponse]:
+    """
+    将推文查询结果批量组装为 PostResponse
+    整页推文的点赞状态和收藏详情各用一次查询获取，避免 N+1 查询
+    """
+    if not rows:
+        return []
 
-    posts = []
-    for post_id in post_ids:
-        if post_id not in posts_dict:
-            continue
+    post_ids = [row[0].id for row in rows]
+    collection_ids = list({row[2].id for row in rows})
 
-        row = posts_dict[post_id]
+    # 当前用户在本页中点赞过的推文
+    liked_query = select(Like.asset_id).where(
+        Like.asset_type == AssetType.post,
+        Like.user_id == current_user.id,
+        Like.asset_id.in_(post_ids),
+    )
+    liked_result = await db.execute(liked_query)
+    liked_post_ids = set(liked_result.scalars().all())
+
+    # 本页所有收藏的详情，按 collection_id 分组
+    details_query = select(
+        CollectionDetail.collection_id, CollectionDetail.key, CollectionDetail.value
+    ).where(CollectionDetail.collection_id.in_(collection_ids))
+    details_result = await db.execute(details_query)
+    details_by_collection: dict[int, list] = {}
+    for collection_id, key, value in details_result.all():
+        details_by_collection.setdefault(collection_id, []).append((key, value))
+
+    posts = []
+    for row in rows:
         post = row[0]
         user = row[1]
         collection = row[2]
@@ -148,24 +180,6 @@ async def _fetch_post_details(
         likes_count = row[4]
         comments_count = row[5]
 
-        # 检查当前用户是否已点赞
-        like_query = select(Like).where(
-            and_(
-                Like.asset_id == post.id,
-                Like.asset_type == AssetType.post,
-                Like.user_id == current_user.id,
-            )
-        )
-        like_result = await db.execute(like_query)
-        is_liked_by_me = like_result.scalar_one_or_none() is not None
-
-        # 获取收藏详情
-        details_query = select(CollectionDetail).where(
-            CollectionDetail.collection_id == collection.id
-        )
-        details_result = await db.execute(details_query)
-        details = details_result.scalars().all()
-
         posts.append(
             PostResponse(
                 id=post.id,
@@ -175,13 +189,15 @@ async def _fetch_post_details(
                 username=user.username,
                 avatar_attachment_id=user.avatar_attachment_id,
                 refer_collection_id=post.refer_collection_id,
-                collection_details={detail.key: detail.value for detail in details},
+                collection_details=details_dict(
+                    collection, details_by_collection.get(collection.id, [])
+                ),
                 category_id=collection.category_id,
                 category_name=category_name,
                 tags=collection.tags,
                 likes_count=likes_count,
                 comments_count=comments_count,
-                is_liked_by_me=is_liked_by_me,
+                is_liked_by_me=post.id in liked_post_ids,
                 created_at=post.created_at.replace(tzinfo=timezone.utc).isoformat(),
                 updated_at=post.updated_at.replace(tzinfo=timezone.utc).isoformat(),
                 user=UserInfo(
@@ -195,6 +211,33 @@ async def _fetch_post_details(
     return posts
 
 
+# 辅助函数：获取推文详细信息
+async def _fetch_post_details(
+    post_ids: list[int],
+    current_user: User,
+    db: AsyncSession
+) -> list[PostResponse]:
+    """
+    根据post IDs获取完整的推文详细信息
+    """
+    if not post_ids:
+        return []
+
+    # 获取推文详细信息
+    posts_query = _post_rows_query().where(Post.id.in_(post_ids))
+
+    posts_result = await db.execute(posts_query)
+    posts_data = posts_result.all()
+
+    # 按照提供的顺序排序
+    posts_dict = {}
+    for row in posts_data:
+        posts_dict[row[0].id] = row
+
+    rows = [posts_dict[post_id] for post_id in post_ids if post_id in posts_dict]
+    return await _hydrate_posts(rows, current_user, db)
+
+
 @router.post("/posts", response_model=Response)
 async def create_post(
     request: CreatePostRequest,
@@ -225,6 +268,16 @@ async def create_post(
     await db.commit()
     await db.refresh(new_post)
 
+    # 后台计算推文向量，用于推荐
+    if provider_openai_embedding.configured:
+        await job_queue.enqueue(
+            db,
+            POST_EMBEDDING_JOB,
+            {"post_id": new_post.id},
+            user_id=current_user.id,  # type: ignore
+            idempotency_key=f"{POST_EMBEDDING_JOB}:{new_post.id}",
+        )
+
     return Response(
         code=200,
         message="推文发布成功",
@@ -272,86 +325,269 @@ async def get_latest_posts(
 
     # 获取推文列表，包含用户信息、收藏信息、分类信息、点赞数、评论数
     posts_query = (
-        select(
-            Post,
-            User,
-            Collection,
-            Category.name.label("category_name"),
-            func.count(Like.id.distinct()).label("likes_count"),
-            func.count(Comment.id.distinct()).label("comments_count"),
-        )
-        .join(User, Post.user_id == User.id)
-        .join(Collection, Post.refer_collection_id == Collection.id)
-        .outerjoin(Category, Collection.category_id == Category.id)
-        .outerjoin(Like, and_(Like.asset_id == Post.id, Like.asset_type == AssetType.post))
-        .outerjoin(Comment, Comment.post_id == Post.id)
-        .group_by(
-            Post.id, User.id, User.username, User.avatar_attachment_id, Collection.id, Category.name
-        )
+        _post_rows_query()
         .order_by(desc(Post.created_at))
         .offset(offset)
         .limit(limit)
     )
 
     posts_result = await db.execute(posts_query)
-    posts_data = posts_result.all()
+    posts = await _hydrate_posts(posts_result.all(), current_user, db)
 
-    posts = []
-    for row in posts_data:
-        post = row[0]
-        user = row[1]
-        collection = row[2]
-        category_name = row[3]
-        likes_count = row[4]
-        comments_count = row[5]
+    return Response(
+        code=200, message="推文列表获取成功", data={"posts": posts, "page": page, "limit": limit}
+    )
+
+
+async def _ensure_post_embeddings(
+    post_ids: list[int], db: AsyncSession
+) -> dict[int, np.ndarray]:
+    """
+    获取推文向量，缺失的（旧推文或模型变更）批量计算一次并保存
+    """
+    if not post_ids:
+        return {}
+
+    model_name = provider_openai_embedding.model
+    embeddings_query = select(PostEmbedding).where(
+        PostEmbedding.post_id.in_(post_ids), PostEmbedding.model == model_name
+    )
+    embeddings_result = await db.execute(embeddings_query)
+    vectors = {
+        embedding.post_id: vector_from_bytes(embedding.vector)
+        for embedding in embeddings_result.scalars().all()
+    }
+
+    missing_ids = [post_id for post_id in post_ids if post_id not in vectors]
+    if not missing_ids:
+        return vectors
+
+    # 一次查询获取缺失推文的标题、摘要和标签
+    posts_query = (
+        select(Post.id, Collection.title, Collection.summary, Collection.tags)
+        .join(Collection, Post.refer_collection_id == Collection.id)
+        .where(Post.id.in_(missing_ids))
+    )
+    posts_result = await db.execute(posts_query)
+    post_fields: dict[int, dict] = {
+        post_id: {"title": title, "summary": summary, "tags": tags}
+        for post_id, title, summary, tags in posts_result.all()
+    }
+
+    embed_ids = list(post_fields)
+    matrix = await provider_openai_embedding.embed_cached(
+        [
+            build_post_text(
+                post_fields[post_id].get("title"),
+                post_fields[post_id].get("summary"),
+                post_fields[post_id].get("tags"),
+            )
+            for post_id in embed_ids
+        ]
+    )
 
-        # 检查当前用户是否已点赞
-        like_query = select(Like).where(
-            and_(
-                Like.asset_id == post.id,
-                Like.asset_type == AssetType.post,
-                Like.user_id == current_user.id,
+    await db.execute(
+        delete(PostEmbedding).where(PostEmbedding.post_id.in_(embed_ids))
+    )
+    for post_id, vector in zip(embed_ids, matrix):
+        db.add(
+            PostEmbedding(
+                post_id=post_id,
+                model=model_name,
+                dim=int(vector.shape[0]),
+                vector=vector_to_bytes(vector),
             )
         )
-        like_result = await db.execute(like_query)
-        is_liked_by_me = like_result.scalar_one_or_none() is not None
+        vectors[post_id] = vector
+    try:
+        await db.commit()
+    except IntegrityError:
+        # 并发请求已经写入了同一推文的向量
+        await db.rollback()
+    logger.info(f"Embedded {len(embed_ids)} posts for recommendation")
+    return vectors
+
 
-        # 获取收藏详情
-        details_query = select(CollectionDetail).where(
-            CollectionDetail.collection_id == collection.id
+@job_queue.register(POST_EMBEDDING_JOB, concurrency=2, max_attempts=3, backoff=30)
+async def embed_new_post(payload: dict) -> dict | None:
+    """
+    后台任务：发布推文时计算向量，推荐时无需再调用模型；推文已删除时什么也不做
+    """
+    async with AsyncSessionLocal() as db:
+        vectors = await _ensure_post_embeddings([payload["post_id"]], db)
+    return {"embedded": payload["post_id"] in vectors}
+
+
+async def _get_interest_vector(
+    user_id: int,
+    categories: list[tuple[str, int]],
+    recent_titles: list[str],
+) -> np.ndarray:
+    """
+    用户兴趣向量，由收藏最多的分类和最近收藏的标题构成
+    按用户收藏历史的哈希缓存，历史不变时不会重复调用模型
+    """
+    profile = json.dumps(
+        [provider_openai_embedding.model, categories, recent_titles], ensure_ascii=False
+    )
+    cache_key = f"{user_id}:{hashlib.sha256(profile.encode()).hexdigest()}"
+
+    async def compute():
+        texts = [name for name, _ in categories] + recent_titles
+        matrix = await provider_openai_embedding.embed_cached(texts)
+        interest = build_interest_vector(
+            matrix[: len(categories)],
+            [count for _, count in categories],
+            matrix[len(categories):],
         )
-        details_result = await db.execute(details_query)
-        details = details_result.scalars().all()
+        return interest.tolist()
 
-        posts.append(
-            PostResponse(
-                id=post.id,
-                post_id=post.post_id,
-                description=post.description,
-                user_id=post.user_id,
-                username=user.username,
-                avatar_attachment_id=user.avatar_attachment_id,
-                refer_collection_id=post.refer_collection_id,
-                collection_details={detail.key: detail.value for detail in details},
-                category_id=collection.category_id,
-                category_name=category_name,
-                tags=collection.tags,
-                likes_count=likes_count,
-                comments_count=comments_count,
-                is_liked_by_me=is_liked_by_me,
-                created_at=post.created_at.replace(tzinfo=timezone.utc).isoformat(),
-                updated_at=post.updated_at.replace(tzinfo=timezone.utc).isoformat(),
-                user=UserInfo(
-                    id=user.id,
-                    username=user.username,
-                    avatar_attachment_id=user.avatar_attachment_id,
-                ),
-            )
+    interest, _ = await interest_vector_cache.get_or_compute(cache_key, compute)
+    return np.asarray(interest, dtype=np.float32)
+
+
+async def _llm_recommend(
+    user_categories_str: str,
+    candidate_ids: list[int],
+    max_n_recommendations: int,
+    db: AsyncSession,
+) -> list[int]:
+    """
+    使用LLM从候选推文中挑选推荐结果（按候选顺序提供给模型）
+    """
+    candidates_query = (
+        select(
+            Post.id,
+            Post.post_id,
+            Collection.tags,
+            Collection.title,
         )
+        .join(Collection, Post.refer_collection_id == Collection.id)
+        .where(Post.id.in_(candidate_ids))
+    )
+    candidates_result = await db.execute(candidates_query)
+    candidates_map = {row[0]: row for row in candidates_result.all()}
+
+    # 构建推文信息字符串
+    posts_info_str = "\n\n".join([
+        f"Post ID: {row[0]}\nTitle: {row[3] or 'No title'}\nTags: {row[2] or 'No tags'}"
+        for row in (candidates_map[post_id] for post_id in candidate_ids if post_id in candidates_map)
+    ])
+
+    recommendation_prompt = PROMPT_RECOMMEND_POSTS.format(
+        user_categories=user_categories_str,
+        posts_info=posts_info_str,
+        max_recommendations=max_n_recommendations
+    )
+    recommendation_prompt += f"\n\n{ADDITIONAL_PROMPT_USER_LANGUAGE_PREFERENCE}"
 
-    return Response(
-        code=200, message="推文列表获取成功", data={"posts": posts, "page": page, "limit": limit}
+    llm_resp = await provider_openai.text_chat(
+        prompt="Please analyze and provide recommendations.",
+        system_prompt=recommendation_prompt,
+    )
+
+    recommendation_json = parse_json(llm_resp.completion_text)
+    recommended_post_ids = recommendation_json.get("recommended_post_ids", [])
+    logger.info(f"LLM recommended post IDs: {recommended_post_ids}")
+    return recommended_post_ids
+
+
+async def _compute_recommended_post_ids(
+    user_id: int,
+    db: AsyncSession,
+    top_k_categories: int,
+    top_m_posts: int,
+    max_n_recommendations: int,
+    llm_rerank: bool,
+) -> list[int] | None:
+    """
+    为用户计算推荐的推文ID列表
+    优先使用本地向量排序（用户兴趣向量与推文向量的余弦相似度 + 新鲜度衰减），
+    LLM仅作为可选的重排序；未配置向量模型时回退到LLM推荐
+    返回 None 表示无法推荐（没有分类、没有推文或没有结果），调用方应降级为最新推文
+    """
+    # 1. 获取用户收藏数量最多的前k个分类
+    user_categories_query = (
+        select(Category.name, func.count(Collection.id).label("collection_count"))
+        .join(Collection, Collection.category_id == Category.id)
+        .where(Collection.user_id == user_id)
+        .group_by(Category.id, Category.name)
+        .order_by(desc("collection_count"))
+        .limit(top_k_categories)
+    )
+    user_categories_result = await db.execute(user_categories_query)
+    user_categories_data = [(row[0], row[1]) for row in user_categories_result.all()]
+
+    # 如果用户没有任何分类，返回最新推文作为默认推荐
+    if not user_categories_data:
+        logger.info(f"User {user_id} has no categories, returning latest posts")
+        return None
+
+    # 构建用户分类信息字符串
+    user_categories_str = "\n".join([
+        f"- {name} ({count} collections)"
+        for name, count in user_categories_data
+    ])
+
+    # 2. 获取最新的m个推文作为候选
+    latest_posts_query = (
+        select(Post.id, Post.created_at)
+        .order_by(desc(Post.created_at))
+        .limit(top_m_posts)
     )
+    latest_posts_result = await db.execute(latest_posts_query)
+    latest_posts_data = latest_posts_result.all()
+
+    if not latest_posts_data:
+        return None
+
+    candidate_ids = [row[0] for row in latest_posts_data]
+
+    # 3. 本地向量排序
+    if provider_openai_embedding.configured:
+        recent_titles_query = (
+            select(Collection.title)
+            .where(Collection.user_id == user_id, Collection.title.is_not(None))
+            .order_by(desc(Collection.created_at))
+            .limit(RECENT_TITLES_FOR_INTEREST)
+        )
+        recent_titles_result = await db.execute(recent_titles_query)
+        recent_titles = [str(title) for title in recent_titles_result.scalars().all() if title]
+
+        interest = await _get_interest_vector(user_id, user_categories_data, recent_titles)
+        post_vectors = await _ensure_post_embeddings(candidate_ids, db)
+
+        now = datetime.now(timezone.utc)
+        embedded = [row for row in latest_posts_data if row[0] in post_vectors]
+        if embedded:
+            ages_hours = np.asarray(
+                [
+                    (now - row[1].replace(tzinfo=timezone.utc)).total_seconds() / 3600
+                    for row in embedded
+                ],
+                dtype=np.float32,
+            )
+            matrix = np.stack([post_vectors[row[0]] for row in embedded])
+            # 需要LLM重排序时多保留一些候选
+            pool_size = max_n_recommendations * 3 if llm_rerank else max_n_recommendations
+            ranked = rank_posts(interest, matrix, ages_hours, pool_size)
+            ranked_ids = [embedded[i][0] for i, _ in ranked]
+            logger.info(f"Embedding recommended post IDs: {ranked_ids}")
+
+            if not llm_rerank:
+                return ranked_ids or None
+            candidate_ids = ranked_ids
+
+    # 4. 使用LLM进行推荐（重排序或回退）
+    recommended_post_ids = await _llm_recommend(
+        user_categories_str, candidate_ids, max_n_recommendations, db
+    )
+
+    if not recommended_post_ids:
+        logger.warning("LLM returned no recommendations, falling back to latest posts")
+        return None
+
+    return recommended_post_ids
 
 
 @router.get("/posts-recommended", response_model=Response)
@@ -361,142 +597,54 @@ async def get_recommended_posts(
     top_k_categories: int = 5,
     top_m_posts: int = 50,
     max_n_recommendations: int = 10,
+    llm_rerank: bool = RECOMMENDATION_LLM_RERANK,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
     """
-    获取社区推荐推文列表（基于用户收藏分类的LLM推荐）
+    获取社区推荐推文列表（基于用户兴趣向量的本地推荐，LLM可选重排序）
 
     参数：
     - page: 分页页码
     - limit: 每页数量
     - top_k_categories: 获取用户收藏数量最多的前k个分类 (默认5)
     - top_m_posts: 从最新的m个推文中选择 (默认50)
-    - max_n_recommendations: LLM最多推荐n个推文 (默认10)
+    - max_n_recommendations: 最多推荐n个推文 (默认10)
+    - llm_rerank: 是否使用LLM对向量排序结果重排序 (默认读取 RECOMMENDATION_LLM_RERANK)
 
-    缓存策略：每个用户的推荐结果缓存300秒
+    缓存策略：每个用户的推荐结果缓存300秒（多个 worker 共享），
+    同一用户的并发请求只会触发一次LLM调用
     """
     try:
-        # 检查缓存
-        user_id = current_user.id
-        now = datetime.now(timezone.utc)
-
-        if user_id in _recommendation_cache:
-            cached_data = _recommendation_cache[user_id]
-            cache_age = (now - cached_data["timestamp"]).total_seconds()
-
-            if cache_age < CACHE_DURATION_SECONDS:
-                logger.info(f"Recommendations cache used for user {user_id}, age: {cache_age:.0f}s")
-                cached_post_ids = cached_data["post_ids"]
-
-                # 应用分页
-                offset = (page - 1) * limit
-                paginated_post_ids = cached_post_ids[offset:offset + limit]
-
-                if not paginated_post_ids:
-                    return Response(
-                        code=200,
-                        message="推荐推文列表获取成功（来自缓存）",
-                        data={"posts": [], "page": page, "limit": limit, "from_cache": True}
-                    )
-
-                # 获取推文详细信息（使用缓存的post_ids）
-                posts = await _fetch_post_details(paginated_post_ids, current_user, db)
-
-                return Response(
-                    code=200,
-                    message="推荐推文列表获取成功（来自缓存）",
-                    data={"posts": posts, "page": page, "limit": limit, "from_cache": True}
-                )
-            else:
-                logger.info(f"Recommendations cache expired for user {user_id}")
-
-        # 1. 获取用户收藏数量最多的前k个分类
-        user_categories_query = (
-            select(Category.name, func.count(Collection.id).label("collection_count"))
-            .join(Collection, Collection.category_id == Category.id)
-            .where(Collection.user_id == current_user.id)
-            .group_by(Category.id, Category.name)
-            .order_by(desc("collection_count"))
-            .limit(top_k_categories)
+        cache_key = (
+            f"{current_user.id}:{top_k_categories}:{top_m_posts}:"
+            f"{max_n_recommendations}:{int(llm_rerank)}"
         )
-        user_categories_result = await db.execute(user_categories_query)
-        user_categories_data = user_categories_result.all()
-
-        # 如果用户没有任何分类，返回最新推文作为默认推荐
-        if not user_categories_data:
-            logger.info(f"User {current_user.id} has no categories, returning latest posts")
-            return await get_latest_posts(page, limit, current_user, db)
-
-        # 构建用户分类信息字符串
-        user_categories_str = "\n".join([
-            f"- {row[0]} ({row[1]} collections)"
-            for row in user_categories_data
-        ])
-
-        # 2. 获取最新的m个推文的基本信息
-        latest_posts_query = (
-            select(
-                Post.id,
-                Post.post_id,
-                Collection.tags,
-                CollectionDetail.value.label("title")
-            )
-            .join(Collection, Post.refer_collection_id == Collection.id)
-            .outerjoin(
-                CollectionDetail,
-                and_(
-                    CollectionDetail.collection_id == Collection.id,
-                    CollectionDetail.key == "title"
+        user_id: int = current_user.id  # type: ignore
+
+        async def compute():
+            # 计算在独立的 task 中进行，可能在当前请求结束后仍在运行，使用自己的 session
+            async with AsyncSessionLocal() as session:
+                return await _compute_recommended_post_ids(
+                    user_id,
+                    session,
+                    top_k_categories,
+                    top_m_posts,
+                    max_n_recommendations,
+                    llm_rerank,
                 )
-            )
-            .order_by(desc(Post.created_at))
-            .limit(top_m_posts)
-        )
-        latest_posts_result = await db.execute(latest_posts_query)
-        latest_posts_data = latest_posts_result.all()
 
-        if not latest_posts_data:
-            return Response(
-                code=200,
-                message="暂无推荐推文",
-                data={"posts": [], "page": page, "limit": limit}
-            )
-
-        # 构建推文信息字符串
-        posts_info_str = "\n\n".join([
-            f"Post ID: {row[0]}\nTitle: {row[3] or 'No title'}\nTags: {row[2] or 'No tags'}"
-            for row in latest_posts_data
-        ])
-
-        # 3. 使用LLM进行推荐
-        recommendation_prompt = PROMPT_RECOMMEND_POSTS.format(
-            user_categories=user_categories_str,
-            posts_info=posts_info_str,
-            max_recommendations=max_n_recommendations
-        )
-        recommendation_prompt += f"\n\n{ADDITIONAL_PROMPT_USER_LANGUAGE_PREFERENCE}"
-
-        llm_resp = await provider_openai.text_chat(
-            prompt="Please analyze and provide recommendations.",
-            system_prompt=recommendation_prompt,
+        recommended_post_ids, from_cache = await recommendation_cache.get_or_compute(
+            cache_key, compute
         )
 
-        recommendation_json = parse_json(llm_resp.completion_text)
-        recommended_post_ids = recommendation_json.get("recommended_post_ids", [])
-
-        logger.info(f"LLM recommended post IDs: {recommended_post_ids}")
-
         if not recommended_post_ids:
-            logger.warning("LLM returned no recommendations, falling back to latest posts")
             return await get_latest_posts(page, limit, current_user, db)
 
-        # 保存到缓存
-        _recommendation_cache[user_id] = {
-            "post_ids": recommended_post_ids,
-            "timestamp": now
-        }
-        logger.info(f"Recommendations cache added for user {user_id}")
+        logger.info(
+            f"Recommendations {'cache used' if from_cache else 'computed'} for user {current_user.id}"
+        )
+        message = "推荐推文列表获取成功（来自缓存）" if from_cache else "推荐推文列表获取成功"
 
         # 4. 根据推荐的post IDs获取完整的推文信息
         # 应用分页
@@ -506,8 +654,8 @@ async def get_recommended_posts(
         if not paginated_post_ids:
             return Response(
                 code=200,
-                message="推荐推文列表获取成功",
-                data={"posts": [], "page": page, "limit": limit, "from_cache": False}
+                message=message,
+                data={"posts": [], "page": page, "limit": limit, "from_cache": from_cache}
             )
 
         # 使用辅助函数获取推文详细信息
@@ -515,8 +663,8 @@ async def get_recommended_posts(
 
         return Response(
             code=200,
-            message="推荐推文列表获取成功",
-            data={"posts": posts, "page": page, "limit": limit, "from_cache": False}
+            message=message,
+            data={"posts": posts, "page": page, "limit": limit, "from_cache": from_cache}
         )
 
     except Exception as e:
@@ -538,83 +686,15 @@ async def get_my_posts(
     offset = (page - 1) * limit
 
     posts_query = (
-        select(
-            Post,
-            User,
-            Collection,
-            Category.name.label("category_name"),
-            func.count(Like.id.distinct()).label("likes_count"),
-            func.count(Comment.id.distinct()).label("comments_count"),
-        )
-        .join(User, Post.user_id == User.id)
-        .join(Collection, Post.refer_collection_id == Collection.id)
-        .outerjoin(Category, Collection.category_id == Category.id)
-        .outerjoin(Like, and_(Like.asset_id == Post.id, Like.asset_type == AssetType.post))
-        .outerjoin(Comment, Comment.post_id == Post.id)
+        _post_rows_query()
         .where(Post.user_id == current_user.id)
-        .group_by(
-            Post.id, User.id, User.username, User.avatar_attachment_id, Collection.id, Category.name
-        )
         .order_by(desc(Post.created_at))
         .offset(offset)
         .limit(limit)
     )
 
     posts_result = await db.execute(posts_query)
-    posts_data = posts_result.all()
-
-    posts = []
-    for row in posts_data:
-        post = row[0]
-        user = row[1]
-        collection = row[2]
-        category_name = row[3]
-        likes_count = row[4]
-        comments_count = row[5]
-
-        # 检查当前用户是否已点赞
-        like_query = select(Like).where(
-            and_(
-                Like.asset_id == post.id,
-                Like.asset_type == AssetType.post,
-                Like.user_id == current_user.id,
-            )
-        )
-        like_result = await db.execute(like_query)
-        is_liked_by_me = like_result.scalar_one_or_none() is not None
-
-        # 获取收藏详情
-        details_query = select(CollectionDetail).where(
-            CollectionDetail.collection_id == collection.id
-        )
-        details_result = await db.execute(details_query)
-        details = details_result.scalars().all()
-
-        posts.append(
-            PostResponse(
-                id=post.id,
-                post_id=post.post_id,
-                description=post.description,
-                user_id=post.user_id,
-                username=user.username,
-                avatar_attachment_id=user.avatar_attachment_id,
-                refer_collection_id=post.refer_collection_id,
-                collection_details={detail.key: detail.value for detail in details},
-                category_id=collection.category_id,
-                category_name=category_name,
-                tags=collection.tags,
-                likes_count=likes_count,
-                comments_count=comments_count,
-                is_liked_by_me=is_liked_by_me,
-                created_at=post.created_at.replace(tzinfo=timezone.utc).isoformat(),
-                updated_at=post.updated_at.replace(tzinfo=timezone.utc).isoformat(),
-                user=UserInfo(
-                    id=user.id,
-                    username=user.username,
-                    avatar_attachment_id=user.avatar_attachment_id,
-                ),
-            )
-        )
+    posts = await _hydrate_posts(posts_result.all(), current_user, db)
 
     return Response(
         code=200,
@@ -623,6 +703,21 @@ async def get_my_posts(
     )
 
 
+def _clamped_count(column, delta: int):
+    """计数加上 delta，结果不小于 0（两个参数的 max() 只有 SQLite 支持）"""
+    return case((column + delta < 0, 0), else_=column + delta)
+
+
+def _likes_count_update(asset_type: AssetType, asset_id: int, delta: int):
+    """生成更新推文/评论点赞计数的 UPDATE 语句"""
+    model = Post if asset_type == AssetType.post else Comment
+    return (
+        update(model)
+        .where(model.id == asset_id)
+        .values(likes_count=_clamped_count(model.likes_count, delta))
+    )
+
+
 @router.post("/like", response_model=Response)
 async def like_asset(
     request: LikeRequest,
@@ -669,10 +764,16 @@ async def like_asset(
     if existing_like:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="您已经点赞过该内容")
 
-    # 创建点赞记录
+    # 创建点赞记录，并在同一事务中更新冗余计数
     new_like = Like(user_id=current_user.id, asset_id=request.asset_id, asset_type=asset_type)
     db.add(new_like)
-    await db.commit()
+    try:
+        await db.execute(_likes_count_update(asset_type, request.asset_id, 1))
+        await db.commit()
+    except IntegrityError:
+        # 并发的重复点赞被唯一索引拦截
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="您已经点赞过该内容")
 
     return Response(
         code=200,
@@ -712,8 +813,9 @@ async def unlike_asset(
     if not like:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="您还未点赞该内容")
 
-    # 删除点赞记录
+    # 删除点赞记录，并在同一事务中更新冗余计数
     await db.delete(like)
+    await db.execute(_likes_count_update(asset_type, request.asset_id, -1))
     await db.commit()
 
     return Response(
@@ -741,11 +843,16 @@ async def create_comment(
     if not post:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="推文不存在")
 
-    # 创建评论
+    # 创建评论，并在同一事务中更新推文的评论计数
     new_comment = Comment(
         post_id=post.id, user_id=current_user.id, content=request.content
     )  # 使用数据库ID
     db.add(new_comment)
+    await db.execute(
+        update(Post)
+        .where(Post.id == post.id)
+        .values(comments_count=Post.comments_count + 1)
+    )
     await db.commit()
     await db.refresh(new_comment)
 
@@ -778,11 +885,15 @@ async def get_post_comments(
     post_id: str,  # 使用UUID字符串
     page: int = 1,
     limit: int = 20,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
     """
     获取推文的评论列表
+
+    - cursor: 上一页返回的 next_cursor，按 (created_at, id) 做 keyset 分页；
+      传入 cursor 时忽略 page
     """
     # 检查推文是否存在
     post_query = select(Post).where(Post.post_id == post_id)
@@ -792,39 +903,51 @@ async def get_post_comments(
     if not post:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="推文不存在")
 
-    offset = (page - 1) * limit
-
     # 获取评论列表
     comments_query = (
-        select(Comment, User, func.count(Like.id).label("likes_count"))
+        select(Comment, User, Comment.likes_count)
         .join(User, Comment.user_id == User.id)
-        .outerjoin(Like, and_(Like.asset_id == Comment.id, Like.asset_type == AssetType.comment))
         .where(Comment.post_id == post.id)
-        .group_by(Comment.id, User.id, User.username, User.avatar_attachment_id)
-        .order_by(desc(Comment.created_at))
-        .offset(offset)
-        .limit(limit)
+        .order_by(desc(Comment.created_at), desc(Comment.id))
+        .limit(limit + 1)
     )
+    if cursor:
+        try:
+            cursor_created_at, cursor_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="无效的分页游标")
+        comments_query = comments_query.where(
+            or_(
+                Comment.created_at < cursor_created_at,
+                and_(Comment.created_at == cursor_created_at, Comment.id < cursor_id),
+            )
+        )
+    else:
+        comments_query = comments_query.offset((page - 1) * limit)
+
     comments_result = await db.execute(comments_query)
     comments_data = comments_result.all()
 
+    has_more = len(comments_data) > limit
+    comments_data = comments_data[:limit]
+
+    # 一次查询获取当前用户在本页中点赞过的评论
+    liked_comment_ids = set()
+    if comments_data:
+        liked_query = select(Like.asset_id).where(
+            Like.asset_type == AssetType.comment,
+            Like.user_id == current_user.id,
+            Like.asset_id.in_([row[0].id for row in comments_data]),
+        )
+        liked_result = await db.execute(liked_query)
+        liked_comment_ids = set(liked_result.scalars().all())
+
     comments = []
     for row in comments_data:
         comment = row[0]
         user = row[1]
         likes_count = row[2]
 
-        # 检查当前用户是否已点赞该评论
-        like_query = select(Like).where(
-            and_(
-                Like.asset_id == comment.id,
-                Like.asset_type == AssetType.comment,
-                Like.user_id == current_user.id,
-            )
-        )
-        like_result = await db.execute(like_query)
-        is_liked_by_me = like_result.scalar_one_or_none() is not None
-
         comments.append(
             CommentResponse(
                 id=comment.id,
@@ -833,7 +956,7 @@ async def get_post_comments(
                 username=user.username,
                 avatar_attachment_id=user.avatar_attachment_id,
                 likes_count=likes_count,
-                is_liked_by_me=is_liked_by_me,
+                is_liked_by_me=comment.id in liked_comment_ids,
                 created_at=comment.created_at.replace(tzinfo=timezone.utc).isoformat(),
                 updated_at=comment.updated_at.replace(tzinfo=timezone.utc).isoformat(),
                 user=UserInfo(
@@ -844,10 +967,21 @@ async def get_post_comments(
             )
         )
 
+    next_cursor = None
+    if has_more and comments_data:
+        last_comment = comments_data[-1][0]
+        next_cursor = encode_cursor(last_comment.created_at, last_comment.id)
+
     return Response(
         code=200,
         message="评论列表获取成功",
-        data={"comments": comments, "page": page, "limit": limit},
+        data={
+            "comments": comments,
+            "page": page,
+            "limit": limit,
+            "has_more": has_more,
+            "next_cursor": next_cursor,
+        },
     )
 
 
@@ -870,8 +1004,13 @@ async def delete_comment(
     if not comment:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="评论不存在或您无权删除")
 
-    # 删除评论
+    # 删除评论，并在同一事务中更新推文的评论计数
     await db.delete(comment)
+    await db.execute(
+        update(Post)
+        .where(Post.id == comment.post_id)
+        .values(comments_count=_clamped_count(Post.comments_count, -1))
+    )
     await db.commit()
 
     return Response(code=200, message="评论删除成功", data={"comment_id": comment_id})
@@ -904,6 +1043,7 @@ async def get_post_collection_details(
     details_query = select(CollectionDetail).where(CollectionDetail.collection_id == collection.id)
     details_result = await db.execute(details_query)
     details = details_result.scalars().all()
+    content = await load_content(db, collection.id)  # type: ignore
 
     # 获取分类信息
     category_name = None
@@ -923,7 +1063,7 @@ async def get_post_collection_details(
                 "category_id": collection.category_id,
                 "category_name": category_name,
                 "tags": collection.tags,
-                "details": {detail.key: detail.value for detail in details},
+                "details": details_dict(collection, details, content),
                 "created_at": collection.created_at.replace(tzinfo=timezone.utc).isoformat(),
                 "updated_at": collection.updated_at.replace(tzinfo=timezone.utc).isoformat(),
             }
@@ -964,13 +1104,10 @@ async def copy_post_to_my_collection(
     details_result = await db.execute(details_query)
     original_details = details_result.scalars().all()
 
-    # 将详情转换为字典
-    details_dict = {detail.key: detail.value for detail in original_details}
-
     # 获取内容用于AI分类
-    content = details_dict.get("content", "")
-    title = details_dict.get("title", "")
-    summary = details_dict.get("summary", "")
+    content = await load_content(db, original_collection.id) or ""  # type: ignore
+    title = original_collection.title or ""
+    summary = original_collection.summary or ""
 
     # 使用内容、标题和摘要生成新的分类
     analysis_text = f"标题: {title}\n\n摘要: {summary}\n\n内容: {content[:500]}"
@@ -980,23 +1117,14 @@ async def copy_post_to_my_collection(
         Category.user_id == current_user.id
     )
     categories_result = await db.execute(categories_query)
-    categories = [row[0] for row in categories_result.all()]
-    category_emojis = [row[1] for row in categories_result.all()]
-
     categories_str = ", ".join(
-        [f"{cat}({emoji})" for cat, emoji in zip(categories, category_emojis)]
+        [f"{cat}({emoji})" for cat, emoji in categories_result.all()]
     )
-    cate_sys_prompt = PROMPT_PARSE_CATEGORY_AND_TAGS.format(categories=categories_str)
-    cate_sys_prompt += f"\n\n{ADDITIONAL_PROMPT_USER_LANGUAGE_PREFERENCE}"
 
     # 使用AI生成新的分类
-    cate_llm_resp = await provider_openai.text_chat(
-        prompt=analysis_text,
-        system_prompt=cate_sys_prompt,
-    )
-    cate_json = parse_json(cate_llm_resp.completion_text)
-    category: str = cate_json.get("category", "")
-    category_emoji: str = cate_json.get("category_emoji", "")
+    cate_json = await classify_content(analysis_text, categories_str)
+    category: str = cate_json["category"]
+    category_emoji: str = cate_json["category_emoji"]
 
     # 保存或获取分类
     category_id = None
@@ -1023,21 +1151,30 @@ async def copy_post_to_my_collection(
         user_id=current_user.id,
         category_id=category_id,
         tags=original_collection.tags,  # 直接复制标签
+        title=original_collection.title,
+        url=original_collection.url,
+        url_hash=original_collection.url_hash,
+        summary=original_collection.summary,
     )
     db.add(new_collection)
     await db.commit()
     await db.refresh(new_collection)
 
     # 复制所有详情字段
-    for key, value in details_dict.items():
+    for detail in original_details:
         new_detail = CollectionDetail(
             collection_id=new_collection.id,
-            key=key,
-            value=value
+            key=detail.key,
+            value=detail.value
         )
         db.add(new_detail)
+    if content:
+        await save_content(db, new_collection.id, content)  # type: ignore
 
     await db.commit()
+    await enqueue_knowledge_base_sync(
+        db, new_collection.id, [category_id], current_user.id  # type: ignore
+    )
 
     return Response(
         code=200,
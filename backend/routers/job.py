@@ -0,0 +1,100 @@
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import desc, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.entity.response import Response
+from backend.model import Job, User
+from backend.db import get_db
+from backend.routers.auth import get_current_user
+from backend.utils.job_queue import job_to_dict
+from backend.utils.job_events import tail_events
+
+# Create router instance
+router = APIRouter(
+    prefix="/jobs",
+    tags=["jobs"],
+    responses={404: {"description": "Not found"}},
+)
+
+
+@router.get("/", response_model=Response)
+async def list_jobs(
+    type: Optional[str] = None,
+    job_status: Optional[str] = Query(None, alias="status"),
+    limit: int = 20,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    当前用户最近的后台任务，可按类型和状态（queued / running / succeeded / failed）过滤
+    """
+    limit = min(max(limit, 1), 100)
+    jobs_query = (
+        select(Job)
+        .where(Job.user_id == current_user.id)
+        .order_by(desc(Job.created_at))
+        .limit(limit)
+    )
+    if type:
+        jobs_query = jobs_query.where(Job.type == type)
+    if job_status:
+        jobs_query = jobs_query.where(Job.status == job_status)
+    jobs_result = await db.execute(jobs_query)
+
+    return Response(
+        code=200,
+        message="Jobs fetched successfully",
+        data={"jobs": [job_to_dict(job) for job in jobs_result.scalars().all()]},
+    )
+
+
+@router.get("/{job_id}", response_model=Response)
+async def get_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    查询后台任务状态，客户端可以轮询直到 status 为 succeeded 或 failed
+    """
+    job_query = select(Job).where(Job.job_id == job_id, Job.user_id == current_user.id)
+    job_result = await db.execute(job_query)
+    job = job_result.scalar_one_or_none()
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+
+    return Response(code=200, message="Job fetched successfully", data={"job": job_to_dict(job)})
+
+
+@router.get("/{job_id}/events")
+async def stream_job_events(
+    job_id: str,
+    last_event_id: Optional[int] = None,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    以 SSE 读取任务事件，任务结束后关闭连接
+
+    - Last-Event-ID 请求头（或 last_event_id 参数）：从该事件之后继续，断线重连时使用
+    - 多个客户端可以同时读取同一个任务
+    """
+    job_query = select(Job.id).where(Job.job_id == job_id, Job.user_id == current_user.id)
+    job_pk = (await db.execute(job_query)).scalar_one_or_none()
+    if job_pk is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+
+    after_id = last_event_id or 0
+    if last_event_id_header:
+        try:
+            after_id = int(last_event_id_header)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid Last-Event-ID"
+            )
+
+    return StreamingResponse(tail_events(job_pk, after_id), media_type="text/event-stream")
@@ -0,0 +1,85 @@
+import argparse
+import asyncio
+
+from loguru import logger
+from sqlalchemy import text
+
+from backend.db import engine, create_tables
+from backend.utils.migrations import MIGRATIONS, applied_versions
+
+# 路由中的热点查询，check 命令用 EXPLAIN QUERY PLAN 确认它们都能走索引
+HOT_QUERIES = {
+    "collection details by key": (
+        "SELECT * FROM collection_details WHERE collection_id = 1 AND key = 'x'"
+    ),
+    "user collections (newest first)": (
+        "SELECT * FROM collections WHERE user_id = 1 ORDER BY created_at DESC"
+    ),
+    "user collections (keyset)": (
+        "SELECT * FROM collections WHERE user_id = 1 AND (created_at < '2100-01-01' "
+        "OR (created_at = '2100-01-01' AND id < 10)) "
+        "ORDER BY created_at DESC, id DESC LIMIT 51"
+    ),
+    "collections by category": "SELECT * FROM collections WHERE category_id = 1",
+    "url duplicate check": "SELECT id FROM collections WHERE user_id = 1 AND url_hash = 'x'",
+    "user category by name": "SELECT * FROM categories WHERE user_id = 1 AND name = 'x'",
+    "liked-by-me lookup": (
+        "SELECT asset_id FROM likes WHERE user_id = 1 AND asset_type = 'post' "
+        "AND asset_id IN (1, 2, 3)"
+    ),
+    "latest posts": "SELECT * FROM posts ORDER BY created_at DESC LIMIT 20",
+    "my posts": "SELECT * FROM posts WHERE user_id = 1 ORDER BY created_at DESC LIMIT 20",
+    "post comments (keyset)": (
+        "SELECT * FROM comments WHERE post_id = 1 AND (created_at < '2100-01-01' "
+        "OR (created_at = '2100-01-01' AND id < 10)) "
+        "ORDER BY created_at DESC, id DESC LIMIT 20"
+    ),
+}
+
+
+async def upgrade():
+    await create_tables()
+    logger.info("Database is up to date.")
+
+
+async def show_status():
+    async with engine.begin() as conn:
+        applied = await conn.run_sync(applied_versions)
+    for m in sorted(MIGRATIONS, key=lambda m: m.version):
+        state = "applied" if m.version in applied else "pending"
+        logger.info(f"{m.version:04d}_{m.name}: {state}")
+
+
+async def check():
+    """
+    对热点查询执行 EXPLAIN QUERY PLAN，出现全表扫描或临时排序时返回失败
+    """
+    failed = []
+    async with engine.connect() as conn:
+        for name, sql in HOT_QUERIES.items():
+            plan = [row[-1] for row in (await conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")))]
+            problems = [
+                step
+                for step in plan
+                if (step.startswith("SCAN") and "INDEX" not in step) or "TEMP B-TREE" in step
+            ]
+            if problems:
+                failed.append(name)
+                logger.error(f"{name}: {'; '.join(plan)}")
+            else:
+                logger.info(f"{name}: {'; '.join(plan)}")
+    if failed:
+        raise SystemExit(f"{len(failed)} hot queries do not use an index: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="数据库结构迁移")
+    parser.add_argument(
+        "command",
+        nargs="?",
+        default="upgrade",
+        choices=["upgrade", "status", "check"],
+        help="upgrade: 执行未执行的迁移；status: 查看迁移状态；check: 检查热点查询的执行计划",
+    )
+    args = parser.parse_args()
+    asyncio.run({"upgrade": upgrade, "status": show_status, "check": check}[args.command]())
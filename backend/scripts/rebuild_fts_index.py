@@ -0,0 +1,20 @@
+import asyncio
+
+from loguru import logger
+
+from backend.db import engine, create_tables
+from backend.utils.fulltext_index import rebuild_fulltext_index
+
+
+async def rebuild_fts_index():
+    """
+    重建 collection 全文索引（用于已有数据库或索引损坏时）
+    """
+    await create_tables()
+    async with engine.begin() as conn:
+        indexed_count = await conn.run_sync(rebuild_fulltext_index)
+    logger.info(f"Full-text index rebuilt, {indexed_count} collections indexed.")
+
+
+if __name__ == "__main__":
+    asyncio.run(rebuild_fts_index())
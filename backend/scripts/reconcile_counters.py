@@ -0,0 +1,20 @@
+import asyncio
+
+from loguru import logger
+
+from backend.db import engine
+from backend.utils.counters import reconcile_counters
+
+
+async def main():
+    """
+    根据 likes / comments 表重新计算推文和评论上的冗余计数
+    可以定期运行，用于修正异常中断等原因导致的计数漂移
+    """
+    async with engine.begin() as conn:
+        await conn.run_sync(reconcile_counters)
+    logger.info("Post and comment counters reconciled.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
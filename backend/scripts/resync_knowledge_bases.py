@@ -0,0 +1,46 @@
+import argparse
+import asyncio
+
+from loguru import logger
+from sqlalchemy import select
+
+from backend.db import AsyncSessionLocal, create_tables
+from backend.model import Category
+from backend.knowledge_base.jobs import KB_BUILD_JOB
+from backend.utils.job_queue import job_queue
+
+
+async def resync_knowledge_bases(recreate: bool = False):
+    """
+    为所有已有知识库的分类排队一次完整同步：按确定性的分块 id 重新写入，
+    删除旧版本用随机 id 写入的重复分块和已删除 collection 的分块。
+    recreate 时删除集合后全部重新嵌入，用于更换嵌入模型。
+    任务由运行中的后端服务执行。
+    """
+    await create_tables()
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(Category.id, Category.user_id).where(Category.knowledge_base_id.is_not(None))
+        )
+        categories = result.all()
+        for category_id, user_id in categories:
+            await job_queue.enqueue(
+                db,
+                KB_BUILD_JOB,
+                {"category_id": category_id, "user_id": user_id, "recreate": recreate},
+                user_id=user_id,
+                idempotency_key=f"{KB_BUILD_JOB}:{category_id}",
+                reuse_finished=False,
+            )
+    logger.info(f"Queued knowledge base resync for {len(categories)} categories.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="重新同步所有知识库")
+    parser.add_argument(
+        "--recreate",
+        action="store_true",
+        help="删除知识库集合后用当前的嵌入模型重新嵌入（更换嵌入模型后使用）",
+    )
+    args = parser.parse_args()
+    asyncio.run(resync_knowledge_bases(recreate=args.recreate))
@@ -18,6 +18,11 @@ async def select_collection_detail(collection_id: int):
 
 async def main():
     collection_id = 22  # 替换为你想查询的 collection_id
+    async with AsyncSessionLocal() as session:
+        collection = await session.get(Collection, collection_id)
+    if collection:
+        # url / title / summary 存放在 collections 表上
+        logger.info(f"URL: {collection.url}, Title: {collection.title}, Summary: {collection.summary}")
     details = await select_collection_detail(collection_id)
     for detail in details:
         logger.info(
@@ -0,0 +1,133 @@
+"""
+测试使用临时的 SQLite 数据库，需要在导入 backend 之前设置环境变量
+"""
+
+import asyncio
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+_tmp_dir = tempfile.mkdtemp(prefix="memora-test-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_tmp_dir}/test.db"
+os.environ.setdefault("CACHE_BACKEND", "memory")
+
+import pytest  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from backend.db import AsyncSessionLocal, create_tables, engine  # noqa: E402
+from backend.model import (  # noqa: E402
+    AssetType,
+    Category,
+    Collection,
+    Comment,
+    Like,
+    Post,
+    User,
+)
+from backend.utils.collection_fields import set_promoted_field  # noqa: E402
+from backend.utils.content_store import save_content  # noqa: E402
+
+POSTS_PER_USER = 25
+
+
+def run(coro):
+    """在新的事件循环中执行协程；aiosqlite 连接绑定事件循环，结束后释放连接池"""
+
+    async def wrapper():
+        try:
+            return await coro
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(wrapper())
+
+
+class StatementRecorder:
+    """通过 before_cursor_execute 记录执行的 SQL 语句和参数"""
+
+    def __init__(self) -> None:
+        self.statements: list[tuple[str, object]] = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append((statement, parameters))
+
+    def __enter__(self) -> "StatementRecorder":
+        event.listen(engine.sync_engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        event.remove(engine.sync_engine, "before_cursor_execute", self._record)
+
+    def clear(self) -> None:
+        self.statements.clear()
+
+
+async def _seed() -> dict:
+    """迁移后的数据库，写入两个用户的分类、收藏、推文、评论和点赞"""
+    await create_tables()
+    base = datetime.now(timezone.utc) - timedelta(days=1)
+    async with AsyncSessionLocal() as db:
+        users = [
+            User(username=f"user{i}", email=f"user{i}@example.com", password_hash="x")
+            for i in range(2)
+        ]
+        db.add_all(users)
+        await db.flush()
+
+        posts = []
+        for user in users:
+            category = Category(user_id=user.id, name=f"Category of {user.username}")
+            db.add(category)
+            await db.flush()
+            for i in range(POSTS_PER_USER):
+                collection = Collection(
+                    user_id=user.id,
+                    category_id=category.id,
+                    tags="a,b",
+                    created_at=base + timedelta(minutes=i),
+                )
+                set_promoted_field(collection, "title", f"{user.username} collection {i}")
+                set_promoted_field(collection, "url", f"https://example.com/{user.id}/{i}")
+                set_promoted_field(collection, "summary", "summary")
+                db.add(collection)
+                await db.flush()
+                await save_content(db, collection.id, "content " * 20)  # type: ignore
+                posts.append(
+                    Post(
+                        user_id=user.id,
+                        refer_collection_id=collection.id,
+                        description=f"post {i}",
+                        created_at=base + timedelta(minutes=i),
+                    )
+                )
+        db.add_all(posts)
+        await db.flush()
+
+        for i, post in enumerate(posts):
+            for j, user in enumerate(users):
+                db.add(
+                    Comment(
+                        post_id=post.id,
+                        user_id=user.id,
+                        content=f"comment {j}",
+                        created_at=base + timedelta(minutes=i, seconds=j),
+                    )
+                )
+            if i % 2 == 0:
+                db.add(Like(user_id=users[0].id, asset_id=post.id, asset_type=AssetType.post))
+        await db.commit()
+        return {
+            "user_ids": [user.id for user in users],
+            "category_id": category.id,
+            "post_ids": [post.post_id for post in posts],
+        }
+
+
+@pytest.fixture(scope="session")
+def seeded() -> dict:
+    return run(_seed())
+
+
+async def load_user(user_id: int) -> User:
+    async with AsyncSessionLocal() as db:
+        return await db.get(User, user_id)  # type: ignore
@@ -0,0 +1,28 @@
+"""
+社区推文列表的查询次数不随每页推文数量增长（没有 N+1 查询）
+"""
+
+import pytest
+
+from backend.db import AsyncSessionLocal
+from backend.routers.community import get_latest_posts, get_my_posts
+from backend.tests.conftest import StatementRecorder, load_user, run
+
+
+async def _count_statements(endpoint, user_id: int, limit: int) -> tuple[int, int]:
+    """执行一次列表接口，返回 (执行的语句数, 返回的推文数)"""
+    user = await load_user(user_id)
+    async with AsyncSessionLocal() as db:
+        with StatementRecorder() as recorder:
+            response = await endpoint(page=1, limit=limit, current_user=user, db=db)
+    return len(recorder.statements), len(response.data["posts"])
+
+
+@pytest.mark.parametrize("endpoint", [get_latest_posts, get_my_posts])
+def test_post_page_statement_count_is_constant(seeded, endpoint):
+    user_id = seeded["user_ids"][0]
+    single, single_posts = run(_count_statements(endpoint, user_id, 1))
+    page, page_posts = run(_count_statements(endpoint, user_id, 20))
+
+    assert (single_posts, page_posts) == (1, 20)
+    assert page == single, f"{page} statements for 20 posts, {single} for 1 post"
@@ -0,0 +1,92 @@
+"""
+路由中热点查询的执行计划：在迁移后的数据库上执行真实的接口，记录它们发出的 SELECT，
+用 EXPLAIN QUERY PLAN 确认每张表都通过索引读取，没有全表扫描或临时排序
+"""
+
+import pytest
+
+from backend.db import AsyncSessionLocal
+from backend.routers import collection, community
+from backend.tests.conftest import StatementRecorder, load_user, run
+
+
+async def _collections_pages(seeded, user, db):
+    first = await collection.get_current_user_collections(limit=10, current_user=user, db=db)
+    await collection.get_current_user_collections(
+        limit=10, cursor=first.data["next_cursor"], current_user=user, db=db
+    )
+
+
+async def _collections_by_category(seeded, user, db):
+    await collection.get_collections_by_category(
+        category_id=seeded["category_id"], limit=10, current_user=user, db=db
+    )
+
+
+async def _url_duplicate_check(seeded, user, db):
+    deltas = collection.streaming_create_collection_url(
+        collection.CollectionUrlCreate(url=f"https://example.com/{user.id}/3"), user, db
+    )
+    assert [delta.type async for delta in deltas] == ["collection_exists"]
+
+
+async def _latest_posts(seeded, user, db):
+    await community.get_latest_posts(page=1, limit=20, current_user=user, db=db)
+
+
+async def _my_posts(seeded, user, db):
+    await community.get_my_posts(page=1, limit=20, current_user=user, db=db)
+
+
+async def _post_comments_pages(seeded, user, db):
+    post_id = seeded["post_ids"][0]
+    first = await community.get_post_comments(post_id=post_id, limit=1, current_user=user, db=db)
+    await community.get_post_comments(
+        post_id=post_id, limit=1, cursor=first.data["next_cursor"], current_user=user, db=db
+    )
+
+
+HOT_PATHS = {
+    "collections (keyset pages)": _collections_pages,
+    "collections by category": _collections_by_category,
+    "url duplicate check": _url_duplicate_check,
+    "latest posts": _latest_posts,
+    "my posts": _my_posts,
+    "post comments (keyset pages)": _post_comments_pages,
+}
+
+
+def _unindexed_steps(plan: list[str]) -> list[str]:
+    return [
+        step
+        for step in plan
+        if (
+            (step.startswith(("SCAN", "SEARCH")) and "USING" not in step)
+            or "TEMP B-TREE" in step
+        )
+    ]
+
+
+async def _query_plans(scenario, seeded) -> list[tuple[str, list[str]]]:
+    user = await load_user(seeded["user_ids"][0])
+    async with AsyncSessionLocal() as db:
+        with StatementRecorder() as recorder:
+            await scenario(seeded, user, db)
+        conn = await db.connection()
+        plans = []
+        for statement, parameters in recorder.statements:
+            if not statement.lstrip().upper().startswith("SELECT"):
+                continue
+            rows = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            plans.append((statement, [row[-1] for row in rows]))
+    return plans
+
+
+@pytest.mark.parametrize("name", list(HOT_PATHS))
+def test_hot_path_queries_use_indexes(seeded, name):
+    plans = run(_query_plans(HOT_PATHS[name], seeded))
+
+    assert plans, f"{name} did not run any SELECT"
+    for statement, plan in plans:
+        assert any("USING" in step for step in plan), f"{statement}\n{plan}"
+        assert not _unindexed_steps(plan), f"{statement}\n{plan}"
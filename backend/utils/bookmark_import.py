@@ -0,0 +1,170 @@
+"""
+书签导入文件解析：支持浏览器导出的 Netscape bookmark HTML、JSON 和纯文本 URL 列表。
+"""
+
+import json
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+from backend.utils.collection_fields import url_hash
+
+
+class BookmarkParseError(ValueError):
+    pass
+
+
+@dataclass
+class ImportedBookmark:
+    url: str
+    title: str | None = None
+    folder: str | None = None
+
+
+class _NetscapeBookmarkParser(HTMLParser):
+    """解析 <DT><H3>folder</H3><DL>...<DT><A HREF="...">title</A> 结构"""
+
+    def __init__(self):
+        super().__init__()
+        self.bookmarks: list[ImportedBookmark] = []
+        self._folders: list[str] = []
+        self._pending_folder: str | None = None
+        self._in_folder_title = False
+        self._current: ImportedBookmark | None = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "h3":
+            self._in_folder_title = True
+            self._pending_folder = ""
+        elif tag == "dl":
+            # 紧跟在 H3 后的 DL 是该文件夹的内容
+            self._folders.append(self._pending_folder or "")
+            self._pending_folder = None
+        elif tag == "a":
+            href = dict(attrs).get("href")
+            if href:
+                folder = "/".join(f for f in self._folders if f) or None
+                self._current = ImportedBookmark(url=href.strip(), title="", folder=folder)
+
+    def handle_endtag(self, tag):
+        if tag == "h3":
+            self._in_folder_title = False
+        elif tag == "dl" and self._folders:
+            self._folders.pop()
+        elif tag == "a" and self._current is not None:
+            self._current.title = self._current.title.strip() or None  # type: ignore
+            self.bookmarks.append(self._current)
+            self._current = None
+
+    def handle_data(self, data):
+        if self._in_folder_title:
+            self._pending_folder = (self._pending_folder or "") + data.strip()
+        elif self._current is not None:
+            self._current.title = (self._current.title or "") + data
+
+
+def _parse_html(text: str) -> list[ImportedBookmark]:
+    parser = _NetscapeBookmarkParser()
+    parser.feed(text)
+    parser.close()
+    return parser.bookmarks
+
+
+def _walk_json(node, folder: str | None, out: list[ImportedBookmark]) -> None:
+    if isinstance(node, str):
+        out.append(ImportedBookmark(url=node.strip(), folder=folder))
+    elif isinstance(node, list):
+        for item in node:
+            _walk_json(item, folder, out)
+    elif isinstance(node, dict):
+        if node.get("type") == "folder" or "children" in node:
+            # Chrome / Firefox 的书签 JSON 是嵌套的文件夹结构
+            name = node.get("name") or node.get("title") or ""
+            child_folder = "/".join(f for f in (folder, name) if f) or None
+            _walk_json(node.get("children", []), child_folder, out)
+        elif "roots" in node:
+            _walk_json(list(node["roots"].values()), folder, out)
+        elif node.get("url") or node.get("uri"):
+            out.append(
+                ImportedBookmark(
+                    url=str(node.get("url") or node.get("uri")).strip(),
+                    title=node.get("title") or node.get("name"),
+                    folder=node.get("folder") or folder,
+                )
+            )
+
+
+def _parse_json(text: str) -> list[ImportedBookmark]:
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise BookmarkParseError(f"Invalid JSON: {e}") from e
+    bookmarks: list[ImportedBookmark] = []
+    _walk_json(data, None, bookmarks)
+    return bookmarks
+
+
+def _parse_text(text: str) -> list[ImportedBookmark]:
+    return [
+        ImportedBookmark(url=line.strip())
+        for line in text.splitlines()
+        if line.strip() and not line.strip().startswith("#")
+    ]
+
+
+def detect_format(text: str, filename: str | None = None) -> str:
+    name = (filename or "").lower()
+    if name.endswith((".html", ".htm")):
+        return "html"
+    if name.endswith(".json"):
+        return "json"
+    stripped = text.lstrip()
+    if stripped.startswith(("[", "{")):
+        return "json"
+    if stripped[:200].upper().startswith("<!DOCTYPE NETSCAPE-BOOKMARK") or "<a " in stripped[:4096].lower():
+        return "html"
+    return "text"
+
+
+def _is_http_url(url: str) -> bool:
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return False
+    return parts.scheme in ("http", "https") and bool(parts.netloc)
+
+
+def parse_bookmarks(
+    data: bytes, filename: str | None = None, format: str | None = None
+) -> tuple[list[ImportedBookmark], int]:
+    """
+    解析书签文件，过滤非 http(s) 链接并按规范化 URL 去重
+
+    Args:
+        format: html / json / text，None 时根据文件名和内容推断
+
+    Returns:
+        (bookmarks, invalid_count)
+
+    Raises:
+        BookmarkParseError: 文件无法解析
+    """
+    text = data.decode("utf-8", errors="replace")
+    format = format or detect_format(text, filename)
+    parsers = {"html": _parse_html, "json": _parse_json, "text": _parse_text}
+    if format not in parsers:
+        raise BookmarkParseError(f"Unsupported bookmark format: {format}")
+
+    bookmarks: list[ImportedBookmark] = []
+    seen: set[str] = set()
+    invalid = 0
+    for bookmark in parsers[format](text):
+        if not _is_http_url(bookmark.url):
+            invalid += 1
+            continue
+        key = url_hash(bookmark.url)
+        if key in seen:
+            continue
+        seen.add(key)
+        bookmarks.append(bookmark)
+    return bookmarks, invalid
@@ -0,0 +1,261 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from loguru import logger
+
+
+class Cache:
+    """
+    异步缓存接口，支持 TTL 过期、容量上限（LRU 淘汰）和 single-flight：
+    同一个 key 同时只会有一个 factory 在计算，其余请求等待其结果。
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    async def get(self, key: str) -> Any | None: ...
+
+    async def set(self, key: str, value: Any, ttl: float | None = None) -> None: ...
+
+    async def delete(self, key: str) -> None: ...
+
+    async def _acquire_lease(self, key: str, timeout: float, owner: str) -> bool:
+        """跨进程的计算租约，默认（进程内缓存）总是成功"""
+        return True
+
+    async def _release_lease(self, key: str, owner: str) -> None:
+        """释放 owner 持有的租约，租约已过期并被其他进程取得时不受影响"""
+        return None
+
+    async def get_or_compute(
+        self,
+        key: str,
+        factory: Callable[[], Awaitable[Any]],
+        ttl: float | None = None,
+        lease_timeout: float = 60,
+    ) -> tuple[Any, bool]:
+        """
+        读取缓存，未命中时调用 factory 计算并写入缓存。
+        factory 返回 None 时不写入缓存。
+
+        Returns:
+            (value, from_cache)
+        """
+        value = await self.get(key)
+        if value is not None:
+            return value, True
+
+        # 进程内 single-flight：计算在独立的 task 中进行，任何一个调用方被取消都不会影响
+        # 其他等待者，计算完成后结果照常写入缓存
+        task = self._inflight.get(key)
+        if task is not None:
+            value, _ = await asyncio.shield(task)
+            return value, True
+
+        task = asyncio.create_task(self._compute_with_lease(key, factory, ttl, lease_timeout))
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._compute_done(key, t))
+        return await asyncio.shield(task)
+
+    def _compute_done(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 所有调用方都已取消时没有人读取异常，避免 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    async def _compute_with_lease(
+        self,
+        key: str,
+        factory: Callable[[], Awaitable[Any]],
+        ttl: float | None,
+        lease_timeout: float,
+    ) -> tuple[Any, bool]:
+        deadline = time.monotonic() + lease_timeout
+        owner = uuid.uuid4().hex
+        # 其他进程正在计算时，等待其写入结果；等待超时后不持有租约，自己计算
+        while not (acquired := await self._acquire_lease(key, lease_timeout, owner)):
+            if time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(0.2)
+            value = await self.get(key)
+            if value is not None:
+                return value, True
+
+        try:
+            value = await factory()
+            if value is not None:
+                await self.set(key, value, ttl)
+            return value, False
+        finally:
+            if acquired:
+                await self._release_lease(key, owner)
+
+
+class MemoryCache(Cache):
+    """进程内 LRU + TTL 缓存"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300) -> None:
+        super().__init__(maxsize, ttl)
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    async def get(self, key: str) -> Any | None:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at <= time.time():
+            self._data.pop(key, None)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float | None = None) -> None:
+        self._data[key] = (time.time() + (ttl or self.ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    async def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+
+class SQLiteCache(Cache):
+    """
+    基于 SQLite 文件的共享缓存，多个 uvicorn worker 进程共用，重启后仍然有效。
+    值以 JSON 形式存储。
+    """
+
+    def __init__(self, path: str | Path, namespace: str, maxsize: int = 10000, ttl: float = 300):
+        super().__init__(maxsize, ttl)
+        self.path = str(path)
+        self.namespace = namespace
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_cache_entries_accessed "
+                "ON cache_entries (namespace, accessed_at)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_leases ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, expires_at REAL NOT NULL, "
+                "owner TEXT NOT NULL DEFAULT '', PRIMARY KEY (namespace, key))"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(cache_leases)")}
+            if "owner" not in columns:
+                # 旧版本创建的租约表
+                conn.execute("ALTER TABLE cache_leases ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+            self._initialized = True
+        return conn
+
+    def _get_sync(self, key: str) -> Any | None:
+        now = time.time()
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT value FROM cache_entries "
+                "WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (self.namespace, key, now),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key),
+            )
+        return json.loads(row[0])
+
+    def _set_sync(self, key: str, value: Any, ttl: float) -> None:
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries "
+                "(namespace, key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(value), now + ttl, now),
+            )
+            conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND expires_at <= ?",
+                (self.namespace, now),
+            )
+            # 超出容量时淘汰最久未访问的条目
+            conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND key IN ("
+                "SELECT key FROM cache_entries WHERE namespace = ? "
+                "ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.namespace, self.namespace, self.maxsize),
+            )
+
+    def _delete_sync(self, key: str) -> None:
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            )
+
+    def _acquire_lease_sync(self, key: str, timeout: float, owner: str) -> bool:
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "DELETE FROM cache_leases WHERE namespace = ? AND key = ? AND expires_at <= ?",
+                (self.namespace, key, now),
+            )
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO cache_leases (namespace, key, expires_at, owner) "
+                "VALUES (?, ?, ?, ?)",
+                (self.namespace, key, now + timeout, owner),
+            )
+            return cursor.rowcount == 1
+
+    def _release_lease_sync(self, key: str, owner: str) -> None:
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "DELETE FROM cache_leases WHERE namespace = ? AND key = ? AND owner = ?",
+                (self.namespace, key, owner),
+            )
+
+    async def get(self, key: str) -> Any | None:
+        return await asyncio.to_thread(self._get_sync, key)
+
+    async def set(self, key: str, value: Any, ttl: float | None = None) -> None:
+        await asyncio.to_thread(self._set_sync, key, value, ttl or self.ttl)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self._delete_sync, key)
+
+    async def _acquire_lease(self, key: str, timeout: float, owner: str) -> bool:
+        return await asyncio.to_thread(self._acquire_lease_sync, key, timeout, owner)
+
+    async def _release_lease(self, key: str, owner: str) -> None:
+        await asyncio.to_thread(self._release_lease_sync, key, owner)
+
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "sqlite")  # "sqlite" or "memory"
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", str(Path(__file__).parent.parent / "cache.db"))
+
+
+def create_cache(namespace: str, maxsize: int, ttl: float) -> Cache:
+    """根据 CACHE_BACKEND 环境变量创建缓存实例"""
+    if CACHE_BACKEND == "memory":
+        return MemoryCache(maxsize=maxsize, ttl=ttl)
+    if CACHE_BACKEND != "sqlite":
+        logger.warning(f"Unknown CACHE_BACKEND '{CACHE_BACKEND}', using sqlite")
+    return SQLiteCache(CACHE_DB_PATH, namespace=namespace, maxsize=maxsize, ttl=ttl)
@@ -0,0 +1,102 @@
+"""
+Collection 的固定字段（url / title / summary）存放在 collections 表的列上，
+正文 content 压缩存放在 collection_contents 表（见 content_store），
+collection_details 只保存其余的自由字段。
+这里负责把它们组装回原来的 key/value 格式，使接口返回的 details 保持一致。
+"""
+
+import hashlib
+from typing import Any, Iterable
+
+from backend.utils.page_cache import normalize_url
+
+# 按原先 URL 收藏写入 details 的顺序排列：url、content 在自由字段之前，title / summary 在之后
+PROMOTED_KEYS = ("url", "title", "summary")
+CONTENT_KEY = "content"
+_LEADING_KEYS = ("url",)
+_TRAILING_KEYS = ("title", "summary")
+
+
+def url_hash(url: str) -> str:
+    """规范化 URL 的哈希，用于按 URL 查重"""
+    return hashlib.sha256(normalize_url(url).encode()).hexdigest()
+
+
+def is_promoted(key: str) -> bool:
+    return key in PROMOTED_KEYS
+
+
+def parse_fields(fields: str | None) -> set[str] | None:
+    """解析 fields=title,url,summary 形式的字段投影参数，None 表示返回全部字段"""
+    if not fields:
+        return None
+    return {field.strip() for field in fields.split(",") if field.strip()}
+
+
+def set_promoted_field(collection, key: str, value: Any) -> None:
+    """设置固定字段，url 同时更新 url_hash"""
+    value = None if value is None else str(value)
+    setattr(collection, key, value)
+    if key == "url":
+        collection.url_hash = url_hash(value) if value else None
+
+
+def details_dict(collection, details: Iterable = (), content: str | None = None) -> dict:
+    """
+    组装接口中的 details 字典：固定字段来自 collection 的列，其余来自 CollectionDetail。
+    details 可以是 CollectionDetail 对象或 (key, value) 元组；content 为 None 时不返回正文。
+    """
+    result = {}
+    for key in _LEADING_KEYS:
+        if getattr(collection, key) is not None:
+            result[key] = getattr(collection, key)
+    if content is not None:
+        result[CONTENT_KEY] = content
+    for detail in details:
+        key, value = detail if isinstance(detail, tuple) else (detail.key, detail.value)
+        result[key] = value
+    for key in _TRAILING_KEYS:
+        if getattr(collection, key) is not None:
+            result[key] = getattr(collection, key)
+    return result
+
+
+def detail_rows(collection, details: Iterable, content: str | None = None) -> list[dict]:
+    """
+    /details 接口的列表格式。固定字段和正文没有独立的行，id 为 None，时间取 collection 的时间。
+    """
+    rows = [
+        {
+            "id": detail.id,
+            "key": detail.key,
+            "value": detail.value,
+            "created_at": detail.created_at.isoformat(),
+            "updated_at": detail.updated_at.isoformat(),
+        }
+        for detail in details
+    ]
+    promoted = [
+        {
+            "id": None,
+            "key": key,
+            "value": getattr(collection, key),
+            "created_at": collection.created_at.isoformat(),
+            "updated_at": collection.updated_at.isoformat(),
+        }
+        for key in PROMOTED_KEYS
+        if getattr(collection, key) is not None
+    ]
+    if content is not None:
+        promoted.insert(
+            len(_LEADING_KEYS),
+            {
+                "id": None,
+                "key": CONTENT_KEY,
+                "value": content,
+                "created_at": collection.created_at.isoformat(),
+                "updated_at": collection.updated_at.isoformat(),
+            },
+        )
+    leading = [row for row in promoted if row["key"] not in _TRAILING_KEYS]
+    trailing = [row for row in promoted if row["key"] in _TRAILING_KEYS]
+    return leading + rows + trailing
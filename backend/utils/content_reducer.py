@@ -0,0 +1,168 @@
+"""
+LLM 输入的正文精简：去掉导航、页脚、链接堆等样板内容，按 token 预算挑选信息量最高的段落。
+只影响发送给 LLM 的文本，保存的正文不变。
+"""
+
+import math
+import os
+import re
+from dataclasses import dataclass
+
+from loguru import logger
+
+try:
+    import tiktoken
+except ImportError:  # 可选依赖，未安装时按字符估算 token 数
+    tiktoken = None
+
+LLM_TOKENIZER_ENCODING = os.getenv("LLM_TOKENIZER_ENCODING", "o200k_base")
+
+_encoding = None
+_encoding_failed = False
+
+_IMAGE_RE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+_LINK_RE = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+_BLOCK_SPLIT_RE = re.compile(r"\n\s*\n")
+_HEADING_RE = re.compile(r"^#{1,6}\s")
+_TERM_RE = re.compile(r"[a-z0-9]+|[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]")
+_CJK_RE = re.compile(r"[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af\uff00-\uffef]")
+_BOILERPLATE_RE = re.compile(
+    r"(?i)\b(copyright|all rights reserved|privacy policy|terms of (use|service)|cookies?|"
+    r"skip to (main )?content|subscribe|newsletter|sign (in|up)|log ?in|share (on|this)|icp)\b|"
+    r"©|版权所有|隐私政策|用户协议|备案|登录|注册|关注我们|返回顶部|扫码|分享到"
+)
+# 短于这个长度的块才会按关键字判断为样板内容
+_BOILERPLATE_MAX_CHARS = 200
+_OMITTED = "[...]"
+
+
+def count_tokens(text: str) -> int:
+    """计算 token 数；没有安装 tiktoken 时按 CJK 字符 1 token、其他字符 4 个 1 token 估算"""
+    global _encoding, _encoding_failed
+    if tiktoken is not None and _encoding is None and not _encoding_failed:
+        try:
+            _encoding = tiktoken.get_encoding(LLM_TOKENIZER_ENCODING)
+        except Exception as e:  # 编码文件需要下载，离线环境可能失败
+            _encoding_failed = True
+            logger.warning(f"Failed to load tokenizer {LLM_TOKENIZER_ENCODING}, estimating: {e}")
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    tokens = count_tokens(text)
+    while tokens > max_tokens and text:
+        text = text[: max(int(len(text) * max_tokens / tokens * 0.95), 0)]
+        tokens = count_tokens(text)
+    return text
+
+
+def strip_boilerplate(markdown: str) -> str:
+    """
+    去掉图片、链接地址、导航和链接列表、版权/登录等短样板块以及重复出现的块
+    """
+    kept = []
+    seen: set[str] = set()
+    for block in _BLOCK_SPLIT_RE.split(markdown):
+        block = _IMAGE_RE.sub("", block)
+        link_chars = sum(len(m.group(1)) for m in _LINK_RE.finditer(block))
+        link_count = len(_LINK_RE.findall(block))
+        visible = _LINK_RE.sub(r"\1", block).strip()
+        if not visible:
+            continue
+        text_chars = len(re.sub(r"[\s*\-+|>#\d.]", "", visible)) or 1
+        if link_count >= 3 and link_chars / text_chars > 0.5:
+            # 导航栏、相关推荐等链接堆
+            continue
+        if len(visible) < _BOILERPLATE_MAX_CHARS and _BOILERPLATE_RE.search(visible):
+            continue
+        key = " ".join(visible.lower().split())
+        if key in seen and len(key) > 3:
+            continue
+        seen.add(key)
+        kept.append(visible)
+    return "\n\n".join(kept)
+
+
+@dataclass
+class _Unit:
+    index: int
+    text: str
+    tokens: int
+    heading: int | None  # 所属标题块的 index
+    score: float = 0.0
+
+
+def _split_units(text: str) -> list[_Unit]:
+    units: list[_Unit] = []
+    heading = None
+    for block in _BLOCK_SPLIT_RE.split(text):
+        block = block.strip()
+        if not block:
+            continue
+        index = len(units)
+        is_heading = bool(_HEADING_RE.match(block)) and "\n" not in block
+        units.append(_Unit(index, block, count_tokens(block), None if is_heading else heading))
+        if is_heading:
+            heading = index
+    return units
+
+
+def select_sections(text: str, budget: int) -> str:
+    """
+    在 token 预算内挑选信息量最高的段落，按原顺序拼接，省略的部分用 [...] 标出。
+    开头的段落（通常是标题和导语）总是保留。
+    """
+    if count_tokens(text) <= budget:
+        return text
+    units = _split_units(text)
+    if not units:
+        return ""
+
+    total = len(units)
+    for unit in units:
+        terms = set(_TERM_RE.findall(unit.text.lower()))
+        # 不重复的词越多信息量越大；越靠前越重要
+        position = 1.0 / (1.0 + unit.index / total)
+        unit.score = len(terms) * position / math.sqrt(unit.tokens + 1)
+
+    first = units[0]
+    selected: dict[int, str] = {0: truncate_to_tokens(first.text, budget)}
+    used = min(first.tokens, budget)
+    for unit in sorted(units[1:], key=lambda u: u.score, reverse=True):
+        cost = unit.tokens
+        needs_heading = unit.heading is not None and unit.heading not in selected
+        if needs_heading:
+            cost += units[unit.heading].tokens  # type: ignore
+        if cost > budget - used:
+            continue
+        if needs_heading:
+            selected[unit.heading] = units[unit.heading].text  # type: ignore
+        selected[unit.index] = unit.text
+        used += cost
+
+    # 剩余预算较多时（例如正文是一个很长的段落），截取得分最高的未选段落补上
+    remaining = budget - used
+    if remaining >= budget // 4:
+        rest = [u for u in units if u.index not in selected]
+        if rest:
+            best = max(rest, key=lambda u: u.score)
+            selected[best.index] = truncate_to_tokens(best.text, remaining)
+
+    parts = []
+    last = -1
+    for index in sorted(selected):
+        if index != last + 1:
+            parts.append(_OMITTED)
+        parts.append(selected[index])
+        last = index
+    if last != total - 1:
+        parts.append(_OMITTED)
+    return "\n\n".join(parts)
+
+
+def reduce_content(content: str, budget: int) -> str:
+    """去掉样板内容后按预算挑选段落"""
+    return select_sections(strip_boilerplate(content) or content, budget)
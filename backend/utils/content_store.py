@@ -0,0 +1,83 @@
+"""
+Collection 正文（MarkItDown 输出）单独压缩存放在 collection_contents 表中，
+列表接口不再加载正文，只有详情页、知识库构建和全文索引按需读取。
+"""
+
+import zlib
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖，未安装时使用 zlib
+    zstandard = None
+
+DEFAULT_CODEC = "zstd" if zstandard is not None else "zlib"
+
+
+def compress(content: str, codec: str = DEFAULT_CODEC) -> bytes:
+    data = content.encode("utf-8")
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is not installed")
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    if codec == "zlib":
+        return zlib.compress(data, 6)
+    raise ValueError(f"Unknown content codec: {codec}")
+
+
+def decompress(codec: str, data: bytes) -> str:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is not installed, cannot read zstd content")
+        raw = zstandard.ZstdDecompressor().decompress(data)
+    elif codec == "zlib":
+        raw = zlib.decompress(data)
+    else:
+        raise ValueError(f"Unknown content codec: {codec}")
+    return raw.decode("utf-8")
+
+
+async def load_contents(db: AsyncSession, collection_ids: list[int]) -> dict[int, str]:
+    """批量读取并解压正文，返回 {collection_id: content}"""
+    from backend.model import CollectionContent  # avoid circular imports
+
+    if not collection_ids:
+        return {}
+    result = await db.execute(
+        select(
+            CollectionContent.collection_id, CollectionContent.codec, CollectionContent.data
+        ).where(CollectionContent.collection_id.in_(collection_ids))
+    )
+    return {
+        collection_id: decompress(codec, data) for collection_id, codec, data in result.all()
+    }
+
+
+async def load_content(db: AsyncSession, collection_id: int) -> str | None:
+    return (await load_contents(db, [collection_id])).get(collection_id)
+
+
+async def save_content(db: AsyncSession, collection_id: int, content: str) -> None:
+    """写入或替换正文（不提交事务）"""
+    from backend.model import CollectionContent  # avoid circular imports
+
+    row = await db.get(CollectionContent, collection_id)
+    if row is None:
+        row = CollectionContent(collection_id=collection_id)
+        db.add(row)
+    row.codec = DEFAULT_CODEC  # type: ignore
+    row.data = compress(content)  # type: ignore
+    row.size = len(content.encode("utf-8"))  # type: ignore
+
+
+async def delete_content(db: AsyncSession, collection_id: int) -> bool:
+    """删除正文（不提交事务），返回是否存在"""
+    from backend.model import CollectionContent  # avoid circular imports
+
+    row = await db.get(CollectionContent, collection_id)
+    if row is None:
+        return False
+    await db.delete(row)
+    return True
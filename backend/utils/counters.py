@@ -0,0 +1,29 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+# 根据源表重新计算冗余计数（likes / comments），修正计数漂移
+_RECONCILE_STATEMENTS = (
+    """
+    UPDATE posts SET
+        likes_count = (
+            SELECT count(*) FROM likes
+            WHERE likes.asset_type = 'post' AND likes.asset_id = posts.id
+        ),
+        comments_count = (
+            SELECT count(*) FROM comments WHERE comments.post_id = posts.id
+        )
+    """,
+    """
+    UPDATE comments SET
+        likes_count = (
+            SELECT count(*) FROM likes
+            WHERE likes.asset_type = 'comment' AND likes.asset_id = comments.id
+        )
+    """,
+)
+
+
+def reconcile_counters(conn: Connection) -> None:
+    """用 likes / comments 表重新计算 posts 和 comments 上的计数字段"""
+    for statement in _RECONCILE_STATEMENTS:
+        conn.execute(text(statement))
@@ -0,0 +1,319 @@
+"""
+SQLite FTS5 full-text index for collections.
+
+每个 collection 在 `collection_fts` 中对应一行（rowid == collections.id），
+索引 title / summary / content / url 四个字段。索引通过 Session 的 after_flush
+事件与 Collection / CollectionContent 的增删改保持同步，旧数据库可以通过
+`backend/scripts/rebuild_fts_index.py` 重建。
+"""
+
+import html
+import re
+from dataclasses import dataclass
+
+from loguru import logger
+from sqlalchemy import bindparam, event, inspect, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from backend.utils.content_store import decompress
+
+FTS_TABLE = "collection_fts"
+INDEXED_KEYS = ("title", "summary", "content", "url")
+# bm25 column weights, same order as INDEXED_KEYS
+BM25_WEIGHTS = (10.0, 5.0, 1.0, 2.0)
+# trigram tokenizer 只能匹配长度 >= 3 的词，更短的词走 LIKE 回退
+TRIGRAM_MIN_TERM_LENGTH = 3
+# trigram 分词下每个 token 只有一个字符左右，snippet 需要更多 token
+SNIPPET_TOKENS = {"trigram": 64, "unicode61": 16}
+
+# None: unknown yet, checked lazily on the first flush
+_fts_available: bool | None = None
+_fts_tokenizer: str | None = None
+
+
+@dataclass
+class FulltextHit:
+    collection_id: int
+    score: float
+    snippet: str
+
+
+# title / summary / url 来自 collections 表的列，content 来自压缩的 collection_contents
+_COLUMN_KEYS = ("title", "summary", "url")
+_SOURCE_SQL = (
+    "SELECT c.id, c.title, c.summary, c.url, cc.codec, cc.data FROM collections c "
+    "LEFT JOIN collection_contents cc ON cc.collection_id = c.id"
+)
+_INSERT_SQL = (
+    f"INSERT INTO {FTS_TABLE}(rowid, {', '.join(INDEXED_KEYS)}) "
+    f"VALUES (:rowid, {', '.join(':' + key for key in INDEXED_KEYS)})"
+)
+_BATCH_SIZE = 200
+
+
+def _populate(conn: Connection, ids: list[int] | None = None) -> None:
+    """从源表读取（并解压正文）后写入索引；ids 为 None 时写入全部 collection"""
+    if ids is None:
+        result = conn.execute(text(_SOURCE_SQL))
+    else:
+        result = conn.execute(
+            text(_SOURCE_SQL + " WHERE c.id IN :ids").bindparams(
+                bindparam("ids", expanding=True)
+            ),
+            {"ids": ids},
+        )
+    # 先取出全部源数据再写入，避免同一连接上读写交错；正文按批解压
+    rows = result.all()
+    for start in range(0, len(rows), _BATCH_SIZE):
+        conn.execute(
+            text(_INSERT_SQL),
+            [
+                {
+                    "rowid": collection_id,
+                    "title": title or "",
+                    "summary": summary or "",
+                    "content": decompress(codec, data) if data is not None else "",
+                    "url": url or "",
+                }
+                for collection_id, title, summary, url, codec, data in rows[
+                    start : start + _BATCH_SIZE
+                ]
+            ],
+        )
+
+
+def _is_sqlite(conn: Connection) -> bool:
+    return conn.dialect.name == "sqlite"
+
+
+def create_fulltext_index(conn: Connection) -> bool:
+    """创建 FTS5 虚表（如果不存在）。返回索引是否可用。"""
+    global _fts_available, _fts_tokenizer
+    if not _is_sqlite(conn):
+        _fts_available = False
+        return False
+
+    exists = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": FTS_TABLE},
+    ).first()
+    if not exists:
+        columns = ", ".join(INDEXED_KEYS)
+        # trigram 支持中文等无空格语言的子串匹配，旧版本 SQLite 回退到 unicode61
+        for tokenizer in ("trigram", "unicode61 remove_diacritics 2"):
+            try:
+                conn.execute(
+                    text(
+                        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                        f"{columns}, tokenize = '{tokenizer}')"
+                    )
+                )
+                break
+            except Exception as e:
+                logger.warning(f"FTS5 tokenizer '{tokenizer}' unavailable: {e}")
+        else:
+            _fts_available = False
+            return False
+        _populate(conn)
+        logger.info(f"Created full-text index table '{FTS_TABLE}'")
+
+    _fts_available = True
+    _fts_tokenizer = _read_tokenizer(conn)
+    return True
+
+
+def _read_tokenizer(conn: Connection) -> str:
+    row = conn.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": FTS_TABLE},
+    ).first()
+    return "trigram" if row and "trigram" in (row[0] or "") else "unicode61"
+
+
+def _check_available(conn: Connection) -> bool:
+    global _fts_available, _fts_tokenizer
+    if _fts_available is None:
+        if not _is_sqlite(conn):
+            _fts_available = False
+        else:
+            _fts_available = (
+                conn.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                    {"name": FTS_TABLE},
+                ).first()
+                is not None
+            )
+            if _fts_available:
+                _fts_tokenizer = _read_tokenizer(conn)
+    return _fts_available
+
+
+def sync_collections(conn: Connection, collection_ids: set[int] | list[int]) -> None:
+    """重新写入指定 collection 的索引行；已删除的 collection 只会被移除。"""
+    ids = list(collection_ids)
+    if not ids or not _check_available(conn):
+        return
+    conn.execute(
+        text(f"DELETE FROM {FTS_TABLE} WHERE rowid IN :ids").bindparams(
+            bindparam("ids", expanding=True)
+        ),
+        {"ids": ids},
+    )
+    _populate(conn, ids)
+
+
+def rebuild_fulltext_index(conn: Connection) -> int:
+    """清空并重建整个索引，返回索引的 collection 数量。"""
+    if not create_fulltext_index(conn):
+        raise RuntimeError("FTS5 full-text index is not available on this database")
+    conn.execute(text(f"DELETE FROM {FTS_TABLE}"))
+    _populate(conn)
+    conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"))
+    return conn.execute(text(f"SELECT count(*) FROM {FTS_TABLE}")).scalar_one()
+
+
+def _indexed_columns_changed(collection) -> bool:
+    """after_flush 时属性的修改历史还没有重置，可以判断本次 flush 修改了哪些列"""
+    attrs = inspect(collection).attrs
+    return any(attrs[key].history.has_changes() for key in _COLUMN_KEYS)
+
+
+@event.listens_for(Session, "after_flush")
+def _sync_after_flush(session: Session, flush_context) -> None:
+    from backend.model import Collection, CollectionContent  # avoid circular imports
+
+    dirty_ids: set[int] = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, CollectionContent) and obj.collection_id is not None:
+            dirty_ids.add(obj.collection_id)  # type: ignore
+        elif isinstance(obj, Collection) and obj.id is not None:
+            # 修改分类、标签等未索引的字段时不需要重写索引行（重写需要解压正文）
+            if obj in session.dirty and not _indexed_columns_changed(obj):
+                continue
+            dirty_ids.add(obj.id)  # type: ignore
+    if dirty_ids:
+        sync_collections(session.connection(), dirty_ids)
+
+
+def _split_terms(query: str) -> list[str]:
+    return [term for term in re.split(r"\s+", query.strip()) if term]
+
+
+def _to_match_expression(terms: list[str]) -> str:
+    """把用户输入转成安全的 FTS5 MATCH 表达式（每个词作为短语，AND 连接）。"""
+    phrases = []
+    for term in terms:
+        phrase = '"' + term.replace('"', '""') + '"'
+        # unicode61 分词下做前缀匹配，方便输入时即时搜索
+        if _fts_tokenizer != "trigram":
+            phrase += "*"
+        phrases.append(phrase)
+    return " AND ".join(phrases)
+
+
+# 高亮位置先用私用区字符占位，转义 HTML 之后再替换成 <mark>，正文中的标签不会被渲染
+_MARK_START = "\ue000"
+_MARK_END = "\ue001"
+
+
+def _render_snippet(snippet: str) -> str:
+    return (
+        html.escape(snippet)
+        .replace(_MARK_START, "<mark>")
+        .replace(_MARK_END, "</mark>")
+    )
+
+
+def _make_snippet(content: str, term: str, width: int = 40) -> str:
+    content = content.replace(_MARK_START, "").replace(_MARK_END, "")
+    pos = content.lower().find(term.lower())
+    if pos == -1:
+        return html.escape(content[: width * 2])
+    start = max(0, pos - width)
+    end = min(len(content), pos + len(term) + width)
+    return _render_snippet(
+        ("…" if start > 0 else "")
+        + content[start:pos]
+        + _MARK_START
+        + content[pos : pos + len(term)]
+        + _MARK_END
+        + content[pos + len(term) : end]
+        + ("…" if end < len(content) else "")
+    )
+
+
+def search_fulltext(
+    conn: Connection, user_id: int, query: str, limit: int, offset: int
+) -> list[FulltextHit] | None:
+    """
+    在当前用户的 collection 中搜索，按 BM25 排序。
+    返回 None 表示全文索引不可用，调用方应回退到普通查询。
+    """
+    if not _check_available(conn):
+        return None
+    terms = _split_terms(query)
+    if not terms:
+        return []
+
+    if _fts_tokenizer == "trigram" and any(
+        len(term) < TRIGRAM_MIN_TERM_LENGTH for term in terms
+    ):
+        return _search_like(conn, user_id, terms, limit, offset)
+
+    weights = ", ".join(str(w) for w in BM25_WEIGHTS)
+    rows = conn.execute(
+        text(
+            f"SELECT f.rowid, bm25({FTS_TABLE}, {weights}) AS score, "
+            f"snippet({FTS_TABLE}, -1, '{_MARK_START}', '{_MARK_END}', '…', "
+            f"{SNIPPET_TOKENS[_fts_tokenizer or 'unicode61']}) "
+            f"FROM {FTS_TABLE} f JOIN collections c ON c.id = f.rowid "
+            f"WHERE {FTS_TABLE} MATCH :match AND c.user_id = :user_id "
+            "ORDER BY score LIMIT :limit OFFSET :offset"
+        ),
+        {
+            "match": _to_match_expression(terms),
+            "user_id": user_id,
+            "limit": limit,
+            "offset": offset,
+        },
+    ).all()
+    return [
+        FulltextHit(collection_id=row[0], score=row[1], snippet=_render_snippet(row[2] or ""))
+        for row in rows
+    ]
+
+
+def _search_like(
+    conn: Connection, user_id: int, terms: list[str], limit: int, offset: int
+) -> list[FulltextHit]:
+    """短词回退：只扫描当前用户的索引行，按创建时间倒序。"""
+    conditions = []
+    params: dict = {"user_id": user_id, "limit": limit, "offset": offset}
+    for i, term in enumerate(terms):
+        escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        params[f"term_{i}"] = f"%{escaped}%"
+        conditions.append(
+            "("
+            + " OR ".join(f"f.{key} LIKE :term_{i} ESCAPE '\\'" for key in INDEXED_KEYS)
+            + ")"
+        )
+    rows = conn.execute(
+        text(
+            f"SELECT f.rowid, {', '.join(f'f.{key}' for key in INDEXED_KEYS)} "
+            f"FROM collections c JOIN {FTS_TABLE} f ON f.rowid = c.id "
+            f"WHERE c.user_id = :user_id AND {' AND '.join(conditions)} "
+            "ORDER BY c.created_at DESC LIMIT :limit OFFSET :offset"
+        ),
+        params,
+    ).all()
+    hits = []
+    for row in rows:
+        fields = [value or "" for value in row[1:]]
+        matched = next(
+            (field for field in fields if terms[0].lower() in field.lower()), fields[0]
+        )
+        hits.append(
+            FulltextHit(collection_id=row[0], score=0.0, snippet=_make_snippet(matched, terms[0]))
+        )
+    return hits
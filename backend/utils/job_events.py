@@ -0,0 +1,157 @@
+"""
+任务事件缓冲：任务运行时把事件写入 job_events 表，SSE 接口只负责读取（tail）。
+
+客户端断开不会影响任务本身；重连时带上 Last-Event-ID 即可从断点继续，
+多个客户端也可以同时读取同一个任务的事件。
+
+摘要等增量事件先缓冲，连续的同类事件合并为一条，最多 JOB_EVENT_FLUSH_INTERVAL 秒后
+和其他事件一起在一个事务中写入，避免每个增量写一次数据库。
+"""
+
+import asyncio
+import json
+import os
+from typing import AsyncIterator
+
+from loguru import logger
+from sqlalchemy import select
+
+from backend.db import AsyncSessionLocal
+from backend.model import Job, JobEvent
+from backend.utils.job_queue import current_job_id
+
+# 跨进程时没有通知，按这个间隔轮询新事件（秒）
+JOB_EVENT_POLL_INTERVAL = float(os.getenv("JOB_EVENT_POLL_INTERVAL", "0.5"))
+# 空闲时发送 SSE 心跳注释的间隔（秒），避免代理断开长连接
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+# 增量事件的最长缓冲时间（秒）
+JOB_EVENT_FLUSH_INTERVAL = float(os.getenv("JOB_EVENT_FLUSH_INTERVAL", "0.25"))
+
+# 可以合并的增量事件类型 -> 需要拼接的文本字段
+_MERGEABLE_EVENTS = {"summary_chunk": "summary"}
+
+_TERMINAL_STATUSES = ("succeeded", "failed")
+
+# 同一进程内的读取方，新事件写入后立即唤醒
+_listeners: dict[int, set[asyncio.Event]] = {}
+
+
+class _EventBuffer:
+    def __init__(self) -> None:
+        self.events: list[tuple[str, dict | None]] = []
+        # 写入按顺序进行，定时写入和处理函数触发的写入不会交错
+        self.lock = asyncio.Lock()
+        self.flusher: asyncio.Task | None = None
+
+
+# 任务 id -> 尚未写入的事件
+_buffers: dict[int, _EventBuffer] = {}
+
+
+async def emit_event(event_type: str, data: dict | None = None) -> None:
+    """
+    在任务处理函数中写入一个事件；增量事件先缓冲合并，其他事件连同缓冲的事件立即写入
+    """
+    job_id = current_job_id.get()
+    if job_id is None:
+        raise RuntimeError("emit_event() must be called inside a job handler")
+    buffer = _buffers.setdefault(job_id, _EventBuffer())
+    field = _MERGEABLE_EVENTS.get(event_type)
+    if field is None:
+        buffer.events.append((event_type, data))
+        await flush_events(job_id)
+        return
+
+    last = buffer.events[-1] if buffer.events else None
+    if last is not None and last[0] == event_type and last[1] is not None:
+        last[1][field] = last[1].get(field, "") + (data or {}).get(field, "")
+    else:
+        buffer.events.append((event_type, dict(data or {})))
+    if buffer.flusher is None:
+        buffer.flusher = asyncio.create_task(_flush_later(job_id, buffer))
+
+
+async def _flush_later(job_id: int, buffer: _EventBuffer) -> None:
+    await asyncio.sleep(JOB_EVENT_FLUSH_INTERVAL)
+    buffer.flusher = None
+    try:
+        await flush_events(job_id)
+    except Exception as e:
+        logger.warning(f"Failed to flush events of job #{job_id}: {e!r}")
+
+
+async def flush_events(job_id: int, final: bool = False) -> None:
+    """
+    在一个事务中写入任务缓冲的事件；final 为 True 时丢弃缓冲区，由任务队列在任务结束时调用
+    """
+    buffer = _buffers.pop(job_id, None) if final else _buffers.get(job_id)
+    if buffer is None:
+        return
+    if final and buffer.flusher is not None:
+        buffer.flusher.cancel()
+    async with buffer.lock:
+        events, buffer.events = buffer.events, []
+        if not events:
+            return
+        async with AsyncSessionLocal() as db:
+            db.add_all(
+                JobEvent(job_id=job_id, type=event_type, data=data)
+                for event_type, data in events
+            )
+            await db.commit()
+    for listener in _listeners.get(job_id, ()):
+        listener.set()
+
+
+def format_sse(data: dict, event_id: int | None = None) -> str:
+    lines = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{lines}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def tail_events(job_id: int, after_id: int = 0) -> AsyncIterator[str]:
+    """
+    以 SSE 文本的形式读取任务事件，任务结束且事件读完后返回；空闲时输出心跳注释
+    """
+    wakeup = asyncio.Event()
+    _listeners.setdefault(job_id, set()).add(wakeup)
+    loop = asyncio.get_running_loop()
+    last_sent = loop.time()
+    try:
+        while True:
+            wakeup.clear()
+            async with AsyncSessionLocal() as db:
+                # 先读状态再读事件：状态已结束时，之前写入的事件一定能读到
+                status = (
+                    await db.execute(select(Job.status).where(Job.id == job_id))
+                ).scalar_one_or_none()
+                events = (
+                    await db.execute(
+                        select(JobEvent.id, JobEvent.type, JobEvent.data)
+                        .where(JobEvent.job_id == job_id, JobEvent.id > after_id)
+                        .order_by(JobEvent.id)
+                        .limit(500)
+                    )
+                ).all()
+
+            for event_id, event_type, data in events:
+                yield format_sse({"type": event_type, "data": data or {}}, event_id)
+                after_id = event_id
+            if events:
+                last_sent = loop.time()
+                continue
+            if status is None or status in _TERMINAL_STATUSES:
+                return
+
+            if loop.time() - last_sent >= SSE_HEARTBEAT_SECONDS:
+                yield ": heartbeat\n\n"
+                last_sent = loop.time()
+            try:
+                await asyncio.wait_for(wakeup.wait(), JOB_EVENT_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        listeners = _listeners.get(job_id)
+        if listeners is not None:
+            listeners.discard(wakeup)
+            if not listeners:
+                _listeners.pop(job_id, None)
@@ -0,0 +1,416 @@
+"""
+持久化的后台任务队列（存放在数据库的 jobs 表中）。
+
+- 任务类型通过 `job_queue.register(type, ...)` 注册处理函数，处理函数签名为
+  `async def handler(payload: dict) -> dict | None`，返回值保存为任务结果
+- `job_queue.enqueue(...)` 写入任务，支持幂等 key
+- 每个进程运行一个调度协程，按任务类型的并发上限领取任务；领取是一条带条件的 UPDATE，
+  多个 worker 进程同时运行也不会重复执行。运行中的任务持有租约并定期续租，
+  进程退出或崩溃后租约过期，任务会被重新领取
+- 失败的任务按指数退避重试，超过最大次数或抛出 PermanentJobError 后标记为 failed
+- 结束超过 JOB_RETENTION_DAYS 天的任务连同事件一起删除
+"""
+
+import asyncio
+import contextvars
+import os
+import random
+import socket
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable
+
+from loguru import logger
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.db import AsyncSessionLocal
+from backend.model import Job, JobEvent
+
+# 没有新任务通知时的轮询间隔（秒）
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "2"))
+# 运行中任务的租约时长（秒），每 1/3 租约时长续租一次
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+# 已结束的任务及其事件保留天数，0 表示不清理
+JOB_RETENTION_DAYS = float(os.getenv("JOB_RETENTION_DAYS", "7"))
+# 清理已结束任务的间隔（秒）
+JOB_PRUNE_INTERVAL = float(os.getenv("JOB_PRUNE_INTERVAL", "3600"))
+
+JobHandler = Callable[[dict], Awaitable[dict | None]]
+
+# 正在执行的任务 id（jobs.id），处理函数中可以通过它写入任务事件
+current_job_id: contextvars.ContextVar[int | None] = contextvars.ContextVar(
+    "current_job_id", default=None
+)
+
+
+class PermanentJobError(Exception):
+    """处理函数抛出后不再重试，任务直接标记为失败"""
+
+
+@dataclass
+class JobType:
+    name: str
+    handler: JobHandler
+    concurrency: int = 1
+    max_attempts: int = 3
+    # 第 n 次重试前等待 backoff * 2 ** (n - 1) 秒
+    backoff: float = 10.0
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def job_to_dict(job: Job) -> dict[str, Any]:
+    return {
+        "job_id": job.job_id,
+        "type": job.type,
+        "status": job.status,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "last_error": job.last_error,
+        "result": job.result,
+        "created_at": job.created_at.isoformat(),
+        "updated_at": job.updated_at.isoformat(),
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+class JobQueue:
+    def __init__(
+        self, poll_interval: float = JOB_POLL_INTERVAL, lease_seconds: float = JOB_LEASE_SECONDS
+    ):
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._types: dict[str, JobType] = {}
+        # job id -> (job type, task)
+        self._running: dict[int, tuple[str, asyncio.Task]] = {}
+        self._wakeup: asyncio.Event | None = None
+        self._dispatcher: asyncio.Task | None = None
+        self._last_prune = 0.0
+
+    def register(
+        self, name: str, concurrency: int = 1, max_attempts: int = 3, backoff: float = 10.0
+    ):
+        """注册任务类型的处理函数（装饰器）"""
+
+        def decorator(handler: JobHandler) -> JobHandler:
+            self._types[name] = JobType(name, handler, concurrency, max_attempts, backoff)
+            return handler
+
+        return decorator
+
+    async def enqueue(
+        self,
+        db: AsyncSession,
+        job_type: str,
+        payload: dict,
+        user_id: int | None = None,
+        idempotency_key: str | None = None,
+        reuse_finished: bool = True,
+    ) -> Job:
+        """
+        写入一个任务并提交事务。
+
+        idempotency_key 相同的任务已经在排队、运行或已成功时直接返回已有的任务；
+        已失败的任务会被重置后重新排队。reuse_finished=False 时 key 只对未结束的任务
+        去重，已结束的任务会释放 key 并创建新任务。
+        """
+        if job_type not in self._types:
+            raise ValueError(f"Unknown job type: {job_type}")
+
+        if idempotency_key is not None:
+            existing = await self._get_by_key(db, idempotency_key)
+            if existing is not None and not reuse_finished and existing.status in (
+                "succeeded",
+                "failed",
+            ):
+                existing.idempotency_key = None  # type: ignore
+                await db.flush()
+                existing = None
+            if existing is not None:
+                if existing.status == "failed":
+                    existing.status = "queued"  # type: ignore
+                    existing.attempts = 0  # type: ignore
+                    existing.run_after = _now()  # type: ignore
+                    existing.last_error = None  # type: ignore
+                    existing.finished_at = None  # type: ignore
+                    await db.commit()
+                    self.notify()
+                return existing
+
+        job = Job(
+            type=job_type,
+            user_id=user_id,
+            payload=payload,
+            max_attempts=self._types[job_type].max_attempts,
+            idempotency_key=idempotency_key,
+        )
+        db.add(job)
+        try:
+            await db.commit()
+        except IntegrityError:
+            # 并发写入了相同 idempotency_key 的任务
+            await db.rollback()
+            existing = await self._get_by_key(db, idempotency_key)  # type: ignore
+            if existing is None:
+                raise
+            return existing
+        self.notify()
+        return job
+
+    @staticmethod
+    async def _get_by_key(db: AsyncSession, idempotency_key: str) -> Job | None:
+        result = await db.execute(select(Job).where(Job.idempotency_key == idempotency_key))
+        return result.scalar_one_or_none()
+
+    @staticmethod
+    async def update_payload(job_id: int, **values: Any) -> None:
+        """
+        合并写入任务的 payload，处理函数用它记录进度；任务被重新领取（例如进程崩溃后）时
+        处理函数收到的是更新后的 payload，可以从记录的进度继续
+        """
+        async with AsyncSessionLocal() as db:
+            job = await db.get(Job, job_id)
+            if job is not None:
+                job.payload = {**(job.payload or {}), **values}  # type: ignore
+                await db.commit()
+
+    def notify(self) -> None:
+        """有新任务时唤醒调度协程，不必等到下一次轮询"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self) -> None:
+        if self._dispatcher is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch_loop())
+        logger.info(f"Job queue started on {self.worker_id}")
+
+    async def stop(self) -> None:
+        """停止调度，正在运行的任务取消后放回队列（不计入重试次数）"""
+        if self._dispatcher is None:
+            return
+        self._dispatcher.cancel()
+        await asyncio.gather(self._dispatcher, return_exceptions=True)
+        self._dispatcher = None
+
+        running = dict(self._running)
+        for _, task in running.values():
+            task.cancel()
+        await asyncio.gather(*(task for _, task in running.values()), return_exceptions=True)
+        if running:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(Job)
+                    .where(
+                        Job.id.in_(list(running)),
+                        Job.status == "running",
+                        Job.locked_by == self.worker_id,
+                    )
+                    .values(
+                        status="queued",
+                        attempts=Job.attempts - 1,
+                        locked_by=None,
+                        locked_until=None,
+                        run_after=_now(),
+                    )
+                )
+                await db.commit()
+
+    async def _dispatch_loop(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            self._wakeup.clear()
+            try:
+                await self._dispatch_once()
+            except Exception as e:
+                logger.exception(f"Job dispatch failed: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _claimable(self, now: datetime):
+        return or_(
+            and_(Job.status == "queued", Job.run_after <= now),
+            # 租约过期的运行中任务（持有它的进程已经退出），还有剩余次数时重新领取
+            and_(
+                Job.status == "running",
+                Job.locked_until < now,
+                Job.attempts < Job.max_attempts,
+            ),
+        )
+
+    async def _fail_expired(self) -> None:
+        """租约过期且已经用完重试次数的任务（例如每次执行都让进程崩溃）标记为失败"""
+        async with AsyncSessionLocal() as db:
+            now = _now()
+            result = await db.execute(
+                update(Job)
+                .where(
+                    Job.status == "running",
+                    Job.locked_until < now,
+                    Job.attempts >= Job.max_attempts,
+                )
+                .values(
+                    status="failed",
+                    last_error="Lease expired: the worker running this job exited",
+                    locked_by=None,
+                    locked_until=None,
+                    finished_at=now,
+                )
+            )
+            await db.commit()
+        if result.rowcount:  # type: ignore
+            logger.error(f"{result.rowcount} jobs failed after their lease expired")  # type: ignore
+
+    async def _prune_finished(self) -> None:
+        """删除结束超过保留期限的任务和它们的事件，每 JOB_PRUNE_INTERVAL 秒最多执行一次"""
+        loop = asyncio.get_running_loop()
+        if JOB_RETENTION_DAYS <= 0 or loop.time() - self._last_prune < JOB_PRUNE_INTERVAL:
+            return
+        self._last_prune = loop.time()
+        expired = select(Job.id).where(
+            Job.status.in_(("succeeded", "failed")),
+            Job.finished_at < _now() - timedelta(days=JOB_RETENTION_DAYS),
+        )
+        async with AsyncSessionLocal() as db:
+            # SQLite 默认不执行外键的级联删除，事件需要单独删除
+            await db.execute(delete(JobEvent).where(JobEvent.job_id.in_(expired)))
+            result = await db.execute(delete(Job).where(Job.id.in_(expired)))
+            await db.commit()
+        if result.rowcount:  # type: ignore
+            logger.info(f"Pruned {result.rowcount} finished jobs")  # type: ignore
+
+    async def _dispatch_once(self) -> None:
+        await self._fail_expired()
+        await self._prune_finished()
+        for job_type in self._types.values():
+            busy = sum(1 for name, _ in self._running.values() if name == job_type.name)
+            free = job_type.concurrency - busy
+            if free <= 0:
+                continue
+
+            async with AsyncSessionLocal() as db:
+                now = _now()
+                candidates = (
+                    await db.execute(
+                        select(Job.id)
+                        .where(Job.type == job_type.name, self._claimable(now))
+                        .order_by(Job.run_after, Job.id)
+                        .limit(free)
+                    )
+                ).scalars().all()
+                for job_id in candidates:
+                    claimed = await db.execute(
+                        update(Job)
+                        .where(Job.id == job_id, self._claimable(now))
+                        .values(
+                            status="running",
+                            attempts=Job.attempts + 1,
+                            locked_by=self.worker_id,
+                            locked_until=now + timedelta(seconds=self.lease_seconds),
+                            started_at=now,
+                        )
+                    )
+                    await db.commit()
+                    if claimed.rowcount != 1:  # type: ignore
+                        # 被其他 worker 抢先领取
+                        continue
+                    task = asyncio.create_task(self._run(job_id, job_type))
+                    self._running[job_id] = (job_type.name, task)
+
+    async def _renew_lease(self, job_id: int) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.execute(
+                        update(Job)
+                        .where(Job.id == job_id, Job.locked_by == self.worker_id)
+                        .values(locked_until=_now() + timedelta(seconds=self.lease_seconds))
+                    )
+                    await db.commit()
+            except Exception as e:
+                # 单次续租失败（例如数据库暂时被锁）不影响任务，下一轮再续
+                logger.warning(f"Failed to renew lease of job #{job_id}: {e}")
+
+    async def _run(self, job_id: int, job_type: JobType) -> None:
+        current_job_id.set(job_id)
+        renew = asyncio.create_task(self._renew_lease(job_id))
+        try:
+            async with AsyncSessionLocal() as db:
+                job = await db.get(Job, job_id)
+                payload = dict(job.payload or {}) if job else {}  # type: ignore
+            try:
+                result = await job_type.handler(payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await self._flush_events(job_id)
+                await self._fail(job_id, job_type, e)
+            else:
+                await self._flush_events(job_id)
+                await self._finish(
+                    job_id, {"status": "succeeded", "result": result, "finished_at": _now()}
+                )
+                logger.info(f"Job {job_type.name}#{job_id} succeeded")
+        finally:
+            renew.cancel()
+            (renew_error,) = await asyncio.gather(renew, return_exceptions=True)
+            if isinstance(renew_error, Exception):
+                logger.error(f"Lease renewal of job #{job_id} stopped: {renew_error!r}")
+            self._running.pop(job_id, None)
+            self.notify()
+
+    @staticmethod
+    async def _flush_events(job_id: int) -> None:
+        """更新任务状态前写入缓冲的事件，读取方看到结束状态时事件已经完整"""
+        from backend.utils.job_events import flush_events  # avoid circular imports
+
+        try:
+            await flush_events(job_id, final=True)
+        except Exception as e:
+            logger.error(f"Failed to flush events of job #{job_id}: {e!r}")
+
+    async def _finish(self, job_id: int, values: dict) -> None:
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.locked_by == self.worker_id)
+                .values(locked_by=None, locked_until=None, **values)
+            )
+            await db.commit()
+
+    async def _fail(self, job_id: int, job_type: JobType, error: Exception) -> None:
+        async with AsyncSessionLocal() as db:
+            job = await db.get(Job, job_id)
+            attempts = job.attempts if job else job_type.max_attempts
+        if attempts >= job_type.max_attempts or isinstance(error, PermanentJobError):
+            logger.error(f"Job {job_type.name}#{job_id} failed after {attempts} attempts: {error}")
+            await self._finish(
+                job_id, {"status": "failed", "last_error": str(error), "finished_at": _now()}
+            )
+            return
+        delay = job_type.backoff * 2 ** (attempts - 1) * random.uniform(0.8, 1.2)
+        logger.warning(
+            f"Job {job_type.name}#{job_id} failed (attempt {attempts}), retrying in {delay:.0f}s: {error}"
+        )
+        await self._finish(
+            job_id,
+            {
+                "status": "queued",
+                "last_error": str(error),
+                "run_after": _now() + timedelta(seconds=delay),
+            },
+        )
+
+
+# global
+job_queue = JobQueue()
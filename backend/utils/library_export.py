@@ -0,0 +1,150 @@
+"""
+用户收藏库的 NDJSON 导出。
+
+每行一个 JSON 对象，第一行是 meta，然后依次是 category 和 collection。
+collection 行包含固定字段、自由 details、正文和附件引用。读取时使用服务端游标
+（yield_per），每批 collection 再批量查询 details / 正文 / 附件，内存占用与收藏数量无关。
+"""
+
+import json
+import zlib
+from datetime import datetime, timezone
+from typing import AsyncIterator
+
+from sqlalchemy import select
+
+from backend.db import AsyncSessionLocal
+from backend.model import (
+    Attachment,
+    Category,
+    Collection,
+    CollectionAttachment,
+    CollectionDetail,
+)
+from backend.utils.content_store import load_contents
+
+EXPORT_FORMAT_VERSION = 1
+# 每批从游标读取的 collection 数量
+EXPORT_BATCH_SIZE = 200
+
+
+def _line(record: dict) -> bytes:
+    return (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+
+def _isoformat(value: datetime | None) -> str | None:
+    return value.isoformat() if value is not None else None
+
+
+async def export_library(user_id: int) -> AsyncIterator[bytes]:
+    """逐行生成用户收藏库的 NDJSON"""
+    # 使用独立的 session：StreamingResponse 发送期间请求的依赖可能已经结束
+    async with AsyncSessionLocal() as db:
+        yield _line(
+            {
+                "type": "meta",
+                "version": EXPORT_FORMAT_VERSION,
+                "user_id": user_id,
+                "exported_at": datetime.now(timezone.utc).isoformat(),
+            }
+        )
+
+        categories = await db.stream(
+            select(
+                Category.id, Category.name, Category.emoji, Category.knowledge_base_id
+            )
+            .where(Category.user_id == user_id)
+            .order_by(Category.id)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        async for category_id, name, emoji, knowledge_base_id in categories:
+            yield _line(
+                {
+                    "type": "category",
+                    "id": category_id,
+                    "name": name,
+                    "emoji": emoji,
+                    "knowledge_base_id": knowledge_base_id,
+                }
+            )
+
+        # 只查询列而不是 ORM 对象，避免 identity map 随导出数量增长
+        collections = await db.stream(
+            select(
+                Collection.id,
+                Collection.category_id,
+                Collection.tags,
+                Collection.title,
+                Collection.url,
+                Collection.summary,
+                Collection.created_at,
+                Collection.updated_at,
+            )
+            .where(Collection.user_id == user_id)
+            .order_by(Collection.id)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        async for rows in collections.partitions():
+            ids = [row.id for row in rows]
+
+            details: dict[int, dict] = {collection_id: {} for collection_id in ids}
+            details_result = await db.execute(
+                select(
+                    CollectionDetail.collection_id,
+                    CollectionDetail.key,
+                    CollectionDetail.value,
+                )
+                .where(CollectionDetail.collection_id.in_(ids))
+                .order_by(CollectionDetail.id)
+            )
+            for collection_id, key, value in details_result.all():
+                details[collection_id][key] = value
+
+            attachments: dict[int, list[dict]] = {collection_id: [] for collection_id in ids}
+            attachments_result = await db.execute(
+                select(
+                    CollectionAttachment.collection_id,
+                    Attachment.attachment_id,
+                    Attachment.url,
+                    Attachment.description,
+                )
+                .join(
+                    Attachment,
+                    Attachment.attachment_id == CollectionAttachment.attachment_id,
+                )
+                .where(CollectionAttachment.collection_id.in_(ids))
+            )
+            for collection_id, attachment_id, url, description in attachments_result.all():
+                attachments[collection_id].append(
+                    {"attachment_id": attachment_id, "url": url, "description": description}
+                )
+
+            contents = await load_contents(db, ids)
+
+            for row in rows:
+                yield _line(
+                    {
+                        "type": "collection",
+                        "id": row.id,
+                        "category_id": row.category_id,
+                        "tags": row.tags.split(",") if row.tags else [],
+                        "title": row.title,
+                        "url": row.url,
+                        "summary": row.summary,
+                        "details": details[row.id],
+                        "content": contents.get(row.id),
+                        "attachments": attachments[row.id],
+                        "created_at": _isoformat(row.created_at),
+                        "updated_at": _isoformat(row.updated_at),
+                    }
+                )
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """把字节流压缩为 gzip 流"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip 格式
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
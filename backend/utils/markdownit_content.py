@@ -1,16 +1,188 @@
+import io
+import os
 import asyncio
-from markitdown_no_magika import MarkItDown
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING, Any, Callable
+from loguru import logger
+from markitdown_no_magika import MarkItDown, StreamInfo
+from backend.utils.page_cache import page_cache
+
+if TYPE_CHECKING:
+    from backend.utils.web_parser import FetchedPage
+
+# 转换进程数，0 表示在线程中转换（不使用进程池）
+MARKITDOWN_WORKERS = int(os.getenv("MARKITDOWN_WORKERS", str(min(4, os.cpu_count() or 1))))
+# 单个文档的转换超时（秒），超时后重建进程池
+MARKITDOWN_TIMEOUT = float(os.getenv("MARKITDOWN_TIMEOUT", "60"))
+# 每个转换进程的内存上限（MB），0 表示不限制
+MARKITDOWN_MAX_MEMORY_MB = int(os.getenv("MARKITDOWN_MAX_MEMORY_MB", "1024"))
+# 输入大小上限，超出直接拒绝
+MARKITDOWN_MAX_INPUT_BYTES = int(os.getenv("MARKITDOWN_MAX_INPUT_BYTES", str(20 * 1024 * 1024)))
+# 输出 markdown 的长度上限，超出截断
+MARKITDOWN_MAX_OUTPUT_CHARS = int(os.getenv("MARKITDOWN_MAX_OUTPUT_CHARS", "500000"))
+
+
+class ContentTooLargeError(Exception):
+    pass
+
+
+class ConversionTimeoutError(Exception):
+    pass
+
+
+# 进程内的 MarkItDown 实例（主进程线程模式和工作进程各自一份）
+_worker_md: MarkItDown | None = None
+
+
+def _get_md() -> MarkItDown:
+    global _worker_md
+    if _worker_md is None:
+        _worker_md = MarkItDown(enable_plugins=False)
+    return _worker_md
+
+
+def _init_worker(max_memory_mb: int) -> None:
+    if max_memory_mb > 0:
+        try:
+            import resource
+
+            limit = max_memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError) as e:
+            logger.warning(f"Failed to set memory limit for MarkItDown worker: {e}")
+    _get_md()
+
+
+def _convert_source(source: str) -> str:
+    return _get_md().convert(source).text_content
+
+
+def _convert_bytes(data: bytes, stream_info: dict[str, Any]) -> str:
+    result = _get_md().convert_stream(io.BytesIO(data), stream_info=StreamInfo(**stream_info))
+    return result.text_content
 
 
 class MarkdownitContent:
-    def __init__(self) -> None:
-        self.md = MarkItDown(enable_plugins=False)
+    """
+    MarkItDown 转换放到独立的进程池中执行，避免 CPU 密集的解析占用事件循环线程池和 GIL；
+    并发数受 worker 数限制，每个文档有超时和内存上限。
+    """
+
+    def __init__(self, workers: int = MARKITDOWN_WORKERS) -> None:
+        self.workers = workers
+        self._executor: ProcessPoolExecutor | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(MARKITDOWN_MAX_MEMORY_MB,),
+            )
+        return self._executor
+
+    def _reset_executor(self) -> None:
+        """终止所有工作进程（包括仍在转换的），下次使用时重建"""
+        executor, self._executor = self._executor, None
+        if executor is None:
+            return
+        for process in list(getattr(executor, "_processes", {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, fn: Callable[..., str], *args: Any) -> str:
+        if self.workers <= 0:
+            result = await asyncio.wait_for(asyncio.to_thread(fn, *args), MARKITDOWN_TIMEOUT)
+            return self._truncate(result)
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.workers)
+        # 排队的时间不计入超时
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._get_executor(), fn, *args)
+            try:
+                result = await asyncio.wait_for(future, MARKITDOWN_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning(f"MarkItDown conversion timed out after {MARKITDOWN_TIMEOUT}s")
+                self._reset_executor()
+                raise ConversionTimeoutError(
+                    f"Conversion timed out after {MARKITDOWN_TIMEOUT} seconds"
+                )
+            except BrokenProcessPool:
+                # 工作进程崩溃（例如超出内存上限被杀死）
+                logger.warning("MarkItDown worker crashed, restarting the process pool")
+                self._reset_executor()
+                raise
+        return self._truncate(result)
+
+    @staticmethod
+    def _truncate(text: str) -> str:
+        if len(text) > MARKITDOWN_MAX_OUTPUT_CHARS:
+            logger.info(f"Markdown truncated from {len(text)} to {MARKITDOWN_MAX_OUTPUT_CHARS} chars")
+            return text[:MARKITDOWN_MAX_OUTPUT_CHARS]
+        return text
 
     async def markdownit(self, source: str) -> str:
         """Convert the content to Markdown format."""
-        result = await asyncio.to_thread(self.md.convert, source)
+        if os.path.isfile(source) and os.path.getsize(source) > MARKITDOWN_MAX_INPUT_BYTES:
+            raise ContentTooLargeError(f"File {source} exceeds {MARKITDOWN_MAX_INPUT_BYTES} bytes")
+        return await self._run(_convert_source, source)
+
+    async def markdownit_bytes(
+        self,
+        data: bytes,
+        mimetype: str | None = None,
+        charset: str | None = None,
+        filename: str | None = None,
+        extension: str | None = None,
+        url: str | None = None,
+    ) -> str:
+        """Convert already downloaded content to Markdown format."""
+        if len(data) > MARKITDOWN_MAX_INPUT_BYTES:
+            raise ContentTooLargeError(
+                f"Content of {len(data)} bytes exceeds {MARKITDOWN_MAX_INPUT_BYTES} bytes"
+            )
+        stream_info = dict(
+            mimetype=mimetype,
+            charset=charset,
+            filename=filename,
+            extension=extension,
+            url=url,
+        )
+        return await self._run(_convert_bytes, data, stream_info)
+
+    async def markdownit_page(self, page: "FetchedPage") -> str:
+        """
+        Convert a fetched page to Markdown, skipping the conversion when the
+        same content (by hash) has already been converted.
+        """
+        if page.markdown is None and page.content_hash:
+            page.markdown = await page_cache.get_markdown(page.content_hash)
+        if page.markdown is not None:
+            return page.markdown
+
+        page.markdown = await self.markdownit_bytes(
+            page.content,
+            mimetype=page.mimetype,
+            charset=page.charset,
+            filename=page.filename,
+            extension=page.extension,
+            url=page.url,
+        )
+        if page.content_hash:
+            await page_cache.set_markdown(page.content_hash, page.markdown)
+        return page.markdown
 
-        return result.text_content
+    async def close(self) -> None:
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+        self._semaphore = None
 
 
 markdownit_helper = MarkdownitContent()
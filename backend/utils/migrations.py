@@ -0,0 +1,285 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable
+
+from loguru import logger
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+from backend.utils.counters import reconcile_counters
+from backend.utils.collection_fields import url_hash
+from backend.utils.content_store import DEFAULT_CODEC, compress
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+
+
+# 按版本号顺序执行，已执行的版本记录在 schema_migrations 表中。
+# 已发布的迁移不要修改，新的结构变更追加新版本。
+MIGRATIONS: list[Migration] = []
+
+
+def migration(version: int, name: str):
+    def decorator(fn: Callable[[Connection], None]):
+        MIGRATIONS.append(Migration(version, name, fn))
+        return fn
+
+    return decorator
+
+
+# 迁移中用到的全文索引 SQL 固定写在这里，不引用 fulltext_index 的当前实现：
+# 之后索引的数据来源变化时，已发布的迁移在旧数据库上仍然按发布时的方式执行
+_FTS_TABLE = "collection_fts"
+_FTS_COLUMNS = "title, summary, content, url"
+
+
+def _latest_detail_sql(key: str) -> str:
+    return (
+        "(SELECT json_extract(d.value, '$') FROM collection_details d "
+        f"WHERE d.collection_id = c.id AND d.key = '{key}' ORDER BY d.id DESC LIMIT 1)"
+    )
+
+
+def _table_exists(conn: Connection, name: str) -> bool:
+    return (
+        conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": name},
+        ).first()
+        is not None
+    )
+
+
+def create_fulltext_index(conn: Connection) -> bool:
+    """0002 发布时的全文索引创建：建 FTS5 虚表，四个字段都从 collection_details 填充"""
+    if conn.dialect.name != "sqlite":
+        return False
+    if _table_exists(conn, _FTS_TABLE):
+        return True
+    # trigram 支持中文等无空格语言的子串匹配，旧版本 SQLite 回退到 unicode61
+    for tokenizer in ("trigram", "unicode61 remove_diacritics 2"):
+        try:
+            conn.execute(
+                text(
+                    f"CREATE VIRTUAL TABLE {_FTS_TABLE} USING fts5("
+                    f"{_FTS_COLUMNS}, tokenize = '{tokenizer}')"
+                )
+            )
+            break
+        except Exception as e:
+            logger.warning(f"FTS5 tokenizer '{tokenizer}' unavailable: {e}")
+    else:
+        return False
+    conn.execute(
+        text(
+            f"INSERT INTO {_FTS_TABLE}(rowid, {_FTS_COLUMNS}) SELECT c.id, "
+            + ", ".join(
+                f"coalesce({_latest_detail_sql(key)}, '')"
+                for key in ("title", "summary", "content", "url")
+            )
+            + " FROM collections c"
+        )
+    )
+    logger.info(f"Created full-text index table '{_FTS_TABLE}'")
+    return True
+
+
+def _add_column(conn: Connection, table: str, column: str, ddl: str) -> bool:
+    """为旧数据库补上新增的列，返回是否实际新增"""
+    existing = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column in existing:
+        return False
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    logger.info(f"Added column {table}.{column}")
+    return True
+
+
+@migration(1, "post_and_comment_counters")
+def _counters(conn: Connection) -> None:
+    added = [
+        _add_column(conn, "posts", "likes_count", "INTEGER NOT NULL DEFAULT 0"),
+        _add_column(conn, "posts", "comments_count", "INTEGER NOT NULL DEFAULT 0"),
+        _add_column(conn, "comments", "likes_count", "INTEGER NOT NULL DEFAULT 0"),
+    ]
+    if any(added):
+        # 旧数据库新增了计数字段，需要从源表回填
+        reconcile_counters(conn)
+
+
+@migration(2, "collection_fulltext_index")
+def _fulltext(conn: Connection) -> None:
+    create_fulltext_index(conn)
+
+
+@migration(3, "hot_path_indexes")
+def _hot_path_indexes(conn: Connection) -> None:
+    # 同一用户对同一资源只能点赞一次：先清理历史重复数据，再建唯一索引
+    conn.execute(
+        text(
+            "DELETE FROM likes WHERE id NOT IN ("
+            "SELECT min(id) FROM likes GROUP BY asset_type, asset_id, user_id)"
+        )
+    )
+    statements = (
+        "CREATE INDEX IF NOT EXISTS ix_collection_details_collection_key "
+        "ON collection_details (collection_id, key)",
+        "CREATE INDEX IF NOT EXISTS ix_collections_user_created "
+        "ON collections (user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_collections_category ON collections (category_id)",
+        "CREATE INDEX IF NOT EXISTS ix_categories_user_name ON categories (user_id, name)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_likes_asset_user "
+        "ON likes (asset_type, asset_id, user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_posts_created ON posts (created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_posts_user_created ON posts (user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_comments_post_created "
+        "ON comments (post_id, created_at, id)",
+    )
+    for statement in statements:
+        conn.execute(text(statement))
+    reconcile_counters(conn)
+
+
+@migration(4, "promote_collection_fields")
+def _promote_collection_fields(conn: Connection) -> None:
+    """title / url / summary 从 collection_details 移到 collections 的列上"""
+    _add_column(conn, "collections", "title", "TEXT")
+    _add_column(conn, "collections", "url", "TEXT")
+    _add_column(conn, "collections", "url_hash", "VARCHAR(64)")
+    _add_column(conn, "collections", "summary", "TEXT")
+
+    for key in ("title", "url", "summary"):
+        # 同一个 key 有多行时取最新的一行
+        conn.execute(
+            text(
+                f"UPDATE collections SET {key} = ("
+                "SELECT json_extract(d.value, '$') FROM collection_details d "
+                f"WHERE d.collection_id = collections.id AND d.key = '{key}' "
+                "ORDER BY d.id DESC LIMIT 1) "
+                f"WHERE {key} IS NULL"
+            )
+        )
+    rows = conn.execute(
+        text("SELECT id, url FROM collections WHERE url IS NOT NULL AND url_hash IS NULL")
+    ).all()
+    for collection_id, url in rows:
+        conn.execute(
+            text("UPDATE collections SET url_hash = :hash WHERE id = :id"),
+            {"hash": url_hash(str(url)), "id": collection_id},
+        )
+    conn.execute(
+        text("DELETE FROM collection_details WHERE key IN ('title', 'url', 'summary')")
+    )
+    conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_collections_user_url_hash "
+            "ON collections (user_id, url_hash)"
+        )
+    )
+    if conn.dialect.name == "sqlite" and _table_exists(conn, _FTS_TABLE):
+        # 重新填充全文索引：title / summary / url 读取新的列，正文此时仍在 collection_details 中
+        conn.execute(text(f"DELETE FROM {_FTS_TABLE}"))
+        conn.execute(
+            text(
+                f"INSERT INTO {_FTS_TABLE}(rowid, {_FTS_COLUMNS}) "
+                "SELECT c.id, coalesce(c.title, ''), coalesce(c.summary, ''), "
+                f"coalesce({_latest_detail_sql('content')}, ''), coalesce(c.url, '') "
+                "FROM collections c"
+            )
+        )
+
+
+@migration(5, "collection_content_store")
+def _collection_content_store(conn: Connection) -> None:
+    """正文从 collection_details 移到压缩存放的 collection_contents 表"""
+    conn.execute(
+        text(
+            "CREATE TABLE IF NOT EXISTS collection_contents ("
+            "collection_id INTEGER NOT NULL PRIMARY KEY REFERENCES collections (id), "
+            "codec VARCHAR(16) NOT NULL, data BLOB NOT NULL, size INTEGER NOT NULL, "
+            "created_at DATETIME NOT NULL, updated_at DATETIME NOT NULL)"
+        )
+    )
+    last_id = 0
+    while True:
+        # 按批处理，避免一次把所有正文读进内存；同一个 collection 取最新的一行
+        rows = conn.execute(
+            text(
+                "SELECT d.collection_id, json_extract(d.value, '$'), d.created_at, d.updated_at "
+                "FROM collection_details d WHERE d.key = 'content' AND d.id = ("
+                "SELECT max(d2.id) FROM collection_details d2 "
+                "WHERE d2.collection_id = d.collection_id AND d2.key = 'content') "
+                "AND d.collection_id > :last_id ORDER BY d.collection_id LIMIT 100"
+            ),
+            {"last_id": last_id},
+        ).all()
+        if not rows:
+            break
+        params = [
+            {
+                "collection_id": collection_id,
+                "codec": DEFAULT_CODEC,
+                "data": compress(str(content)),
+                "size": len(str(content).encode("utf-8")),
+                "created_at": created_at,
+                "updated_at": updated_at,
+            }
+            for collection_id, content, created_at, updated_at in rows
+            if content is not None
+        ]
+        if params:
+            conn.execute(
+                text(
+                    "INSERT OR REPLACE INTO collection_contents "
+                    "(collection_id, codec, data, size, created_at, updated_at) "
+                    "VALUES (:collection_id, :codec, :data, :size, :created_at, :updated_at)"
+                ),
+                params,
+            )
+        last_id = rows[-1][0]
+    # 正文文本不变，全文索引不需要重建
+    conn.execute(text("DELETE FROM collection_details WHERE key = 'content'"))
+
+
+def _ensure_version_table(conn: Connection) -> None:
+    conn.execute(
+        text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, name VARCHAR(255) NOT NULL, "
+            "applied_at DATETIME NOT NULL)"
+        )
+    )
+
+
+def applied_versions(conn: Connection) -> set[int]:
+    _ensure_version_table(conn)
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def pending_migrations(conn: Connection) -> list[Migration]:
+    applied = applied_versions(conn)
+    return [m for m in sorted(MIGRATIONS, key=lambda m: m.version) if m.version not in applied]
+
+
+def run_migrations(conn: Connection) -> list[Migration]:
+    """
+    执行所有未执行的迁移，在调用方的事务中进行。
+
+    Returns:
+        本次执行的迁移
+    """
+    pending = pending_migrations(conn)
+    for m in pending:
+        logger.info(f"Applying migration {m.version:04d}_{m.name}")
+        m.upgrade(conn)
+        conn.execute(
+            text(
+                "INSERT INTO schema_migrations (version, name, applied_at) "
+                "VALUES (:version, :name, :applied_at)"
+            ),
+            {"version": m.version, "name": m.name, "applied_at": datetime.now(timezone.utc)},
+        )
+    return pending
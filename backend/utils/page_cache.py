@@ -0,0 +1,174 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import time
+from contextlib import closing
+from dataclasses import dataclass, replace
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from backend.utils.cache import CACHE_DB_PATH
+
+# 页面缓存的总大小上限（原始内容 + markdown），超出时按最近访问时间淘汰
+PAGE_CACHE_MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+PAGE_CACHE_DB_PATH = os.getenv("PAGE_CACHE_DB_PATH", CACHE_DB_PATH)
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> str:
+    """
+    规范化 URL 作为缓存 key：scheme / host 小写，去掉默认端口和 fragment，query 参数排序；
+    user:pass@ 原样保留，不同凭据的请求不共用缓存
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if ":" in host:  # IPv6，hostname 去掉了方括号
+        host = f"[{host}]"
+    if parts.port and parts.port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    userinfo, has_userinfo, _ = parts.netloc.rpartition("@")
+    if has_userinfo:
+        host = f"{userinfo}@{host}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+def content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+@dataclass
+class CachedPage:
+    url: str
+    final_url: str
+    content: bytes
+    content_hash: str
+    mimetype: str | None
+    charset: str | None
+    filename: str | None
+    extension: str | None
+    etag: str | None
+    last_modified: str | None
+    markdown: str | None
+
+
+class PageCache:
+    """
+    基于 SQLite 的网页缓存，保存 ETag / Last-Modified、内容哈希、原始内容和转换后的 markdown，
+    用于条件请求重新验证，以及内容未变化时跳过 MarkItDown 转换。
+    """
+
+    def __init__(self, path: str | Path, max_bytes: int = PAGE_CACHE_MAX_BYTES):
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS page_cache ("
+                "url TEXT PRIMARY KEY, final_url TEXT NOT NULL, content BLOB NOT NULL, "
+                "content_hash TEXT NOT NULL, mimetype TEXT, charset TEXT, filename TEXT, "
+                "extension TEXT, etag TEXT, last_modified TEXT, markdown TEXT, "
+                "size INTEGER NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_page_cache_hash ON page_cache (content_hash)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_page_cache_accessed ON page_cache (accessed_at)"
+            )
+            self._initialized = True
+        return conn
+
+    def _get_sync(self, url: str) -> CachedPage | None:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT url, final_url, content, content_hash, mimetype, charset, filename, "
+                "extension, etag, last_modified, markdown FROM page_cache WHERE url = ?",
+                (url,),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE page_cache SET accessed_at = ? WHERE url = ?", (time.time(), url)
+            )
+        return CachedPage(*row)
+
+    def _put_sync(self, page: CachedPage) -> None:
+        size = len(page.content) + len((page.markdown or "").encode())
+        if size > self.max_bytes:
+            return
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO page_cache (url, final_url, content, content_hash, "
+                "mimetype, charset, filename, extension, etag, last_modified, markdown, "
+                "size, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    page.url,
+                    page.final_url,
+                    page.content,
+                    page.content_hash,
+                    page.mimetype,
+                    page.charset,
+                    page.filename,
+                    page.extension,
+                    page.etag,
+                    page.last_modified,
+                    page.markdown,
+                    size,
+                    time.time(),
+                ),
+            )
+            self._evict(conn)
+
+    def _get_markdown_sync(self, content_hash: str) -> str | None:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT markdown FROM page_cache "
+                "WHERE content_hash = ? AND markdown IS NOT NULL LIMIT 1",
+                (content_hash,),
+            ).fetchone()
+        return row[0] if row else None
+
+    def _set_markdown_sync(self, content_hash: str, markdown: str) -> None:
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE page_cache SET markdown = ?, size = length(content) + ? "
+                "WHERE content_hash = ?",
+                (markdown, len(markdown.encode()), content_hash),
+            )
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        # 淘汰最久未访问的页面，直到总大小不超过上限
+        conn.execute(
+            "DELETE FROM page_cache WHERE url IN ("
+            "SELECT url FROM (SELECT url, sum(size) OVER (ORDER BY accessed_at DESC, url) "
+            "AS running FROM page_cache) WHERE running > ?)",
+            (self.max_bytes,),
+        )
+
+    async def get(self, url: str) -> CachedPage | None:
+        return await asyncio.to_thread(self._get_sync, normalize_url(url))
+
+    async def put(self, page: CachedPage) -> None:
+        page = replace(page, url=normalize_url(page.url))
+        await asyncio.to_thread(self._put_sync, page)
+
+    async def get_markdown(self, content_hash: str) -> str | None:
+        """查找相同内容已经转换过的 markdown"""
+        return await asyncio.to_thread(self._get_markdown_sync, content_hash)
+
+    async def set_markdown(self, content_hash: str, markdown: str) -> None:
+        """记录某个内容哈希对应的 markdown 转换结果"""
+        await asyncio.to_thread(self._set_markdown_sync, content_hash, markdown)
+
+
+# global
+page_cache = PageCache(PAGE_CACHE_DB_PATH)
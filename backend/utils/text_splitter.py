@@ -84,12 +84,12 @@ class RecursiveCharacterTextSplitter:
                         # 先处理当前积累的块
                         if current_chunk:
                             combined_text = "".join(current_chunk)
-                            final_chunks.extend(self.split_text(combined_text))
+                            final_chunks.extend(self.split_text(combined_text, chunk_size, overlap))
                             current_chunk = []
                             current_chunk_length = 0
 
                         # 递归分割过大的部分
-                        final_chunks.extend(self.split_text(split))
+                        final_chunks.extend(self.split_text(split, chunk_size, overlap))
                     # 如果添加这部分会使当前块超过chunk_size
                     elif current_chunk_length + split_length > chunk_size:
                         # 合并当前块并添加到结果中
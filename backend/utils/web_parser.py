@@ -1,7 +1,36 @@
+import os
+import re
+import html
 import aiohttp
 import asyncio
+from dataclasses import dataclass
+from urllib.parse import urlparse
+from loguru import logger
 from typing_extensions import override
 from backend.utils.markdownit_content import MarkdownitContent
+from backend.utils.page_cache import CachedPage, content_hash, page_cache
+
+
+@dataclass
+class FetchedPage:
+    """一次下载得到的页面，供 Markdown 转换和标题提取共用"""
+
+    url: str
+    content: bytes
+    mimetype: str | None = None
+    charset: str | None = None
+    filename: str | None = None
+    extension: str | None = None
+    content_hash: str = ""
+    # 页面缓存中已有的转换结果（内容未变化时）
+    markdown: str | None = None
+
+    @property
+    def is_html(self) -> bool:
+        return (self.mimetype or "").startswith(("text/html", "application/xhtml"))
+
+    def text(self) -> str:
+        return self.content.decode(self.charset or "utf-8", errors="replace")
 
 
 class WebParser(MarkdownitContent):
@@ -9,48 +38,216 @@ class WebParser(MarkdownitContent):
     async def close(self): ...
 
 
+# 连接池配置
+WEB_FETCH_MAX_CONNECTIONS = int(os.getenv("WEB_FETCH_MAX_CONNECTIONS", "100"))
+WEB_FETCH_MAX_CONNECTIONS_PER_HOST = int(os.getenv("WEB_FETCH_MAX_CONNECTIONS_PER_HOST", "8"))
+WEB_FETCH_DNS_CACHE_TTL = int(os.getenv("WEB_FETCH_DNS_CACHE_TTL", "300"))
+WEB_FETCH_KEEPALIVE_TIMEOUT = float(os.getenv("WEB_FETCH_KEEPALIVE_TIMEOUT", "30"))
+# 单个响应的大小上限，超出时中止下载
+WEB_FETCH_MAX_BYTES = int(os.getenv("WEB_FETCH_MAX_BYTES", str(20 * 1024 * 1024)))
+# 只取标题时最多读取的字节数
+TITLE_SCAN_MAX_BYTES = 256 * 1024
+_CHUNK_SIZE = 64 * 1024
+
+
+class ResponseTooLargeError(Exception):
+    pass
+
+
 class AIOHTTPWebParser(WebParser):
-    def __init__(self):
-        self._session = None
+    """
+    共享一个长生命周期的 ClientSession（连接池 + keep-alive + DNS 缓存），
+    由应用 lifespan 负责 initialize / close。
+    """
+
+    def __init__(self, max_bytes: int = WEB_FETCH_MAX_BYTES):
+        self._session: aiohttp.ClientSession | None = None
+        self._lock = asyncio.Lock()
+        self.max_bytes = max_bytes
 
     async def initialize(self):
-        self._session = aiohttp.ClientSession(trust_env=True)
+        async with self._lock:
+            if self._session and not self._session.closed:
+                return
+            connector = aiohttp.TCPConnector(
+                limit=WEB_FETCH_MAX_CONNECTIONS,
+                limit_per_host=WEB_FETCH_MAX_CONNECTIONS_PER_HOST,
+                ttl_dns_cache=WEB_FETCH_DNS_CACHE_TTL,
+                keepalive_timeout=WEB_FETCH_KEEPALIVE_TIMEOUT,
+            )
+            self._session = aiohttp.ClientSession(connector=connector, trust_env=True)
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        # 脚本等未经过 lifespan 的场景下按需创建
+        if not self._session or self._session.closed:
+            await self.initialize()
+        assert self._session is not None
+        return self._session
+
+    async def _read_limited(self, response: aiohttp.ClientResponse, max_bytes: int) -> bytes:
+        if response.content_length and response.content_length > max_bytes:
+            raise ResponseTooLargeError(
+                f"Response from {response.url} is too large: {response.content_length} bytes"
+            )
+        buffer = bytearray()
+        async for chunk in response.content.iter_chunked(_CHUNK_SIZE):
+            buffer.extend(chunk)
+            if len(buffer) > max_bytes:
+                raise ResponseTooLargeError(
+                    f"Response from {response.url} exceeds {max_bytes} bytes"
+                )
+        return bytes(buffer)
 
     @override
     async def fetch(self, url: str, timeout: float = 10) -> str:
-        if not self._session:
-            raise RuntimeError("Web parser not initialized. Call 'initialize' first.")
-        async with self._session.get(url, timeout=timeout) as response:
+        page = await self.fetch_page(url, timeout=timeout)
+        return page.text()
+
+    async def fetch_page(
+        self, url: str, timeout: float = 10, use_cache: bool = True
+    ) -> FetchedPage:
+        """
+        下载页面的原始字节，并解析 content-type / content-disposition。
+        命中页面缓存时使用 ETag / Last-Modified 发起条件请求，304 时直接返回缓存内容。
+        """
+        session = await self._get_session()
+        cached = await page_cache.get(url) if use_cache else None
+        headers = {}
+        if cached:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+
+        async with session.get(
+            url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)
+        ) as response:
+            if response.status == 304 and cached:
+                logger.debug(f"Page not modified, using cached content: {url}")
+                return FetchedPage(
+                    url=cached.final_url,
+                    content=cached.content,
+                    mimetype=cached.mimetype,
+                    charset=cached.charset,
+                    filename=cached.filename,
+                    extension=cached.extension,
+                    content_hash=cached.content_hash,
+                    markdown=cached.markdown,
+                )
+            if response.status != 200:
+                raise Exception(f"Failed to fetch {url}, status code: {response.status}")
+            content = await self._read_limited(response, self.max_bytes)
+            page = _build_fetched_page(str(response.url), content, response.headers)
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+
+        page.content_hash = content_hash(content)
+        if cached and cached.content_hash == page.content_hash:
+            page.markdown = cached.markdown
+        if use_cache:
+            await page_cache.put(
+                CachedPage(
+                    url=url,
+                    final_url=page.url,
+                    content=content,
+                    content_hash=page.content_hash,
+                    mimetype=page.mimetype,
+                    charset=page.charset,
+                    filename=page.filename,
+                    extension=page.extension,
+                    etag=etag,
+                    last_modified=last_modified,
+                    markdown=page.markdown,
+                )
+            )
+        return page
+
+    async def fetch_title(self, url: str, timeout: float = 10) -> str:
+        """流式读取，遇到 </title> 就停止下载"""
+        session = await self._get_session()
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
             if response.status != 200:
                 raise Exception(f"Failed to fetch {url}, status code: {response.status}")
-            return await response.text()
-            # result = await response.text()
-            # # markdownit_result = await asyncio.to_thread(, result)
-            # return markdownit_result
+            page = _build_fetched_page(str(response.url), b"", response.headers)
+            buffer = bytearray()
+            async for chunk in response.content.iter_chunked(_CHUNK_SIZE):
+                # 只在新数据附近查找，避免重复扫描整个 buffer
+                search_from = max(len(buffer) - len(b"</title>"), 0)
+                buffer.extend(chunk)
+                if buffer.lower().find(b"</title>", search_from) != -1:
+                    break
+                if len(buffer) >= TITLE_SCAN_MAX_BYTES:
+                    break
+            page.content = bytes(buffer)
+            return extract_title(page.text())
 
     @override
     async def close(self):
-        if self._session:
-            await self._session.close()
-            self._session = None
+        async with self._lock:
+            if self._session:
+                await self._session.close()
+                self._session = None
 
 
 # global
 aiohttp_web_parser = AIOHTTPWebParser()
 
 
+def _build_fetched_page(url: str, content: bytes, headers) -> FetchedPage:
+    mimetype = None
+    charset = None
+    if "content-type" in headers:
+        parts = headers["content-type"].split(";")
+        mimetype = parts.pop(0).strip()
+        for part in parts:
+            if part.strip().startswith("charset="):
+                charset = part.split("=")[1].strip() or None
+
+    filename = None
+    extension = None
+    if "content-disposition" in headers:
+        m = re.search(r"filename=([^;]+)", headers["content-disposition"])
+        if m:
+            filename = m.group(1).strip("\"'")
+            extension = os.path.splitext(filename)[1] or None
+    if filename is None:
+        path = urlparse(url).path
+        if os.path.splitext(path)[1]:
+            filename = os.path.basename(path)
+            extension = os.path.splitext(path)[1]
+
+    return FetchedPage(
+        url=url,
+        content=content,
+        mimetype=mimetype,
+        charset=charset,
+        filename=filename,
+        extension=extension,
+    )
+
+
+_TITLE_PATTERN = re.compile(r"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+
+
+def extract_title(content: str) -> str:
+    """
+    Extract the title from HTML content.
+    """
+    m = _TITLE_PATTERN.search(content)
+    if not m:
+        return "No title found"
+    return html.unescape(m.group(1)).strip()
+
+
+async def fetch_page(url: str) -> FetchedPage:
+    """
+    Download a web page once, so that the same bytes can be converted and parsed.
+    """
+    return await aiohttp_web_parser.fetch_page(url)
+
+
 async def get_web_title(url: str) -> str:
     """
     Fetch the title of a web page.
     """
-    await aiohttp_web_parser.initialize()
-    try:
-        content = await aiohttp_web_parser.fetch(url)
-        # Extract title from HTML content
-        title_start = content.find("<title>")
-        title_end = content.find("</title>")
-        if title_start == -1 or title_end == -1:
-            return "No title found"
-        return content[title_start + 7 : title_end].strip()
-    finally:
-        await aiohttp_web_parser.close()
+    return await aiohttp_web_parser.fetch_title(url)